@@ -0,0 +1,24 @@
+import azure.functions as func
+import json
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.azure_storage import INTERNAL_PREFIXES, container_client
+from shared.text_cache_gc import collect_garbage
+
+# Report orphans without deleting them
+DRY_RUN = os.getenv('TEXT_CACHE_GC_DRY_RUN', '').lower() in ('1', 'true', 'yes')
+
+
+def main(timer: func.TimerRequest) -> None:
+    """Delete orphaned extracted text, chunks and text history, and expired exports (daily at 03:30 UTC)."""
+    if timer.past_due:
+        print("Text cache GC is running late")
+    try:
+        report = collect_garbage(container_client, INTERNAL_PREFIXES, dry_run=DRY_RUN)
+        print(json.dumps({'event': 'text_cache_gc', **report}))
+    except Exception as error:
+        print(f"Text cache GC error: {error}")
+        raise
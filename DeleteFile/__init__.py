@@ -1,102 +1,81 @@
 import azure.functions as func
-import json
 
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from shared.azure_storage import container_client
+from shared.azure_storage import container_client, forget_document_text
 from azure.core.exceptions import ResourceNotFoundError
+from shared.chunk_store import chunks_blob_name
+from shared.metrics import instrumented
+from shared.responses import error_response, json_response, preflight, server_error
+from shared.text_versions import delete_versions
+from shared.thumbnails import delete_derivatives
+from shared.timing import span, traced
 
+
+@instrumented('DeleteFile')
+@traced('DeleteFile')
+@preflight()
 def main(req: func.HttpRequest) -> func.HttpResponse:
     """Delete file from Azure Blob Storage."""
-    
-    # Handle CORS preflight requests
-    if req.method == 'OPTIONS':
-        return func.HttpResponse(
-            status_code=200,
-            headers={
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization',
-                'Access-Control-Max-Age': '86400'
-            }
-        )
-    
     try:
         # Extract blob_name from route parameters
         route_params = req.route_params
         blob_name = route_params.get('blob_name')
         
         if not blob_name:
-            return func.HttpResponse(
-                json.dumps({'error': 'blob_name parameter is required'}),
-                status_code=400,
-                mimetype='application/json',
-                headers={
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                    'Access-Control-Allow-Headers': 'Content-Type, Authorization'
-                }
-            )
+            return error_response('blob_name parameter is required', 400)
         
         blob_client = container_client.get_blob_client(blob_name)
         
         # Delete the original document
         try:
-            blob_client.delete_blob()
+            with span('storage.delete_blob'):
+                blob_client.delete_blob()
             print(f"Successfully deleted main blob: {blob_name}")
         except Exception as delete_error:
-            print(f"Error deleting main blob {blob_name}: {delete_error}")
-            return func.HttpResponse(
-                json.dumps({
-                    'success': False,
-                    'error': f'Failed to delete main file: {str(delete_error)}'
-                }),
-                status_code=500,
-                mimetype='application/json',
-                headers={
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                    'Access-Control-Allow-Headers': 'Content-Type, Authorization'
-                }
-            )
+            return server_error(f"Error deleting main blob {blob_name}: {delete_error}",
+                                f'Failed to delete main file: {str(delete_error)}', success=False)
         
         # Also delete the extracted text if it exists
         try:
             text_blob_name = f"documents_text/{blob_name}.txt"
             text_blob_client = container_client.get_blob_client(text_blob_name)
-            text_blob_client.delete_blob()
+            with span('storage.delete_blob'):
+                text_blob_client.delete_blob()
             print(f"Deleted extracted text for {blob_name}")
         except ResourceNotFoundError:
             # Text blob doesn't exist, which is fine
             print(f"No extracted text to delete for {blob_name}")
         
+        # And its stored chunks
+        try:
+            with span('storage.delete_blob'):
+                container_client.get_blob_client(chunks_blob_name(blob_name)).delete_blob()
+        except ResourceNotFoundError:
+            pass
+        
+        # And any image derivatives and text history; the document is gone
+        # already, so a failure here is logged and left to the cleanup
+        try:
+            delete_derivatives(container_client, blob_name)
+        except Exception as derivatives_error:
+            print(f"Failed to delete derivatives of {blob_name}: {derivatives_error}")
+        try:
+            delete_versions(container_client, blob_name)
+        except Exception as versions_error:
+            print(f"Failed to delete the text history of {blob_name}: {versions_error}")
+        
+        # Drop the document from the search and similarity indexes
+        forget_document_text(blob_name)
+        
         response_data = {
             'success': True,
             'message': 'File and extracted text deleted successfully'
         }
         
-        return func.HttpResponse(
-            json.dumps(response_data),
-            status_code=200,
-            mimetype='application/json',
-            headers={
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization'
-            }
-        )
+        return json_response(response_data)
         
     except Exception as error:
-        print(f"Delete error: {error}")
-        return func.HttpResponse(
-            json.dumps({'error': 'Failed to delete file'}),
-            status_code=500,
-            mimetype='application/json',
-            headers={
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization'
-            }
-        )
+        return server_error(f"Delete error: {error}", 'Failed to delete file')
@@ -0,0 +1,70 @@
+import azure.functions as func
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from azure.core.exceptions import ResourceModifiedError, ResourceNotFoundError
+
+from shared.azure_storage import DOWNLOAD_PROXY, container_client, sas_download_url
+from shared.http_ranges import iter_blob_range, limit_range, plan_response
+from shared.metrics import instrumented
+from shared.responses import Cors, error_response, preflight, server_error
+from shared.timing import span, traced
+
+# Functions buffer the whole response, so ranges are served in bounded
+# pieces; viewers request the rest as they need it. Whole documents above
+# this size are redirected to storage when a SAS can be handed out
+MAX_RANGE_BYTES = int(os.getenv('DOWNLOAD_MAX_RANGE_BYTES', str(16 * 1024 * 1024)) or 16 * 1024 * 1024)
+# Whole documents served through the proxy are refused above this size (0: no limit)
+MAX_BODY_BYTES = int(os.getenv('DOWNLOAD_MAX_BODY_BYTES', '0') or 0)
+
+CORS = Cors(allow_headers='Content-Type, Authorization, Range, If-Range',
+            expose_headers='Accept-Ranges, Content-Range, Content-Length, ETag')
+
+
+@instrumented('DownloadFile')
+@traced('DownloadFile')
+@preflight(CORS)
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """Proxy a document's bytes, with Range, If-Range and If-None-Match support."""
+
+    blob_name = req.route_params.get('blob_name')
+    blob_client = container_client.get_blob_client(blob_name)
+    try:
+        with span('storage.get_blob_properties'):
+            properties = blob_client.get_blob_properties()
+    except ResourceNotFoundError:
+        return error_response(f'File not found: {blob_name}', 404, cors=CORS)
+
+    try:
+        plan = limit_range(plan_response(req.headers, properties), MAX_RANGE_BYTES, properties.size)
+        headers = CORS.with_headers(plan.headers)
+        if plan.status in (304, 416):
+            return func.HttpResponse(status_code=plan.status, headers=headers)
+        if plan.status == 200 and plan.length > MAX_RANGE_BYTES:
+            download_url = None if DOWNLOAD_PROXY else sas_download_url(blob_name)
+            if download_url:
+                return func.HttpResponse(
+                    status_code=302,
+                    headers=CORS.with_headers({'Location': download_url, 'Cache-Control': 'no-store'})
+                )
+            # Storage cannot be exposed: the whole document goes through the proxy
+            if MAX_BODY_BYTES and plan.length > MAX_BODY_BYTES:
+                return error_response(
+                    f'File is larger than {MAX_BODY_BYTES} bytes; request it in ranges of at most {MAX_RANGE_BYTES}',
+                    413,
+                    headers={'Accept-Ranges': 'bytes'},
+                    cors=CORS,
+                    size=properties.size,
+                    maxRangeBytes=MAX_RANGE_BYTES
+                )
+
+        body = b''.join(iter_blob_range(blob_client, plan.offset, plan.length, properties.etag))
+        return func.HttpResponse(body, status_code=plan.status, headers=headers)
+
+    except ResourceModifiedError:
+        # Replaced since the properties were read; the client retries
+        return error_response('File changed during download; retry', 409, cors=CORS)
+    except Exception as error:
+        return server_error(f"Download error for {blob_name}: {error}", 'Failed to download file', cors=CORS)
@@ -0,0 +1,45 @@
+import azure.functions as func
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.azure_storage import container_client, INTERNAL_PREFIXES
+from shared.index_sync import IndexWarming
+from shared.metrics import instrumented
+from shared.responses import error_response, json_response, preflight, server_error
+from shared.minhash import find_duplicates, DUPLICATE_THRESHOLD
+from shared.timing import traced
+
+
+@instrumented('Duplicates')
+@traced('Duplicates')
+@preflight()
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """Near-duplicates of one document (?blob_name=) or all duplicate clusters."""
+
+    blob_name = req.params.get('blob_name')
+    try:
+        threshold = float(req.params.get('threshold', DUPLICATE_THRESHOLD))
+    except ValueError:
+        return error_response('threshold must be a number', 400)
+
+    try:
+        result = find_duplicates(container_client, INTERNAL_PREFIXES, blob_name=blob_name, threshold=threshold)
+        if result is None:
+            return error_response(f'No signature for {blob_name}; extract its text first', 404)
+
+        return json_response(result)
+
+    except IndexWarming as warming:
+        return error_response(
+            'The duplicate index is still being built; retry shortly',
+            503,
+            headers={
+                'Access-Control-Expose-Headers': 'Retry-After',
+                'Retry-After': str(warming.retry_after)
+            },
+            retryAfter=warming.retry_after
+        )
+    except Exception as error:
+        return server_error(f"Duplicate detection error: {error}", 'Duplicate detection failed')
@@ -0,0 +1,47 @@
+import azure.functions as func
+
+import sys
+import os
+import uuid
+from datetime import datetime
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.azure_storage import INTERNAL_PREFIXES, container_client, get_download_url
+from shared.metrics import instrumented
+from shared.responses import error_response, json_response, preflight, server_error
+from shared.timing import traced
+from shared.zipstream import EXPORTS_PREFIX, archive_entries, parse_archive_request, store_archive, stream_zip
+
+
+@instrumented('ExportArchive')
+@traced('ExportArchive')
+@preflight()
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """Build a ZIP archive of documents (and optionally their extracted text).
+
+    Azure Functions buffers whole responses, so rather than streaming the
+    archive to the client this streams it into an ``exports/`` blob, one
+    staged block at a time, and returns a download URL for that blob.
+    """
+
+    try:
+        body = None
+        if req.method == 'POST' and req.get_body():
+            body = req.get_json()
+        options = parse_archive_request(req.params, body)
+    except ValueError as error:
+        return error_response(str(error), 400)
+
+    try:
+        export_name = f"{EXPORTS_PREFIX}{datetime.utcnow():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:8]}.zip"
+        entries = archive_entries(container_client, INTERNAL_PREFIXES, prefix=options['prefix'],
+                                  names=options['names'], include_text=options['includeText'])
+        size = store_archive(container_client, export_name, stream_zip(container_client, entries))
+        print(f"Stored export archive {export_name} ({size} bytes)")
+
+        result = get_download_url(export_name)
+        result.update(exportName=export_name, size=size)
+        return json_response(result, 200 if result.get('success') else 500)
+
+    except Exception as error:
+        return server_error(f"Archive export error: {error}", 'Failed to export documents')
@@ -0,0 +1,52 @@
+import azure.functions as func
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.azure_storage import container_client
+from shared.chunk_store import export_chunks, list_documents_page, parse_export_request
+from shared.metrics import instrumented
+from shared.responses import Cors, error_response, preflight, server_error
+from shared.timing import traced
+
+CORS = Cors(expose_headers='X-Next-Cursor')
+
+
+@instrumented('ExportChunks')
+@traced('ExportChunks')
+@preflight(CORS)
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """Export stored chunks as JSON lines, one page of documents per request.
+
+    Azure Functions buffers whole responses, so instead of streaming the
+    corpus this returns at most ``limit`` documents and an ``X-Next-Cursor``
+    header to pass back as ``cursor`` for the next page.
+    """
+
+    try:
+        body = None
+        if req.method == 'POST' and req.get_body():
+            body = req.get_json()
+        options = parse_export_request(req.params, body)
+        names = options['names']
+        if names is not None:
+            start = int(options['cursor'] or 0)
+            documents = [(name, None, None) for name in names[start:start + options['limit']]]
+            next_cursor = str(start + options['limit']) if start + options['limit'] < len(names) else None
+        else:
+            documents, next_cursor = list_documents_page(
+                container_client, options['prefix'], options['limit'], options['cursor'])
+    except ValueError as error:
+        return error_response(str(error), 400, cors=CORS)
+
+    try:
+        return func.HttpResponse(
+            b''.join(export_chunks(container_client, documents)),
+            status_code=200,
+            mimetype='application/x-ndjson',
+            headers=CORS.with_headers({'X-Next-Cursor': next_cursor} if next_cursor else None)
+        )
+
+    except Exception as error:
+        return server_error(f"Chunk export error: {error}", 'Failed to export chunks', cors=CORS)
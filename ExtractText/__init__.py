@@ -1,130 +1,140 @@
 import azure.functions as func
-import json
+import hashlib
 import os
 import tempfile
+import time
 from datetime import datetime
 from pathlib import Path
 
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from shared.admission import Overloaded, extraction_admission
 from shared.azure_storage import (
     container_client, 
     get_stored_extracted_text, 
+    detect_blob_format,
     extract_text_from_file, 
-    store_extracted_text
+    store_extracted_text,
+    store_profile
 )
+from shared.extractor_registry import HEADER_BYTES, UnsupportedFileType
+from shared.metrics import STORAGE_BYTES_DOWNLOADED, instrumented
+from shared.profiling import annotate, is_profile_requested, is_profiling, profiled
+from shared.responses import error_response, json_response, preflight, server_error
+from shared.timing import span, traced
 
+
+@instrumented('ExtractText')
+@traced('ExtractText')
+@profiled('ExtractText', store=store_profile)
+@preflight()
 def main(req: func.HttpRequest) -> func.HttpResponse:
     """Extract text from document."""
-    
-    # Handle CORS preflight requests
-    if req.method == 'OPTIONS':
-        return func.HttpResponse(
-            status_code=200,
-            headers={
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization',
-                'Access-Control-Max-Age': '86400'
-            }
-        )
-    
     try:
         # Extract blob_name from route parameters
         route_params = req.route_params
         blob_name = route_params.get('blob_name')
         
         if not blob_name:
-            return func.HttpResponse(
-                json.dumps({'error': 'blob_name parameter is required'}),
-                status_code=400,
-                mimetype='application/json'
-            )
-        # First, try to get stored extracted text
-        stored_text = get_stored_extracted_text(blob_name)
+            return error_response('blob_name parameter is required', 400)
+        # First, try to get stored extracted text. Signed profiling requests
+        # skip the cache so the extraction itself shows up in the profile.
+        profile_requested = is_profile_requested()
+        stored_text = None if profile_requested else get_stored_extracted_text(blob_name)
         
         if stored_text:
-                    return func.HttpResponse(
-            json.dumps(stored_text),
-            status_code=200,
-            mimetype='application/json',
-            headers={
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization'
-            }
-        )
+            return json_response(stored_text)
         
         # If no stored text, extract from the original document
         blob_client = container_client.get_blob_client(blob_name)
         
-        # Download to temp file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=Path(blob_name).suffix) as temp_file:
-            download_stream = blob_client.download_blob()
-            temp_file.write(download_stream.readall())
-            temp_file_path = temp_file.name
+        # Pick the extractor from the blob's first bytes, rejecting
+        # unsupported content before downloading the rest
+        try:
+            file_format, header = detect_blob_format(blob_client, blob_name)
+        except UnsupportedFileType as error:
+            return error_response(str(error), 400, success=False)
         
+        # Parsing is CPU-bound: wait for an extraction slot, smallest documents
+        # first, or tell the client when to retry
+        if len(header) < HEADER_BYTES:
+            document_size = len(header)
+        else:
+            with span('storage.get_blob_properties'):
+                document_size = blob_client.get_blob_properties().size
         try:
-            # Extract text
-            extraction_result = extract_text_from_file(temp_file_path)
-            
-            if extraction_result['success']:
-                # Store the extracted text in Azure
-                try:
-                    store_extracted_text(blob_name, extraction_result['text'])
-                except Exception as store_error:
-                    print(f"Failed to store extracted text for {blob_name}: {store_error}")
-                
-                response_data = {
-                    'success': True,
-                    'text': extraction_result['text'],
-                    'source': 'extracted',
-                    'extractedAt': datetime.utcnow().isoformat()
-                }
-                
-                return func.HttpResponse(
-                    json.dumps(response_data),
-                    status_code=200,
-                    mimetype='application/json',
-                    headers={
-                        'Access-Control-Allow-Origin': '*',
-                        'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                        'Access-Control-Allow-Headers': 'Content-Type, Authorization'
-                    }
-                )
-            else:
-                return func.HttpResponse(
-                    json.dumps({
-                        'success': False,
-                        'error': extraction_result['error']
-                    }),
-                    status_code=400,
-                    mimetype='application/json',
-                    headers={
-                        'Access-Control-Allow-Origin': '*',
-                        'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                        'Access-Control-Allow-Headers': 'Content-Type, Authorization'
-                    }
-                )
-                
+            with span('admission.wait'):
+                extraction_admission.acquire(document_size)
+        except Overloaded as overloaded:
+            return error_response(
+                'Too many extractions in progress; retry later',
+                429,
+                headers={
+                    'Access-Control-Expose-Headers': 'Retry-After',
+                    'Retry-After': str(overloaded.retry_after)
+                },
+                success=False,
+                retryAfter=overloaded.retry_after
+            )
+        admitted_at = time.perf_counter()
+        
+        try:
+            # Download to temp file
+            with tempfile.NamedTemporaryFile(delete=False, suffix=Path(blob_name).suffix) as temp_file:
+                if len(header) < HEADER_BYTES:
+                    # The header read already returned the whole blob
+                    file_content = header
+                else:
+                    with span('storage.download_blob'):
+                        download_stream = blob_client.download_blob()
+                        file_content = download_stream.readall()
+                    STORAGE_BYTES_DOWNLOADED.inc(len(file_content))
+                if is_profiling():
+                    annotate(
+                        documentSha256=hashlib.sha256(file_content).hexdigest(),
+                        documentSize=len(file_content)
+                    )
+                with span('tempfile.write'):
+                    temp_file.write(file_content)
+                temp_file_path = temp_file.name
+        
+            try:
+                # Extract text
+                extraction_result = extract_text_from_file(temp_file_path, file_format)
+                annotate(pageCount=extraction_result.get('pageCount'), success=extraction_result['success'])
+            finally:
+                # Clean up temp file
+                with span('tempfile.cleanup'):
+                    if os.path.exists(temp_file_path):
+                        os.unlink(temp_file_path)
         finally:
-            # Clean up temp file
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
+            # Storing the text below doesn't need the slot, and its I/O
+            # would inflate the service time behind Retry-After
+            extraction_admission.release(time.perf_counter() - admitted_at)
+        
+        if not extraction_result['success']:
+            return error_response(extraction_result['error'], 400, success=False)
+        
+        # Store the extracted text in Azure, unless this was a profiling
+        # run that may have bypassed existing (possibly edited) text
+        etag = None
+        try:
+            if not profile_requested:
+                etag = store_extracted_text(blob_name, extraction_result['text'], extraction_result)
+        except Exception as store_error:
+            print(f"Failed to store extracted text for {blob_name}: {store_error}")
+        
+        response_data = {
+            'success': True,
+            'text': extraction_result['text'],
+            'source': 'extracted',
+            'etag': etag,
+            'extractedAt': datetime.utcnow().isoformat()
+        }
+        
+        return json_response(response_data)
                 
     except Exception as error:
-        print(f"Text extraction error: {error}")
-        return func.HttpResponse(
-            json.dumps({
-                'success': False,
-                'error': f'Failed to extract text: {str(error)}'
-            }),
-            status_code=500,
-            mimetype='application/json',
-            headers={
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization'
-            }
-        )
+        return server_error(f"Text extraction error: {error}", f'Failed to extract text: {str(error)}',
+                            success=False)
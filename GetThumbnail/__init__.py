@@ -0,0 +1,45 @@
+import azure.functions as func
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.azure_storage import container_client
+from shared.metrics import instrumented
+from shared.responses import DEFAULT_CORS, error_response, preflight, server_error
+from shared.thumbnails import CACHE_CONTROL, CONTENT_TYPE, SIZES, get_derivative, is_image
+from shared.timing import traced
+
+
+@instrumented('GetThumbnail')
+@traced('GetThumbnail')
+@preflight()
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """Thumbnail (?size=thumb) or preview (?size=preview) JPEG of an image."""
+
+    blob_name = req.route_params.get('blob_name')
+    size = req.params.get('size', 'thumb')
+    if size not in SIZES:
+        return error_response(f"size must be one of: {', '.join(SIZES)}", 400)
+    if not blob_name or not is_image(blob_name):
+        return error_response('Thumbnails are only available for images', 404)
+
+    try:
+        derivative = get_derivative(container_client, blob_name, size)
+        if derivative is None:
+            return error_response(f'File not found: {blob_name}', 404)
+
+        content, etag = derivative
+        headers = DEFAULT_CORS.with_headers({'Cache-Control': CACHE_CONTROL, 'ETag': etag})
+        if req.headers.get('If-None-Match') == etag:
+            return func.HttpResponse(status_code=304, headers=headers)
+
+        return func.HttpResponse(
+            content,
+            status_code=200,
+            mimetype=CONTENT_TYPE,
+            headers=headers
+        )
+
+    except Exception as error:
+        return server_error(f"Thumbnail error for {blob_name}: {error}", 'Failed to render thumbnail')
@@ -1,8 +1,14 @@
 import azure.functions as func
-import json
 import os
 from datetime import datetime
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.metrics import instrumented
+from shared.responses import error_response, json_response, preflight
 
+
+@instrumented('HealthCheck')
+@preflight()
 def main(req: func.HttpRequest) -> func.HttpResponse:
     """Health check endpoint."""
     try:
@@ -14,20 +20,7 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             'azure_connected': azure_connected
         }
         
-        return func.HttpResponse(
-            json.dumps(response_data),
-            status_code=200,
-            mimetype='application/json',
-            headers={
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization'
-            }
-        )
+        return json_response(response_data)
         
     except Exception as e:
-        return func.HttpResponse(
-            json.dumps({'error': str(e)}),
-            status_code=500,
-            mimetype='application/json'
-        )
+        return error_response(str(e), 500)
@@ -0,0 +1,25 @@
+import azure.functions as func
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared.metrics import render, CONTENT_TYPE
+
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """Expose process metrics in the Prometheus text format."""
+    try:
+        return func.HttpResponse(
+            render(),
+            status_code=200,
+            headers={
+                'Content-Type': CONTENT_TYPE,
+                'Cache-Control': 'no-store'
+            }
+        )
+        
+    except Exception as error:
+        print(f"Metrics error: {error}")
+        return func.HttpResponse(
+            'Failed to render metrics\n',
+            status_code=500,
+            mimetype='text/plain'
+        )
@@ -0,0 +1,58 @@
+import azure.functions as func
+from datetime import datetime
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from azure.core.exceptions import ResourceModifiedError, ResourceNotFoundError
+
+from shared.azure_storage import container_client, store_extracted_text
+from shared.metrics import instrumented
+from shared.responses import Cors, error_response, json_response, preflight, server_error
+from shared.text_patch import parse_patch_request, utf16_length
+from shared.text_versions import save_text
+from shared.timing import traced
+
+CORS = Cors(methods='GET, POST, PUT, PATCH, DELETE, OPTIONS')
+
+
+@instrumented('PatchEditedText')
+@traced('PatchEditedText')
+@preflight(CORS)
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """Apply edits to stored text: {"baseEtag", "edits": [{"start", "end", "text"}]}.
+
+    Offsets are UTF-16 code units into the version with ``baseEtag``. The
+    text is read and written conditionally on that ETag; if it has changed
+    in the meantime nothing is written and 412 is returned. The replaced
+    version is kept in the text's history.
+    """
+
+    blob_name = req.route_params.get('blob_name')
+    try:
+        try:
+            body = req.get_json()
+        except ValueError:
+            body = None
+        base_etag, edits = parse_patch_request(body)
+        saved = save_text(container_client, blob_name, store_extracted_text, edits=edits, base_etag=base_etag)
+        return json_response({
+            'success': True,
+            'message': 'Edited text saved successfully',
+            'etag': saved['etag'],
+            'version': saved['version'],
+            'length': utf16_length(saved['text']),
+            'savedAt': datetime.utcnow().isoformat()
+        }, cors=CORS)
+    except ValueError as error:
+        return error_response(str(error), 400, cors=CORS, success=False)
+    except ResourceNotFoundError:
+        return error_response(f'No stored text for {blob_name}', 404, cors=CORS, success=False)
+    except ResourceModifiedError:
+        # Changed since the client loaded it, either before the read or before the write
+        return error_response('The text was changed elsewhere since it was loaded; reload it and reapply your edits',
+                              412, cors=CORS, success=False)
+    except Exception as error:
+        return server_error(f"Patch edited text error: {error}", f'Failed to save edited text: {str(error)}',
+                            cors=CORS, success=False)
@@ -1,95 +1,60 @@
 import azure.functions as func
-import json
 from datetime import datetime
 
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from shared.azure_storage import store_extracted_text
+from azure.core.exceptions import ResourceModifiedError, ResourceNotFoundError
 
+from shared.azure_storage import container_client, store_extracted_text
+from shared.metrics import instrumented
+from shared.responses import error_response, json_response, preflight, server_error
+from shared.text_versions import save_text
+from shared.timing import traced
+
+
+@instrumented('SaveEditedText')
+@traced('SaveEditedText')
+@preflight()
 def main(req: func.HttpRequest) -> func.HttpResponse:
     """Save edited text to Azure Blob Storage."""
-    
-    # Handle CORS preflight requests
-    if req.method == 'OPTIONS':
-        return func.HttpResponse(
-            status_code=200,
-            headers={
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization',
-                'Access-Control-Max-Age': '86400'
-            }
-        )
-    
     try:
         # Extract blob_name from route parameters
         route_params = req.route_params
         blob_name = route_params.get('blob_name')
         
         if not blob_name:
-            return func.HttpResponse(
-                json.dumps({'error': 'blob_name parameter is required'}),
-                status_code=400,
-                mimetype='application/json'
-            )
+            return error_response('blob_name parameter is required', 400)
         # Parse JSON body
         try:
             body = req.get_json()
             text = body.get('text')
         except ValueError:
-            return func.HttpResponse(
-                json.dumps({
-                    'success': False,
-                    'error': 'Invalid JSON body'
-                }),
-                status_code=400,
-                mimetype='application/json'
-            )
+            return error_response('Invalid JSON body', 400, success=False)
         
         if not text:
-            return func.HttpResponse(
-                json.dumps({
-                    'success': False,
-                    'error': 'No text provided'
-                }),
-                status_code=400,
-                mimetype='application/json'
-            )
+            return error_response('No text provided', 400, success=False)
         
-        # Store the edited text in Azure
-        store_extracted_text(blob_name, text)
+        # Store the edited text in Azure, keeping the replaced version in its
+        # history; only over the version it was based on when the client
+        # says which one that was
+        saved = save_text(container_client, blob_name, store_extracted_text, text=text,
+                          base_etag=body.get('baseEtag'))
         
         response_data = {
             'success': True,
             'message': 'Edited text saved successfully',
+            'etag': saved['etag'],
+            'version': saved['version'],
             'savedAt': datetime.utcnow().isoformat()
         }
         
-        return func.HttpResponse(
-            json.dumps(response_data),
-            status_code=200,
-            mimetype='application/json',
-            headers={
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization'
-            }
-        )
+        return json_response(response_data)
         
+    except (ResourceModifiedError, ResourceNotFoundError):
+        return error_response('The text was changed elsewhere since it was loaded; reload it and reapply your edits',
+                              412, success=False)
     except Exception as error:
-        print(f"Save edited text error: {error}")
-        return func.HttpResponse(
-            json.dumps({
-                'success': False,
-                'error': f'Failed to save edited text: {str(error)}'
-            }),
-            status_code=500,
-            mimetype='application/json',
-            headers={
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization'
-            }
-        )
+        return server_error(f"Save edited text error: {error}", f'Failed to save edited text: {str(error)}',
+                            success=False)
@@ -0,0 +1,45 @@
+import azure.functions as func
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.azure_storage import container_client
+from shared.index_sync import IndexWarming
+from shared.metrics import instrumented
+from shared.responses import error_response, json_response, preflight, server_error
+from shared.search_index import search_documents, MAX_RESULTS
+from shared.timing import traced
+
+
+@instrumented('Search')
+@traced('Search')
+@preflight()
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """Full-text search over extracted document text."""
+
+    query = (req.params.get('q') or '').strip()
+    if not query:
+        return error_response('q parameter is required', 400)
+
+    try:
+        limit = min(int(req.params.get('limit', 20)), MAX_RESULTS)
+        offset = int(req.params.get('offset', 0))
+    except ValueError:
+        return error_response('limit and offset must be integers', 400)
+
+    try:
+        return json_response(search_documents(container_client, query, limit=limit, offset=offset))
+
+    except IndexWarming as warming:
+        return error_response(
+            'The search index is still being built; retry shortly',
+            503,
+            headers={
+                'Access-Control-Expose-Headers': 'Retry-After',
+                'Retry-After': str(warming.retry_after)
+            },
+            retryAfter=warming.retry_after
+        )
+    except Exception as error:
+        return server_error(f"Search error: {error}", 'Search failed')
@@ -0,0 +1,55 @@
+import azure.functions as func
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.azure_storage import container_client
+from shared.index_sync import IndexWarming
+from shared.metrics import instrumented
+from shared.responses import error_response, json_response, preflight, server_error
+from shared.similarity import find_similar, MAX_RESULTS
+from shared.timing import traced
+
+
+@instrumented('Similar')
+@traced('Similar')
+@preflight()
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """Passages similar to a document (?blob_name=) or to free text (?q= or JSON {"text"})."""
+
+    blob_name = req.params.get('blob_name')
+    text = req.params.get('q')
+    if req.method == 'POST':
+        try:
+            text = (req.get_json() or {}).get('text')
+        except ValueError:
+            return error_response('Invalid JSON body', 400)
+
+    if not blob_name and not (text or '').strip():
+        return error_response('blob_name or text is required', 400)
+
+    try:
+        limit = min(int(req.params.get('limit', 10)), MAX_RESULTS)
+    except ValueError:
+        return error_response('limit must be an integer', 400)
+
+    try:
+        result = find_similar(container_client, text=text, blob_name=blob_name, limit=limit)
+        if result is None:
+            return error_response(f'No extracted text for {blob_name}', 404)
+
+        return json_response(result)
+
+    except IndexWarming as warming:
+        return error_response(
+            'The similarity index is still being built; retry shortly',
+            503,
+            headers={
+                'Access-Control-Expose-Headers': 'Retry-After',
+                'Retry-After': str(warming.retry_after)
+            },
+            retryAfter=warming.retry_after
+        )
+    except Exception as error:
+        return server_error(f"Similarity search error: {error}", 'Similarity search failed')
@@ -0,0 +1,35 @@
+import azure.functions as func
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.azure_storage import container_client
+from shared.metrics import instrumented
+from shared.responses import error_response, json_response, preflight, server_error
+from shared.text_versions import get_version, list_versions
+from shared.timing import traced
+
+
+@instrumented('TextVersions')
+@traced('TextVersions')
+@preflight()
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """List the saved versions of a document's text, or return one version's text."""
+
+    blob_name = req.route_params.get('blob_name')
+    version = req.route_params.get('version')
+    try:
+        if version is None:
+            result = list_versions(container_client, blob_name)
+            error = f'No stored text for {blob_name}'
+        else:
+            result = get_version(container_client, blob_name, int(version))
+            error = f'No version {version} of the text of {blob_name}'
+
+        if result is None:
+            return error_response(error, 404)
+        return json_response(result)
+
+    except Exception as error:
+        return server_error(f"Text versions error for {blob_name}: {error}", 'Failed to load text versions')
@@ -0,0 +1,75 @@
+import azure.functions as func
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extractor.formats import registry as extractors
+from shared.azure_storage import (
+    container_client,
+    extract_text_from_bytes,
+    store_extracted_text,
+    MAX_FILE_SIZE,
+    SUPPORTED_EXTENSIONS
+)
+from shared.batch_upload import MAX_BATCH_FILES, UploadPart, upload_batch
+from shared.metrics import instrumented
+from shared.responses import error_response, json_response, preflight, server_error
+from shared.thumbnails import is_image, store_derivatives
+from shared.timing import traced
+from shared.upload_extraction import EXTRACT_ON_UPLOAD, extract_on_upload
+
+
+def _after_upload(blob_name: str, part: UploadPart) -> dict:
+    """Thumbnails and extract-on-upload, from the part's bytes when either needs them."""
+    if not is_image(blob_name) and EXTRACT_ON_UPLOAD == 'off':
+        return {}
+    part.stream.seek(0)
+    file_content = part.stream.read()
+    result = {}
+    if is_image(blob_name):
+        try:
+            store_derivatives(container_client, blob_name, file_content)
+        except Exception as thumbnail_error:
+            print(f"Failed to render thumbnails for {blob_name}: {thumbnail_error}")
+    extraction = extract_on_upload(blob_name, file_content, extractors,
+                                   extract_text_from_bytes, store_extracted_text)
+    if extraction is not None:
+        result['extraction'] = extraction
+        result['hasExtractedText'] = extraction['status'] == 'extracted'
+    return result
+
+
+@instrumented('UploadBatch')
+@traced('UploadBatch')
+@preflight()
+def main(req: func.HttpRequest) -> func.HttpResponse:
+    """Upload every ``files`` part of a multipart request concurrently."""
+
+    try:
+        uploaded_files = [uploaded for uploaded in req.files.getlist('files') if uploaded.filename]
+        if not uploaded_files:
+            return error_response('No files provided', 400)
+        if len(uploaded_files) > MAX_BATCH_FILES:
+            return error_response(f'Too many files; upload at most {MAX_BATCH_FILES} per request', 400)
+
+        parts = []
+        for uploaded in uploaded_files:
+            uploaded.stream.seek(0, 2)
+            size = uploaded.stream.tell()
+            uploaded.stream.seek(0)
+            parts.append(UploadPart(uploaded.filename, uploaded.stream, size, uploaded.content_type))
+
+        results = upload_batch(container_client, parts, MAX_FILE_SIZE, SUPPORTED_EXTENSIONS,
+                               after_upload=_after_upload)
+        uploaded_count = sum(1 for result in results if result['success'])
+
+        return json_response({
+            'success': uploaded_count > 0,
+            'uploaded': uploaded_count,
+            'failed': len(results) - uploaded_count,
+            'files': results
+        }, 200 if uploaded_count else 400)
+
+    except Exception as error:
+        return server_error(f"Batch upload error: {error}", 'Failed to upload files')
@@ -1,5 +1,4 @@
 import azure.functions as func
-import json
 import os
 import tempfile
 from datetime import datetime
@@ -9,44 +8,34 @@ from werkzeug.utils import secure_filename
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from extractor.formats import registry as extractors
 from shared.azure_storage import (
     container_client, 
+    extract_text_from_bytes,
     generate_unique_filename, 
+    store_extracted_text,
     ContentSettings, 
     MAX_FILE_SIZE, 
     SUPPORTED_EXTENSIONS
 )
+from shared.metrics import STORAGE_BYTES_UPLOADED, instrumented
+from shared.responses import error_response, json_response, preflight, server_error
+from shared.thumbnails import is_image, store_derivatives
+from shared.timing import span, traced
+from shared.upload_extraction import extract_on_upload
 
+
+@instrumented('UploadFile')
+@traced('UploadFile')
+@preflight()
 def main(req: func.HttpRequest) -> func.HttpResponse:
     """Upload file to Azure Blob Storage."""
-    
-    # Handle CORS preflight requests
-    if req.method == 'OPTIONS':
-        return func.HttpResponse(
-            status_code=200,
-            headers={
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization',
-                'Access-Control-Max-Age': '86400'
-            }
-        )
-    
     try:
         # Get the uploaded file
         uploaded_file = req.files.get('file')
         
         if not uploaded_file:
-            return func.HttpResponse(
-                json.dumps({'error': 'No file provided'}),
-                status_code=400,
-                mimetype='application/json',
-                headers={
-                    'Access-Control-Allow-Origin': '*',
-                    'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                    'Access-Control-Allow-Headers': 'Content-Type, Authorization'
-                }
-            )
+            return error_response('No file provided', 400)
         
         # Generate unique filename
         original_filename = uploaded_file.filename
@@ -59,14 +48,24 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
         file_content = uploaded_file.read()
         
         # Upload with metadata
-        blob_client.upload_blob(
-            file_content,
-            overwrite=True,
-            metadata={
-                'originalName': original_filename,
-                'uploadedAt': datetime.utcnow().isoformat()
-            }
-        )
+        with span('storage.upload_blob'):
+            blob_client.upload_blob(
+                file_content,
+                overwrite=True,
+                metadata={
+                    'originalName': original_filename,
+                    'uploadedAt': datetime.utcnow().isoformat()
+                }
+            )
+        STORAGE_BYTES_UPLOADED.inc(len(file_content))
+        
+        # Render image thumbnails while the bytes are at hand; GetThumbnail
+        # renders them on first request if this fails
+        if is_image(unique_filename):
+            try:
+                store_derivatives(container_client, unique_filename, file_content)
+            except Exception as thumbnail_error:
+                print(f"Failed to render thumbnails for {unique_filename}: {thumbnail_error}")
         
         response_data = {
             'success': True,
@@ -76,26 +75,14 @@ def main(req: func.HttpRequest) -> func.HttpResponse:
             'size': len(file_content)
         }
         
-        return func.HttpResponse(
-            json.dumps(response_data),
-            status_code=200,
-            mimetype='application/json',
-            headers={
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization'
-            }
-        )
+        # Extract from the bytes already in memory when EXTRACT_ON_UPLOAD is set
+        extraction = extract_on_upload(unique_filename, file_content, extractors,
+                                       extract_text_from_bytes, store_extracted_text)
+        if extraction is not None:
+            response_data['extraction'] = extraction
+            response_data['hasExtractedText'] = extraction['status'] == 'extracted'
+        
+        return json_response(response_data)
         
     except Exception as error:
-        print(f"Upload error: {error}")
-        return func.HttpResponse(
-            json.dumps({'error': 'Failed to upload file'}),
-            status_code=500,
-            mimetype='application/json',
-            headers={
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, Authorization'
-            }
-        )
+        return server_error(f"Upload error: {error}", 'Failed to upload file')
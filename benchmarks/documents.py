@@ -0,0 +1,249 @@
+"""
+Synthetic document generation for benchmarks and load tests
+
+Everything is generated offline from a seed, so the same arguments always
+produce byte-identical documents. Generators that feed the extraction
+benchmark also return the text they wrote, which serves as ground truth.
+"""
+
+import io
+import random
+import zipfile
+from typing import List, Tuple
+from xml.sax.saxutils import escape
+
+WORDS = (
+    'agreement party clause term payment notice service contract liability '
+    'confidential period delivery invoice schedule amendment obligation warranty '
+    'provider customer effective date termination section shall including '
+    'the of and to in for with by on as at from that this be or any'
+).split()
+
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+LINES_PER_PAGE = 60
+WORDS_PER_LINE = 14
+TABLE_ROWS = 25
+TABLE_COLUMNS = 5
+
+# Content profiles understood by generate_pdf() and generate_docx()
+PROFILES = ('dense', 'tables', 'runs')
+
+
+def random_lines(rng: random.Random, count: int, words_per_line: int = WORDS_PER_LINE) -> List[str]:
+    """Generate lines of pseudo-random words."""
+    return [' '.join(rng.choice(WORDS) for _ in range(words_per_line)) for _ in range(count)]
+
+
+def _escape_pdf_text(text: str) -> str:
+    """Escape a string for use inside a PDF literal string."""
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def build_pdf(page_streams: List[bytes]) -> bytes:
+    """Assemble a PDF file from pre-rendered page content streams.
+
+    Every page shares the standard Helvetica (``/F1``) and Helvetica-Bold
+    (``/F2``) fonts, so the output needs no embedded fonts and can be parsed
+    by any PDF library.
+    """
+    page_count = len(page_streams)
+    # Object numbers: 1 catalog, 2 page tree, 3-4 fonts, then (page, content) pairs
+    page_ids = [5 + 2 * i for i in range(page_count)]
+    objects = {
+        1: b'<< /Type /Catalog /Pages 2 0 R >>',
+        2: ('<< /Type /Pages /Kids [%s] /Count %d >>' % (
+            ' '.join(f'{pid} 0 R' for pid in page_ids), page_count)).encode('ascii'),
+        3: b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+        4: b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+    }
+    for page_id, stream in zip(page_ids, page_streams):
+        objects[page_id] = (
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] '
+            f'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {page_id + 1} 0 R >>'
+        ).encode('ascii')
+        objects[page_id + 1] = b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream'
+
+    output = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = {}
+    for object_id in sorted(objects):
+        offsets[object_id] = len(output)
+        output += b'%d 0 obj\n' % object_id + objects[object_id] + b'\nendobj\n'
+
+    xref_offset = len(output)
+    size = max(objects) + 1
+    output += b'xref\n0 %d\n0000000000 65535 f \n' % size
+    for object_id in range(1, size):
+        output += b'%010d 00000 n \n' % offsets[object_id]
+    output += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (size, xref_offset)
+    return bytes(output)
+
+
+def text_page_stream(lines: List[str], font_size: int = 10) -> bytes:
+    """Render lines of text as a PDF page content stream."""
+    leading = font_size + 2
+    parts = [f'BT /F1 {font_size} Tf {leading} TL 50 {PAGE_HEIGHT - 50} Td']
+    for line in lines:
+        parts.append(f'({_escape_pdf_text(line)}) Tj T*')
+    parts.append('ET')
+    return '\n'.join(parts).encode('latin-1', errors='replace')
+
+
+def table_page_stream(rows: List[List[str]], font_size: int = 9) -> bytes:
+    """Render a ruled table, one positioned text object per cell."""
+    column_width = (PAGE_WIDTH - 100) // len(rows[0])
+    row_height = font_size + 11
+    top = PAGE_HEIGHT - 50
+    parts = ['0.5 w']
+    for row_index, row in enumerate(rows):
+        y = top - (row_index + 1) * row_height
+        for column_index, cell in enumerate(row):
+            x = 50 + column_index * column_width
+            parts.append(f'{x} {y} {column_width} {row_height} re S')
+            parts.append(f'BT /F1 {font_size} Tf {x + 4} {y + 6} Td ({_escape_pdf_text(cell)}) Tj ET')
+    return '\n'.join(parts).encode('latin-1', errors='replace')
+
+
+def runs_page_stream(lines: List[str], font_size: int = 10) -> bytes:
+    """Render lines where every word is a separate run with alternating fonts."""
+    leading = font_size + 2
+    parts = [f'BT {leading} TL 50 {PAGE_HEIGHT - 50} Td']
+    for line in lines:
+        words = line.split(' ')
+        for index, word in enumerate(words):
+            font = 'F2' if index % 2 else 'F1'
+            suffix = ' ' if index < len(words) - 1 else ''
+            parts.append(f'/{font} {font_size} Tf ({_escape_pdf_text(word + suffix)}) Tj')
+        parts.append('T*')
+    parts.append('ET')
+    return '\n'.join(parts).encode('latin-1', errors='replace')
+
+
+def _page_content(rng: random.Random, profile: str) -> Tuple[str, List[List[str]]]:
+    """Pick the content of one page: ('lines', [[line]...]) or ('table', rows)."""
+    if profile == 'tables':
+        rows = [[' '.join(rng.choice(WORDS) for _ in range(2)) for _ in range(TABLE_COLUMNS)]
+                for _ in range(TABLE_ROWS)]
+        return 'table', rows
+    if profile in ('dense', 'runs'):
+        return 'lines', [[line] for line in random_lines(rng, LINES_PER_PAGE)]
+    raise ValueError(f'Unknown profile: {profile}')
+
+
+def generate_pdf(pages: int, profile: str = 'dense', seed: int = 0) -> Tuple[bytes, str]:
+    """Generate a PDF and the text it contains, one entry of PROFILES per page."""
+    rng = random.Random(seed)
+    streams = []
+    texts = []
+    for _ in range(pages):
+        kind, rows = _page_content(rng, profile)
+        if kind == 'table':
+            streams.append(table_page_stream(rows))
+            texts.extend(' '.join(row) for row in rows)
+        else:
+            lines = [row[0] for row in rows]
+            streams.append(runs_page_stream(lines) if profile == 'runs' else text_page_stream(lines))
+            texts.extend(lines)
+    return build_pdf(streams), '\n'.join(texts)
+
+
+def make_pdf(pages: int, seed: int = 0) -> bytes:
+    """Generate a PDF with the given number of pages of dense text."""
+    return generate_pdf(pages, 'dense', seed)[0]
+
+
+DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+
+DOCX_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+
+DOCX_NAMESPACE = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+
+
+def _docx_run(text: str, bold: bool = False) -> str:
+    properties = '<w:rPr><w:b/></w:rPr>' if bold else ''
+    return f'<w:r>{properties}<w:t xml:space="preserve">{escape(text)}</w:t></w:r>'
+
+
+def generate_docx(pages: int, profile: str = 'dense', seed: int = 0) -> Tuple[bytes, str]:
+    """Generate a DOCX and the text it contains.
+
+    Pages are separated by explicit page breaks and hold the same content as
+    the PDF generated with the same arguments.
+    """
+    rng = random.Random(seed)
+    body = []
+    texts = []
+    for page in range(pages):
+        if page:
+            body.append('<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+        kind, rows = _page_content(rng, profile)
+        if kind == 'table':
+            cells = ''.join(
+                '<w:tr>' + ''.join(f'<w:tc><w:p>{_docx_run(cell)}</w:p></w:tc>' for cell in row) + '</w:tr>'
+                for row in rows
+            )
+            body.append(f'<w:tbl>{cells}</w:tbl>')
+            texts.extend(' '.join(row) for row in rows)
+            continue
+        for row in rows:
+            line = row[0]
+            if profile == 'runs':
+                words = line.split(' ')
+                runs = ''.join(
+                    _docx_run(word + (' ' if index < len(words) - 1 else ''), bold=bool(index % 2))
+                    for index, word in enumerate(words)
+                )
+            else:
+                runs = _docx_run(line)
+            body.append(f'<w:p>{runs}</w:p>')
+            texts.append(line)
+
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        f'<w:document xmlns:w="{DOCX_NAMESPACE}"><w:body>{"".join(body)}</w:body></w:document>'
+    )
+    buffer = io.BytesIO()
+    # Fixed timestamps keep the archive byte-identical between runs
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in (('[Content_Types].xml', DOCX_CONTENT_TYPES),
+                              ('_rels/.rels', DOCX_ROOT_RELS),
+                              ('word/document.xml', document)):
+            archive.writestr(zipfile.ZipInfo(name, date_time=(2020, 1, 1, 0, 0, 0)), content)
+    return buffer.getvalue(), '\n'.join(texts)
+
+
+def make_text(size_bytes: int, seed: int = 0) -> bytes:
+    """Generate a plain-text document of roughly the given size."""
+    rng = random.Random(seed)
+    lines = []
+    total = 0
+    while total < size_bytes:
+        line = random_lines(rng, 1)[0]
+        lines.append(line)
+        total += len(line) + 1
+    return '\n'.join(lines).encode('utf-8')
+
+
+def make_document(doc_format: str, size_bytes: int, seed: int = 0) -> bytes:
+    """Generate a document of roughly ``size_bytes`` in the given format."""
+    if doc_format == 'pdf':
+        # A dense page of the generated text is roughly 6.5KB uncompressed
+        return make_pdf(max(1, size_bytes // 6500), seed=seed)
+    if doc_format == 'txt':
+        return make_text(size_bytes, seed=seed)
+    raise ValueError(f'Unsupported document format: {doc_format}')
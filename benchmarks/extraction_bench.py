@@ -0,0 +1,251 @@
+"""
+Extraction benchmark and regression suite
+
+Generates a synthetic PDF/DOCX corpus offline (see benchmarks/documents.py),
+runs every extractor implementation over it and records throughput, peak
+memory and output equivalence. Results can be saved as a baseline and later
+runs compared against it to flag regressions.
+
+Examples:
+    python -m benchmarks.extraction_bench
+    python -m benchmarks.extraction_bench --pages 1,10,100,1000 --output run.json
+    python -m benchmarks.extraction_bench --check --threshold 0.25
+    python -m benchmarks.extraction_bench --save-baseline
+"""
+
+import argparse
+import gc
+import hashlib
+import importlib.util
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from benchmarks.documents import PROFILES, generate_docx, generate_pdf
+from benchmarks.loadtest import current_commit
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+CORPUS_DIR = Path(__file__).resolve().parent / '.corpus'
+DEFAULT_BASELINE = Path(__file__).resolve().parent / 'extraction_baseline.json'
+
+GENERATORS = {
+    'pdf': generate_pdf,
+    'docx': generate_docx,
+}
+
+# (extractor, format) -> (module file, function name). The two extractor
+# packages share a name, so modules are loaded from their files directly.
+IMPLEMENTATIONS = {
+    ('functions', 'pdf'): ('extractor/pdf_extractor.py', 'extract_text_from_pdf'),
+    ('functions', 'docx'): ('extractor/docx_extractor.py', 'extract_text_from_docx'),
+    ('server', 'pdf'): ('server/extractor/pdf_extractor.py', 'extract_text_from_pdf'),
+    ('server', 'docx'): ('server/extractor/docx_extractor.py', 'extract_text_from_docx'),
+}
+
+
+def load_extractor(extractor: str, doc_format: str) -> Callable[[Path], Optional[str]]:
+    """Load an extractor function from its source file under a unique module name."""
+    relative_path, function_name = IMPLEMENTATIONS[(extractor, doc_format)]
+    module_name = f'_bench_{extractor}_{doc_format}_extractor'
+    spec = importlib.util.spec_from_file_location(module_name, REPO_ROOT / relative_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return getattr(module, function_name)
+
+
+def corpus_document(doc_format: str, profile: str, pages: int, seed: int) -> Tuple[Path, str]:
+    """Return the path of a corpus document and its ground-truth text, generating it if needed."""
+    CORPUS_DIR.mkdir(exist_ok=True)
+    stem = f'{profile}-{pages}p-s{seed}'
+    document_path = CORPUS_DIR / f'{stem}.{doc_format}'
+    truth_path = CORPUS_DIR / f'{stem}.{doc_format}.expected.txt'
+    if not document_path.exists() or not truth_path.exists():
+        content, expected = GENERATORS[doc_format](pages, profile, seed)
+        document_path.write_bytes(content)
+        truth_path.write_text(expected, encoding='utf-8')
+    return document_path, truth_path.read_text(encoding='utf-8')
+
+
+def token_recall(output: str, expected: str) -> float:
+    """Fraction of expected whitespace-separated tokens present in the output."""
+    expected_tokens = Counter(expected.split())
+    if not expected_tokens:
+        return 1.0
+    found = expected_tokens & Counter(output.split())
+    return sum(found.values()) / sum(expected_tokens.values())
+
+
+def measure(extract: Callable[[Path], Optional[str]], path: Path, repeat: int) -> Dict[str, Any]:
+    """Time ``extract`` on ``path`` and record its peak traced memory."""
+    timings = []
+    output = None
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        output = extract(path)
+        timings.append(time.perf_counter() - started)
+
+    # Memory is measured in a separate run because tracing slows execution down
+    gc.collect()
+    tracemalloc.start()
+    try:
+        extract(path)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {'seconds': statistics.median(timings), 'peakMemoryBytes': peak, 'output': output or ''}
+
+
+def run_benchmark(extractors: List[str], formats: List[str], profiles: List[str],
+                  page_counts: List[int], repeat: int, seed: int) -> Dict[str, Dict[str, Any]]:
+    """Benchmark every extractor/format/profile/size combination."""
+    results: Dict[str, Dict[str, Any]] = {}
+    for doc_format in formats:
+        implementations = {
+            extractor: load_extractor(extractor, doc_format)
+            for extractor in extractors if (extractor, doc_format) in IMPLEMENTATIONS
+        }
+        for profile in profiles:
+            for pages in page_counts:
+                path, expected = corpus_document(doc_format, profile, pages, seed)
+                size = path.stat().st_size
+                digests = {}
+                for extractor, extract in implementations.items():
+                    key = f'{extractor}.{doc_format}|{profile}|{pages}'
+                    print(f'Benchmarking {key}', file=sys.stderr)
+                    measured = measure(extract, path, repeat)
+                    output = measured.pop('output')
+                    normalized = ' '.join(output.split())
+                    digests[extractor] = hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+                    seconds = measured['seconds']
+                    results[key] = {
+                        'extractor': extractor,
+                        'format': doc_format,
+                        'profile': profile,
+                        'pages': pages,
+                        'bytes': size,
+                        'seconds': round(seconds, 5),
+                        'pagesPerSecond': round(pages / seconds, 2) if seconds else None,
+                        'mbPerSecond': round(size / (1024 * 1024) / seconds, 3) if seconds else None,
+                        'peakMemoryBytes': measured['peakMemoryBytes'],
+                        'outputChars': len(output),
+                        'tokenRecall': round(token_recall(output, expected), 4),
+                        'matchesGroundTruth': normalized == ' '.join(expected.split()),
+                    }
+                # Output equivalence between the extractor implementations
+                for extractor, digest in digests.items():
+                    others = [d for name, d in digests.items() if name != extractor]
+                    results[f'{extractor}.{doc_format}|{profile}|{pages}']['matchesOtherExtractors'] = (
+                        all(d == digest for d in others) if others else None
+                    )
+    return results
+
+
+def find_regressions(current: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+                     threshold: float) -> List[str]:
+    """Compare results against a baseline and describe every regression."""
+    regressions = []
+    for key, result in sorted(current.items()):
+        previous = baseline.get(key)
+        if not previous:
+            continue
+        if previous.get('pagesPerSecond') and result.get('pagesPerSecond'):
+            ratio = result['pagesPerSecond'] / previous['pagesPerSecond']
+            if ratio < 1 - threshold:
+                regressions.append(
+                    f'{key}: throughput {result["pagesPerSecond"]} pages/s vs '
+                    f'{previous["pagesPerSecond"]} baseline ({(1 - ratio) * 100:.0f}% slower)'
+                )
+        if previous.get('peakMemoryBytes'):
+            ratio = result['peakMemoryBytes'] / previous['peakMemoryBytes']
+            if ratio > 1 + threshold:
+                regressions.append(
+                    f'{key}: peak memory {result["peakMemoryBytes"]} bytes vs '
+                    f'{previous["peakMemoryBytes"]} baseline ({(ratio - 1) * 100:.0f}% more)'
+                )
+        if result['tokenRecall'] < previous.get('tokenRecall', 0) - 0.001:
+            regressions.append(
+                f'{key}: token recall {result["tokenRecall"]} vs {previous["tokenRecall"]} baseline'
+            )
+        if previous.get('matchesGroundTruth') and not result['matchesGroundTruth']:
+            regressions.append(f'{key}: output no longer matches the ground truth')
+        if previous.get('matchesOtherExtractors') and result.get('matchesOtherExtractors') is False:
+            regressions.append(f'{key}: output no longer matches the other extractors')
+    return regressions
+
+
+def library_versions() -> Dict[str, Optional[str]]:
+    versions = {}
+    for package in ('pypdf', 'python-docx'):
+        try:
+            from importlib.metadata import version
+            versions[package] = version(package)
+        except Exception:
+            versions[package] = None
+    return versions
+
+
+def _csv(value: str) -> List[str]:
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the text extractors on a synthetic corpus.')
+    parser.add_argument('--extractors', default='functions,server', help='Extractor implementations to run')
+    parser.add_argument('--formats', default='pdf,docx')
+    parser.add_argument('--profiles', default=','.join(PROFILES), help='Content profiles: dense, tables, runs')
+    parser.add_argument('--pages', default='1,10,100', help='Document sizes in pages, e.g. 1,10,100,1000')
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per document (median is reported)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+    parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help='Baseline file to compare or save')
+    parser.add_argument('--check', action='store_true', help='Compare against the baseline and fail on regressions')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='Relative throughput/memory change that counts as a regression (default: 0.25)')
+    parser.add_argument('--save-baseline', action='store_true', help='Store this run as the new baseline')
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(
+        _csv(args.extractors), _csv(args.formats), _csv(args.profiles),
+        [int(pages) for pages in _csv(args.pages)], args.repeat, args.seed
+    )
+    report = {
+        'generatedAt': datetime.utcnow().isoformat(),
+        'commit': current_commit(),
+        'python': platform.python_version(),
+        'libraries': library_versions(),
+        'results': results,
+    }
+
+    exit_code = 0
+    if args.check:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline.get('results', {}), args.threshold)
+        report['regressions'] = regressions
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        exit_code = 1 if regressions else 0
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    elif not args.save_baseline:
+        print(output)
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+Serialization cost of API responses
+
+Times ``json.dumps`` (what the handlers used to call inline) against
+``shared.responses.dumps`` (orjson when installed) on response payloads of
+a given size: an extraction response carrying ASCII text, the same with
+non-ASCII text, and a file listing. Reports the median time, MB/s and the
+speedup per payload as JSON.
+
+Examples:
+    python -m benchmarks.json_bench
+    python -m benchmarks.json_bench --sizes 1MB,10MB,50MB --repeat 10 --output json.json
+"""
+
+import argparse
+import gc
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.documents import WORDS, random_lines
+from benchmarks.loadtest import current_commit, parse_size
+from shared import responses
+
+UNICODE_WORDS = WORDS + 'café naïve über straße société 合同 条款 付款 договор услуга «цитата» — “quoted”'.split()
+PAYLOADS = ('extraction-ascii', 'extraction-unicode', 'listing')
+DEFAULT_SIZES = '1MB,5MB,20MB'
+
+ENCODERS: Dict[str, Callable[[Any], bytes]] = {
+    'json': lambda data: json.dumps(data).encode('utf-8'),
+    'responses': responses.dumps,
+}
+
+
+def _text(size: int, words: List[str], seed: int) -> str:
+    rng = random.Random(seed)
+    lines = []
+    length = 0
+    while length < size:
+        line = ' '.join(rng.choice(words) for _ in range(14))
+        lines.append(line)
+        length += len(line.encode('utf-8')) + 1
+    return '\n'.join(lines)
+
+
+def _extraction(text: str) -> Dict[str, Any]:
+    return {
+        'success': True,
+        'text': text,
+        'source': 'extracted',
+        'etag': '"0x8DC1234567890AB"',
+        'extractedAt': datetime.utcnow().isoformat()
+    }
+
+
+def _listing(size: int, seed: int) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    uploaded = datetime(2024, 1, 1)
+    files = []
+    length = 0
+    while length < size:
+        name = '-'.join(random_lines(rng, 1, 3)[0].split()) + f'-{len(files)}.pdf'
+        entry = {
+            'id': name,
+            'name': name,
+            'originalName': name,
+            'size': rng.randint(10_000, 50_000_000),
+            'type': 'application/pdf',
+            'uploadedAt': (uploaded + timedelta(minutes=len(files))).isoformat(),
+            'lastModified': (uploaded + timedelta(minutes=len(files) + 1)).isoformat(),
+            'hasExtractedText': rng.random() < 0.5,
+            'extractedAt': None,
+            'pageCount': rng.randint(1, 400),
+            'wordCount': rng.randint(100, 200_000),
+            'languages': ['en']
+        }
+        files.append(entry)
+        length += len(json.dumps(entry))
+    return files
+
+
+def make_payload(kind: str, size: int, seed: int = 0) -> Any:
+    if kind == 'extraction-ascii':
+        return _extraction(_text(size, WORDS, seed))
+    if kind == 'extraction-unicode':
+        return _extraction(_text(size, UNICODE_WORDS, seed))
+    if kind == 'listing':
+        return _listing(size, seed)
+    raise ValueError(f'Unknown payload: {kind}')
+
+
+def measure(encode: Callable[[Any], bytes], payload: Any, repeat: int) -> Dict[str, Any]:
+    timings = []
+    output = b''
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        output = encode(payload)
+        timings.append(time.perf_counter() - started)
+    seconds = statistics.median(timings)
+    return {
+        'ms': round(seconds * 1000, 3),
+        'outputBytes': len(output),
+        'mbPerSecond': round(len(output) / (1024 * 1024) / seconds, 1) if seconds else None
+    }
+
+
+def run_benchmark(payloads: List[str], sizes: List[int], repeat: int, seed: int) -> Dict[str, Dict[str, Any]]:
+    results = {}
+    for kind in payloads:
+        for size in sizes:
+            payload = make_payload(kind, size, seed)
+            encoded = {name: measure(encode, payload, repeat) for name, encode in ENCODERS.items()}
+            if json.loads(ENCODERS['responses'](payload)) != json.loads(ENCODERS['json'](payload)):
+                raise AssertionError(f'Encoders disagree on {kind} ({size} bytes)')
+            result = {'sizeBytes': size, **encoded}
+            if encoded['responses']['ms']:
+                result['speedup'] = round(encoded['json']['ms'] / encoded['responses']['ms'], 2)
+            results[f'{kind}/{size}'] = result
+    return results
+
+
+def _csv(value: str) -> List[str]:
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark JSON serialization of API responses.')
+    parser.add_argument('--payloads', default=','.join(PAYLOADS), help='Payload kinds to serialize')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f'Payload sizes (default: {DEFAULT_SIZES})')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per payload (median is reported)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+    args = parser.parse_args(argv)
+
+    report = {
+        'generatedAt': datetime.utcnow().isoformat(),
+        'commit': current_commit(),
+        'python': platform.python_version(),
+        'backend': 'orjson' if responses.orjson is not None else 'json',
+        'results': run_benchmark(_csv(args.payloads), [parse_size(size) for size in _csv(args.sizes)],
+                                 args.repeat, args.seed),
+    }
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
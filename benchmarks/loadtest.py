@@ -0,0 +1,479 @@
+"""
+End-to-end load generator for the document API
+
+Drives either a running server over HTTP (the Flask backend or ``func start``,
+both pointed at Azurite or a real storage account) or the Function handlers
+and Flask app in-process, and reports throughput, latency percentiles and
+error rate per endpoint as JSON.
+
+Examples:
+    python -m benchmarks.loadtest --target http --base-url http://localhost:5000/api
+    python -m benchmarks.loadtest --target functions --mix list=4,extract=4,upload=1 \\
+        --sizes 50KB=3,2MB=1 --concurrency 8 --duration 30 --output run.json
+"""
+
+import argparse
+import http.client
+import importlib
+import json
+import math
+import os
+import random
+import re
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, quote, unquote, urlsplit
+
+from benchmarks.documents import make_document
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MIX = 'list=4,extract=4,upload=1,download=1'
+DEFAULT_SIZES = '50KB=3,500KB=2,5MB=1'
+
+# Every function.json route starts with this segment: the in-process
+# transport strips it to match paths and adds it back once to request URLs
+ROUTE_PREFIX = 'api'
+
+CONTENT_TYPES = {
+    'pdf': 'application/pdf',
+    'txt': 'text/plain',
+}
+
+SIZE_UNITS = {'B': 1, 'KB': 1024, 'MB': 1024 * 1024}
+
+
+# ---------------------------------------------------------------------------
+# Transports
+# ---------------------------------------------------------------------------
+
+class HttpTransport:
+    """Sends requests to a running server, one keep-alive connection per thread."""
+
+    def __init__(self, base_url: str, timeout: float = 120.0):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme
+        self.netloc = parts.netloc
+        self.base_path = parts.path.rstrip('/')
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+            connection = connection_class(self.netloc, timeout=self.timeout)
+            self._local.connection = connection
+        return connection
+
+    def request(self, method: str, path: str, body: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None) -> Tuple[int, bytes]:
+        connection = self._connection()
+        try:
+            connection.request(method, self.base_path + path, body=body, headers=headers or {})
+            response = connection.getresponse()
+            return response.status, response.read()
+        except (http.client.HTTPException, OSError):
+            # Drop the broken connection so the next request reconnects
+            connection.close()
+            self._local.connection = None
+            raise
+
+
+class FlaskTransport:
+    """Calls the Flask app in-process through its test client."""
+
+    def __init__(self):
+        server_dir = os.path.join(REPO_ROOT, 'server')
+        if server_dir not in sys.path:
+            sys.path.insert(0, server_dir)
+        self.app = importlib.import_module('app').app
+        self._local = threading.local()
+
+    def request(self, method: str, path: str, body: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None) -> Tuple[int, bytes]:
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open('/api' + path, method=method, data=body, headers=headers or {})
+        return response.status_code, response.get_data()
+
+
+class FunctionsTransport:
+    """Invokes the Azure Function handlers in-process.
+
+    Routes are read from each function's ``function.json`` so new functions
+    are picked up without changes here.
+    """
+
+    def __init__(self):
+        import azure.functions as func
+
+        self.func = func
+        if REPO_ROOT not in sys.path:
+            sys.path.insert(0, REPO_ROOT)
+        self.routes: List[Tuple[re.Pattern, List[str], Callable]] = []
+
+        for entry in sorted(os.listdir(REPO_ROOT)):
+            config_path = os.path.join(REPO_ROOT, entry, 'function.json')
+            if not os.path.isfile(config_path):
+                continue
+            with open(config_path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+            for binding in config.get('bindings', []):
+                if binding.get('type') == 'httpTrigger':
+                    handler = importlib.import_module(entry).main
+                    methods = [m.upper() for m in binding.get('methods', [])]
+                    self.routes.append((self._compile_route(binding['route']), methods, handler))
+
+    @staticmethod
+    def _compile_route(route: str) -> re.Pattern:
+        """Translate a Functions route template into a regular expression."""
+        route = re.sub(rf'^{ROUTE_PREFIX}/', '', route)
+        pattern = ''
+        for segment in route.split('/'):
+            match = re.fullmatch(r'\{(\w+)(?::\w+)?(\?)?\}', segment)
+            if match and match.group(2):
+                pattern += rf'(?:/(?P<{match.group(1)}>[^/]+))?'
+            elif match:
+                pattern += rf'/(?P<{match.group(1)}>[^/]+)'
+            else:
+                pattern += '/' + re.escape(segment)
+        return re.compile(pattern + '$')
+
+    def request(self, method: str, path: str, body: Optional[bytes] = None,
+                headers: Optional[Dict[str, str]] = None) -> Tuple[int, bytes]:
+        path, _, query = path.partition('?')
+        for pattern, methods, handler in self.routes:
+            match = pattern.match(path)
+            if match and method in methods:
+                route_params = {k: unquote(v) for k, v in match.groupdict().items() if v is not None}
+                req = self.func.HttpRequest(
+                    method=method,
+                    url=f'http://localhost/{ROUTE_PREFIX}{path}',
+                    headers=headers or {},
+                    params=dict(parse_qsl(query)),
+                    route_params=route_params,
+                    body=body or b''
+                )
+                response = handler(req)
+                return response.status_code, response.get_body()
+        return 404, b''
+
+
+# ---------------------------------------------------------------------------
+# Workload
+# ---------------------------------------------------------------------------
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """Parse ``name=weight,name=weight`` into a dict."""
+    weights = {}
+    for item in spec.split(','):
+        if item.strip():
+            name, _, weight = item.partition('=')
+            weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def parse_size(value: str) -> int:
+    """Parse a size such as ``50KB`` or ``2MB`` into bytes."""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KM]?B)?\s*', value.upper())
+    if not match:
+        raise ValueError(f'Invalid size: {value}')
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2) or 'B'])
+
+
+def build_multipart(field: str, filename: str, content: bytes, content_type: str) -> Tuple[bytes, str]:
+    """Encode a single file as a multipart/form-data body."""
+    boundary = uuid.uuid4().hex
+    body = (
+        f'--{boundary}\r\n'
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        f'Content-Type: {content_type}\r\n\r\n'
+    ).encode('utf-8') + content + f'\r\n--{boundary}--\r\n'.encode('utf-8')
+    return body, f'multipart/form-data; boundary={boundary}'
+
+
+class Workload:
+    """Shared state for one load-test run: the document corpus and uploaded names."""
+
+    def __init__(self, transport, sizes: Dict[int, float], doc_format: str,
+                 variants: int = 3, seed: int = 0):
+        self.transport = transport
+        self.doc_format = doc_format
+        self.size_choices = list(sizes)
+        self.size_weights = list(sizes.values())
+        # Generate payloads up front so document generation is not measured
+        self.payloads = {
+            size: [make_document(doc_format, size, seed=seed + i) for i in range(variants)]
+            for size in sizes
+        }
+        self.uploaded: List[str] = []
+        self._lock = threading.Lock()
+
+    def pick_document(self, rng: random.Random) -> Optional[str]:
+        with self._lock:
+            return rng.choice(self.uploaded) if self.uploaded else None
+
+    def upload(self, rng: random.Random) -> Tuple[int, Dict[str, Any]]:
+        size = rng.choices(self.size_choices, weights=self.size_weights)[0]
+        content = rng.choice(self.payloads[size])
+        filename = f'loadtest-{uuid.uuid4().hex[:12]}.{self.doc_format}'
+        body, content_type = build_multipart('file', filename, content, CONTENT_TYPES[self.doc_format])
+        status, response = self.transport.request('POST', '/upload', body, {'Content-Type': content_type})
+        data = _json_or_empty(response)
+        name = data.get('filename') or data.get('blobName')
+        if status == 200 and name:
+            with self._lock:
+                self.uploaded.append(name)
+        return status, data
+
+
+def _json_or_empty(body: bytes) -> Dict[str, Any]:
+    try:
+        data = json.loads(body or b'{}')
+        return data if isinstance(data, dict) else {}
+    except ValueError:
+        return {}
+
+
+def op_health(workload: Workload, rng: random.Random) -> Tuple[int, Dict[str, Any]]:
+    status, _ = workload.transport.request('GET', '/health')
+    return status, {}
+
+
+def op_list(workload: Workload, rng: random.Random) -> Tuple[int, Dict[str, Any]]:
+    status, _ = workload.transport.request('GET', '/files')
+    return status, {}
+
+
+def op_upload(workload: Workload, rng: random.Random) -> Tuple[int, Dict[str, Any]]:
+    return workload.upload(rng)
+
+
+def _upload_instead(workload: Workload, rng: random.Random) -> Tuple[int, Dict[str, Any]]:
+    """Upload a document when there is none to operate on yet, recorded as an upload."""
+    status, data = workload.upload(rng)
+    return status, {**data, 'operation': 'upload'}
+
+
+def op_extract(workload: Workload, rng: random.Random) -> Tuple[int, Dict[str, Any]]:
+    name = workload.pick_document(rng)
+    if name is None:
+        return _upload_instead(workload, rng)
+    status, body = workload.transport.request('POST', f'/extract-text/{quote(name)}')
+    data = _json_or_empty(body)
+    return status, {'source': data.get('source')}
+
+
+def op_download(workload: Workload, rng: random.Random) -> Tuple[int, Dict[str, Any]]:
+    name = workload.pick_document(rng)
+    if name is None:
+        return _upload_instead(workload, rng)
+    status, _ = workload.transport.request('GET', f'/files/{quote(name)}/download')
+    return status, {}
+
+
+OPERATIONS: Dict[str, Callable[[Workload, random.Random], Tuple[int, Dict[str, Any]]]] = {
+    'health': op_health,
+    'list': op_list,
+    'upload': op_upload,
+    'extract': op_extract,
+    'download': op_download,
+}
+
+
+# ---------------------------------------------------------------------------
+# Measurement
+# ---------------------------------------------------------------------------
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(samples: List[Tuple[str, float, int, Optional[str], Dict[str, Any]]],
+              elapsed: float) -> Dict[str, Any]:
+    """Aggregate raw samples into per-endpoint statistics."""
+    by_endpoint: Dict[str, List[Tuple[float, int, Optional[str], Dict[str, Any]]]] = {}
+    for endpoint, latency, status, error, extra in samples:
+        by_endpoint.setdefault(endpoint, []).append((latency, status, error, extra))
+
+    endpoints = {}
+    for endpoint, rows in sorted(by_endpoint.items()):
+        latencies = sorted(row[0] * 1000.0 for row in rows)
+        errors = [row for row in rows if row[2] is not None or not 200 <= row[1] < 300]
+        statuses: Dict[str, int] = {}
+        for row in rows:
+            statuses[str(row[1])] = statuses.get(str(row[1]), 0) + 1
+        summary = {
+            'requests': len(rows),
+            'errors': len(errors),
+            'errorRate': round(len(errors) / len(rows), 4),
+            'throughput': round(len(rows) / elapsed, 2) if elapsed else None,
+            'statuses': statuses,
+            'latencyMs': {
+                'p50': _round(percentile(latencies, 50)),
+                'p95': _round(percentile(latencies, 95)),
+                'p99': _round(percentile(latencies, 99)),
+                'mean': _round(sum(latencies) / len(latencies)),
+                'max': _round(latencies[-1]),
+            },
+            'sampleErrors': sorted({row[2] for row in errors if row[2]})[:5],
+        }
+        sources = [row[3].get('source') for row in rows if row[3].get('source')]
+        if sources:
+            summary['sources'] = {source: sources.count(source) for source in sorted(set(sources))}
+        endpoints[endpoint] = summary
+
+    total_errors = sum(summary['errors'] for summary in endpoints.values())
+    return {
+        'totals': {
+            'requests': len(samples),
+            'errors': total_errors,
+            'errorRate': round(total_errors / len(samples), 4) if samples else 0.0,
+            'throughput': round(len(samples) / elapsed, 2) if elapsed else None,
+        },
+        'endpoints': endpoints,
+    }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 2) if value is not None else None
+
+
+def run_load(workload: Workload, mix: Dict[str, float], concurrency: int,
+             duration: float, max_requests: Optional[int] = None, seed: int = 0) -> Dict[str, Any]:
+    """Run the workload mix with ``concurrency`` workers and return a summary."""
+    unknown = set(mix) - set(OPERATIONS)
+    if unknown:
+        raise ValueError(f'Unknown operations in mix: {", ".join(sorted(unknown))}')
+
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    issued = [0]
+    issued_lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(worker_id: int) -> List[Tuple[str, float, int, Optional[str], Dict[str, Any]]]:
+        rng = random.Random(seed * 1000 + worker_id)
+        samples = []
+        while time.perf_counter() < deadline:
+            if max_requests is not None:
+                with issued_lock:
+                    if issued[0] >= max_requests:
+                        break
+                    issued[0] += 1
+            name = rng.choices(names, weights=weights)[0]
+            started = time.perf_counter()
+            try:
+                status, extra = OPERATIONS[name](workload, rng)
+                error = None
+            except Exception as exc:
+                status, extra, error = 0, {}, f'{type(exc).__name__}: {exc}'
+            samples.append((extra.pop('operation', name), time.perf_counter() - started, status, error, extra))
+        return samples
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    samples = [sample for worker_samples in results for sample in worker_samples]
+    report = summarize(samples, elapsed)
+    report['durationSeconds'] = round(elapsed, 3)
+    return report
+
+
+def current_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, stderr=subprocess.DEVNULL
+        ).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def create_transport(target: str, base_url: Optional[str]):
+    if target == 'http':
+        if not base_url:
+            raise ValueError('--base-url is required for the http target')
+        return HttpTransport(base_url)
+    if target == 'flask':
+        return FlaskTransport()
+    if target == 'functions':
+        return FunctionsTransport()
+    raise ValueError(f'Unknown target: {target}')
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Load-test the document API.')
+    parser.add_argument('--target', choices=['http', 'flask', 'functions'], default='http',
+                        help='Drive a running server over HTTP, or the Flask app / Function handlers in-process')
+    parser.add_argument('--base-url', help='API root for the http target, e.g. http://localhost:5000/api')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Operation weights (default: {DEFAULT_MIX})')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f'Upload size weights (default: {DEFAULT_SIZES})')
+    parser.add_argument('--format', dest='doc_format', choices=sorted(CONTENT_TYPES), default='pdf')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds to run the measured phase')
+    parser.add_argument('--requests', type=int, help='Stop after this many requests')
+    parser.add_argument('--seed-docs', type=int, default=5, help='Documents to upload before measuring')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cleanup', action='store_true', help='Delete uploaded documents afterwards')
+    parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+    args = parser.parse_args(argv)
+
+    mix = parse_weights(args.mix)
+    sizes = {parse_size(size): weight for size, weight in parse_weights(args.sizes).items()}
+    transport = create_transport(args.target, args.base_url)
+    workload = Workload(transport, sizes, args.doc_format, seed=args.seed)
+
+    seed_rng = random.Random(args.seed)
+    for _ in range(args.seed_docs):
+        workload.upload(seed_rng)
+
+    report = {
+        'startedAt': datetime.utcnow().isoformat(),
+        'commit': current_commit(),
+        'config': {
+            'target': args.target,
+            'baseUrl': args.base_url,
+            'mix': mix,
+            'sizes': {str(size): weight for size, weight in sizes.items()},
+            'format': args.doc_format,
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'requests': args.requests,
+            'seedDocs': args.seed_docs,
+            'seed': args.seed,
+        },
+    }
+    report.update(run_load(workload, mix, args.concurrency, args.duration, args.requests, args.seed))
+
+    if args.cleanup:
+        for name in workload.uploaded:
+            try:
+                transport.request('DELETE', f'/files/{quote(name)}')
+            except Exception as error:
+                print(f'Cleanup failed for {name}: {error}', file=sys.stderr)
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0 if report['totals']['errors'] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
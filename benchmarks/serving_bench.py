@@ -0,0 +1,171 @@
+"""
+Throughput of the Flask backend under the development server vs. serve.py
+
+Starts the backend once per mode on a local port, runs the same load-test
+workload against it over HTTP (``benchmarks.loadtest``), stops it, and
+reports each mode's results plus the production/dev throughput ratio as
+JSON. The server inherits this process's environment, so point
+``AZURE_STORAGE_CONNECTION_STRING`` at Azurite or a test account.
+
+Examples:
+    python -m benchmarks.serving_bench --duration 30 --concurrency 16
+    python -m benchmarks.serving_bench --modes production --workers 4 --threads 8 --output run.json
+"""
+
+import argparse
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from urllib.parse import quote
+
+from benchmarks.loadtest import (CONTENT_TYPES, DEFAULT_MIX, DEFAULT_SIZES, HttpTransport, REPO_ROOT, Workload,
+                                 current_commit, parse_size, parse_weights, run_load)
+
+SERVER_DIR = os.path.join(REPO_ROOT, 'server')
+MODES = ('dev', 'production')
+
+
+def server_command(mode: str, workers: Optional[int], threads: Optional[int]) -> List[str]:
+    if mode == 'dev':
+        return [sys.executable, 'start_python_server.py']
+    command = [sys.executable, 'serve.py']
+    if workers:
+        command += ['--workers', str(workers)]
+    if threads:
+        command += ['--threads', str(threads)]
+    return command
+
+
+def start_server(command: List[str], port: int) -> subprocess.Popen:
+    env = dict(os.environ, PORT=str(port))
+    if os.name == 'nt':
+        return subprocess.Popen(command, cwd=SERVER_DIR, env=env,
+                                creationflags=subprocess.CREATE_NEW_PROCESS_GROUP)
+    # Own process group, so the dev server's reloader child is stopped too
+    return subprocess.Popen(command, cwd=SERVER_DIR, env=env, start_new_session=True)
+
+
+def stop_server(process: subprocess.Popen, timeout: float = 30.0) -> None:
+    if process.poll() is not None:
+        return
+    if os.name == 'nt':
+        process.terminate()
+    else:
+        os.killpg(process.pid, signal.SIGTERM)
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        if os.name == 'nt':
+            process.kill()
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+        process.wait()
+
+
+def wait_until_healthy(transport: HttpTransport, process: subprocess.Popen, timeout: float) -> None:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'Server exited with code {process.returncode} before becoming healthy')
+        try:
+            status, _ = transport.request('GET', '/health')
+            if status == 200:
+                return
+        except Exception:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f'Server not healthy after {timeout:.0f}s')
+
+
+def run_mode(mode: str, args: argparse.Namespace, mix: Dict[str, float], sizes: Dict[int, float]) -> Dict[str, Any]:
+    """Start the server in ``mode``, load it and stop it again."""
+    process = start_server(server_command(mode, args.workers, args.threads), args.port)
+    transport = HttpTransport(f'http://127.0.0.1:{args.port}/api')
+    workload = Workload(transport, sizes, args.doc_format, seed=args.seed)
+    try:
+        wait_until_healthy(transport, process, args.startup_timeout)
+        seed_rng = random.Random(args.seed)
+        for _ in range(args.seed_docs):
+            workload.upload(seed_rng)
+        report = run_load(workload, mix, args.concurrency, args.duration, args.requests, args.seed)
+        for name in workload.uploaded:
+            try:
+                transport.request('DELETE', f'/files/{quote(name)}')
+            except Exception as error:
+                print(f'Cleanup failed for {name}: {error}', file=sys.stderr)
+        return report
+    finally:
+        stop_server(process)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Compare the Flask dev server with the production launcher.')
+    parser.add_argument('--modes', default=','.join(MODES), help='Server modes to run: dev, production')
+    parser.add_argument('--workers', type=int, help='Worker processes for production (default: WEB_CONCURRENCY)')
+    parser.add_argument('--threads', type=int, help='Threads per worker for production (default: WEB_THREADS)')
+    parser.add_argument('--port', type=int, default=5100)
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Operation weights (default: {DEFAULT_MIX})')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help=f'Upload size weights (default: {DEFAULT_SIZES})')
+    parser.add_argument('--format', dest='doc_format', choices=sorted(CONTENT_TYPES), default='pdf')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds to load each mode')
+    parser.add_argument('--requests', type=int, help='Stop each mode after this many requests')
+    parser.add_argument('--seed-docs', type=int, default=5, help='Documents to upload before measuring')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--startup-timeout', type=float, default=60.0)
+    parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+    args = parser.parse_args(argv)
+
+    modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f'Unknown modes: {", ".join(sorted(unknown))}')
+    mix = parse_weights(args.mix)
+    sizes = {parse_size(size): weight for size, weight in parse_weights(args.sizes).items()}
+
+    report: Dict[str, Any] = {
+        'startedAt': datetime.utcnow().isoformat(),
+        'commit': current_commit(),
+        'config': {
+            'modes': modes,
+            'workers': args.workers,
+            'threads': args.threads,
+            'mix': mix,
+            'sizes': {str(size): weight for size, weight in sizes.items()},
+            'format': args.doc_format,
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'requests': args.requests,
+            'seedDocs': args.seed_docs,
+            'seed': args.seed,
+            'cpuCount': os.cpu_count(),
+        },
+        'modes': {},
+    }
+    for mode in modes:
+        print(f'Running {mode} server...', file=sys.stderr)
+        report['modes'][mode] = run_mode(mode, args, mix, sizes)
+
+    results = report['modes']
+    if 'dev' in results and 'production' in results:
+        dev_throughput = results['dev']['totals']['throughput']
+        if dev_throughput:
+            report['throughputRatio'] = round(results['production']['totals']['throughput'] / dev_throughput, 2)
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return 0 if all(result['totals']['errors'] == 0 for result in results.values()) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
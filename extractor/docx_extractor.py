@@ -5,15 +5,15 @@ Extracts text from DOCX files using python-docx library
 
 from docx import Document
 from pathlib import Path
-from typing import Optional
+from typing import BinaryIO, Optional, Union
 
 
-def extract_text_from_docx(file_path: Path) -> Optional[str]:
+def extract_text_from_docx(file_path: Union[Path, BinaryIO]) -> Optional[str]:
     """
     Extract text from a DOCX file.
     
     Args:
-        file_path: Path to the DOCX file
+        file_path: Path to the DOCX file, or a binary stream of its contents
         
     Returns:
         Extracted text as string, or None if extraction fails
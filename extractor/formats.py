@@ -0,0 +1,64 @@
+"""
+Formats the Azure Functions can extract text from
+
+Registration order matters: the first format whose sniffer matches a
+file's header is used, so specific signatures come before the plain-text
+fallback. To support a new format, add its extractor module and register
+it here.
+"""
+
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Union
+
+from shared.extractor_registry import (
+    ExtractorRegistry,
+    has_magic,
+    is_utf8_text,
+    is_zip,
+    ooxml_package
+)
+
+from .docx_extractor import extract_text_from_docx
+from .pdf_extractor import extract_pages_from_pdf, join_pages, page_offsets
+from .xlsx_extractor import extract_text_from_xlsx
+
+registry = ExtractorRegistry()
+
+_IMAGE_SIGNATURES = (b'\x89PNG\r\n\x1a\n', b'\xff\xd8\xff', b'GIF87a', b'GIF89a', b'II*\x00', b'MM\x00*')
+
+
+def _extract_pdf(file_path: Union[Path, BinaryIO]) -> Dict[str, Any]:
+    pages = extract_pages_from_pdf(file_path)
+    return {
+        'text': join_pages(pages),
+        'pageCount': len(pages) if pages is not None else None,
+        'pageOffsets': page_offsets(pages)
+    }
+
+
+def _is_image(header: bytes, filename: str) -> bool:
+    # BMP has only a two-byte signature; its reserved header fields are zero
+    is_bmp = header.startswith(b'BM') and header[6:10] == b'\x00' * 4
+    return is_bmp or header.startswith(_IMAGE_SIGNATURES)
+
+
+def _extract_plain_text(file_path: Union[Path, BinaryIO]) -> Dict[str, Any]:
+    if hasattr(file_path, 'read'):
+        return {'text': file_path.read().decode('utf-8-sig')}
+    with open(file_path, 'r', encoding='utf-8-sig') as f:
+        return {'text': f.read()}
+
+
+registry.register('pdf', has_magic(b'%PDF-', within=1024), _extract_pdf)
+registry.register('docx', ooxml_package('word/', '.docx'),
+                  lambda file_path: {'text': extract_text_from_docx(file_path)})
+registry.register('xlsx', ooxml_package('xl/', '.xlsx'),
+                  lambda file_path: {'text': extract_text_from_xlsx(file_path)})
+registry.register(
+    'ole2', has_magic(b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'),
+    reason='Legacy Office files (.doc, .xls) are not supported for text extraction; '
+           'save the file as .docx or .xlsx'
+)
+registry.register('zip', is_zip, reason='ZIP archives other than DOCX and XLSX are not supported for text extraction')
+registry.register('image', _is_image, reason='Images contain no extractable text')
+registry.register('txt', is_utf8_text, _extract_plain_text)
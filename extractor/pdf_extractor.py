@@ -5,33 +5,81 @@ Extracts text from PDF files using pypdf library
 
 import pypdf
 from pathlib import Path
-from typing import Optional
+from typing import BinaryIO, List, Optional, Union
 
 
-def extract_text_from_pdf(file_path: Path) -> Optional[str]:
+def extract_pages_from_pdf(file_path: Union[Path, BinaryIO]) -> Optional[List[str]]:
     """
-    Extract text from a PDF file.
-    
+    Extract the text of every page of a PDF file.
+
     Args:
-        file_path: Path to the PDF file
-        
+        file_path: Path to the PDF file, or a binary stream of its contents
+
     Returns:
-        Extracted text as string, or None if extraction fails
+        List with one string per page (empty for pages without text),
+        or None if extraction fails
     """
     try:
-        text = ""
-        
+        pages = []
+
+        if hasattr(file_path, 'read'):
+            pdf_reader = pypdf.PdfReader(file_path)
+            for page in pdf_reader.pages:
+                pages.append(page.extract_text() or "")
+            return pages
+
         with open(file_path, 'rb') as file:
             pdf_reader = pypdf.PdfReader(file)
-            
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                page_text = page.extract_text()
-                if page_text:
-                    text += page_text + "\n"
-        
-        return text.strip() if text else None
-        
+
+            for page in pdf_reader.pages:
+                pages.append(page.extract_text() or "")
+
+        return pages
+
     except Exception as e:
         print(f"Error extracting text from PDF {file_path}: {e}")
         return None
+
+
+def join_pages(pages: Optional[List[str]]) -> Optional[str]:
+    """Join page texts the way extract_text_from_pdf returns them."""
+    if not pages:
+        return None
+
+    text = "".join(page_text + "\n" for page_text in pages if page_text)
+    return text.strip() if text else None
+
+
+def page_offsets(pages: Optional[List[str]]) -> Optional[List[int]]:
+    """
+    Character offset at which each page starts in join_pages(pages).
+
+    Pages without text start where the next page with text starts, so the
+    page holding offset ``i`` is ``bisect_right(offsets, i)`` (1-based).
+    """
+    text = join_pages(pages)
+    if text is None:
+        return None
+
+    joined = "".join(page_text + "\n" for page_text in pages if page_text)
+    leading = len(joined) - len(joined.lstrip())
+    offsets = []
+    position = 0
+    for page_text in pages:
+        offsets.append(min(max(position - leading, 0), len(text)))
+        if page_text:
+            position += len(page_text) + 1
+    return offsets
+
+
+def extract_text_from_pdf(file_path: Path) -> Optional[str]:
+    """
+    Extract text from a PDF file.
+
+    Args:
+        file_path: Path to the PDF file
+
+    Returns:
+        Extracted text as string, or None if extraction fails
+    """
+    return join_pages(extract_pages_from_pdf(file_path))
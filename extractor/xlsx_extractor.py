@@ -0,0 +1,112 @@
+"""
+XLSX Text Extractor
+Extracts sheet contents from XLSX files as tab-separated text using
+openpyxl's read-only mode, which streams rows from the workbook XML instead
+of loading whole sheets into memory
+"""
+
+import datetime
+import io
+from pathlib import Path
+from typing import Any, BinaryIO, Optional, Union
+
+from openpyxl import load_workbook
+
+# Limits keeping the extracted text (the only thing held in memory) bounded
+MAX_ROWS_PER_SHEET = 200_000
+MAX_COLUMNS = 256
+MAX_TEXT_CHARS = 20_000_000
+# openpyxl yields every row up to the last one used, however sparse, so
+# scanned rows (empty ones included) are capped per sheet at this multiple
+# of max_rows_per_sheet, and across the workbook
+SCAN_FACTOR = 2
+MAX_SCANNED_ROWS = 500_000
+
+
+def _format_cell(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    # Tabs and line breaks inside a cell would break the TSV layout
+    return " ".join(str(value).split()) if isinstance(value, str) else str(value)
+
+
+def extract_text_from_xlsx(file_path: Union[Path, BinaryIO],
+                           max_rows_per_sheet: int = MAX_ROWS_PER_SHEET,
+                           max_columns: int = MAX_COLUMNS,
+                           max_chars: int = MAX_TEXT_CHARS,
+                           max_scanned_rows: int = MAX_SCANNED_ROWS) -> Optional[str]:
+    """
+    Extract text from an XLSX file, one TSV block per sheet.
+
+    Each sheet starts with a "# Sheet: <title>" line; empty rows and
+    trailing empty cells are skipped. Formulas yield their cached values.
+    Sheets longer than max_rows_per_sheet, rows wider than max_columns and
+    output beyond max_chars are truncated with a note, as are sheets and
+    workbooks whose scan exceeds the SCAN_FACTOR / max_scanned_rows limits.
+
+    Args:
+        file_path: Path to the XLSX file, or a binary stream of its contents
+
+    Returns:
+        Extracted text as string, or None if extraction fails
+    """
+    try:
+        workbook = load_workbook(file_path, read_only=True, data_only=True)
+    except Exception as e:
+        print(f"Error opening XLSX {file_path}: {e}")
+        return None
+
+    output = io.StringIO()
+    scanned = 0
+    try:
+        for sheet in workbook.worksheets:
+            if output.tell() >= max_chars:
+                output.write("[Text limit reached; remaining sheets omitted]\n")
+                break
+            if scanned >= max_scanned_rows:
+                output.write("[Row limit reached; remaining sheets omitted]\n")
+                break
+
+            # Stored dimensions are often wrong and would cut rows off; without
+            # them rows are read as they appear in the XML, unpadded
+            sheet.reset_dimensions()
+            output.write(f"# Sheet: {sheet.title}\n")
+            rows = 0
+            sheet_scan_limit = min(max_rows_per_sheet * SCAN_FACTOR, max_scanned_rows - scanned)
+            sheet_scanned = 0
+            # max_col stops rows from being built wider than max_columns (narrower
+            # ones are padded with None up to it)
+            for row in sheet.iter_rows(max_col=max_columns, values_only=True):
+                if sheet_scanned >= sheet_scan_limit:
+                    output.write(f"[Sheet truncated after scanning {sheet_scanned} rows]\n")
+                    break
+                sheet_scanned += 1
+                width = len(row)
+                while width and (row[width - 1] is None or row[width - 1] == ""):
+                    width -= 1
+                if not width:
+                    continue
+                cells = [_format_cell(value) for value in row[:width]]
+                if rows >= max_rows_per_sheet:
+                    output.write(f"[Sheet truncated after {max_rows_per_sheet} rows]\n")
+                    break
+                output.write("\t".join(cells) + "\n")
+                rows += 1
+                if output.tell() >= max_chars:
+                    break
+            scanned += sheet_scanned
+            output.write("\n")
+
+        text = output.getvalue()
+        return text.strip() if text.strip() else None
+
+    except Exception as e:
+        print(f"Error extracting text from XLSX {file_path}: {e}")
+        return None
+    finally:
+        # Read-only workbooks keep the file open until closed
+        workbook.close()
@@ -4,22 +4,41 @@ Document Upload & Viewer Backend
 A Flask-based backend for document management with Azure Blob Storage
 """
 
+import io
 import os
+import sys
 import json
 import tempfile
+import time
 from datetime import datetime, timedelta
+from itertools import chain
 from pathlib import Path
+from urllib.parse import quote
 from typing import Optional, Dict, Any
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, g, request, jsonify, send_file
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 from azure.storage.blob import BlobServiceClient, generate_blob_sas, BlobSasPermissions, ContentSettings
-from azure.core.exceptions import ResourceNotFoundError
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceModifiedError, ResourceNotFoundError
+
+# Shared modules live in the repository root next to the Azure Functions
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from shared import (chunk_store, http_ranges, metrics, minhash, search_index, similarity,
+                    thumbnails, zipstream)
+from shared.admission import Overloaded, extraction_admission
+from shared.batch_upload import MAX_BATCH_FILES, UploadPart, upload_batch
+from shared.derived_text import after_text_stored
+from shared.extractor_registry import HEADER_BYTES, FileFormat, UnsupportedFileType, read_blob_header
+from shared.index_sync import IndexWarming
+from shared.listing import iter_file_entries, stream_json_array, stream_json_lines
+from shared.text_patch import parse_patch_request, utf16_length
+from shared.text_versions import VERSIONS_PREFIX, delete_versions, get_version, list_versions, save_text
+from shared.upload_extraction import EXTRACT_ON_UPLOAD, extract_on_upload
 
 # Import text extraction modules
-from extractor.pdf_extractor import extract_text_from_pdf
-from extractor.docx_extractor import extract_text_from_docx
+from extractor.formats import registry as extractors
 
 app = Flask(__name__)
 CORS(app)
@@ -28,6 +47,8 @@ CORS(app)
 AZURE_CONNECTION_STRING = os.getenv('AZURE_STORAGE_CONNECTION_STRING')
 AZURE_CONTAINER_NAME = os.getenv('AZURE_CONTAINER_NAME', 'documents')
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+# Serve downloads through /api/files/<name>/content instead of SAS URLs
+DOWNLOAD_PROXY = os.getenv('DOWNLOAD_PROXY', '').lower() in ('1', 'true', 'yes')
 
 # Initialize Azure Blob Service Client
 blob_service_client = BlobServiceClient.from_connection_string(AZURE_CONNECTION_STRING)
@@ -40,8 +61,24 @@ except ResourceNotFoundError:
     container_client.create_container()
     print(f"Created container: {AZURE_CONTAINER_NAME}")
 
+
+def reconnect_storage() -> None:
+    """Replace the storage clients with new ones that share no connections.
+
+    Called in each worker forked by ``serve.py`` from a preloaded app, so
+    workers don't reuse the pooled sockets the parent opened at import.
+    """
+    global blob_service_client, container_client
+    blob_service_client = BlobServiceClient.from_connection_string(AZURE_CONNECTION_STRING)
+    container_client = blob_service_client.get_container_client(AZURE_CONTAINER_NAME)
+
+
 SUPPORTED_EXTENSIONS = {'.pdf', '.docx', '.txt', '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.xlsx', '.xls'}
 
+# Blob prefixes used by the application itself (shared with the Azure Functions)
+INTERNAL_PREFIXES = ('documents_text/', 'profiles/', thumbnails.DERIVATIVES_PREFIX, zipstream.EXPORTS_PREFIX,
+                     VERSIONS_PREFIX)
+
 
 def generate_unique_filename(original_name: str) -> str:
     """Generate a unique filename to handle duplicates."""
@@ -64,29 +101,57 @@ def generate_unique_filename(original_name: str) -> str:
     return new_name
 
 
-def store_extracted_text(blob_name: str, extracted_text: str) -> str:
-    """Store extracted text in Azure Blob Storage."""
+def store_extracted_text(blob_name: str, extracted_text: str, extraction: Optional[Dict[str, Any]] = None,
+                         if_match: Optional[str] = None, version: Optional[int] = None) -> Optional[str]:
+    """Store extracted text in Azure Blob Storage.
+    
+    ``extraction`` is the result of ``extract_text_from_file`` when the text
+    was just extracted; its page offsets give stored chunks their page numbers.
+    Chunks and indexes are updated in the background (``derived_text``).
+    With ``if_match`` the write fails (ResourceModifiedError) unless the
+    stored text still has that ETag. Returns the new ETag.
+    ``version`` numbers the text in its history (``text_versions``).
+    """
     try:
         text_blob_name = f"documents_text/{blob_name}.txt"
         blob_client = container_client.get_blob_client(text_blob_name)
         
+        text_bytes = extracted_text.encode('utf-8')
+        text_metadata = {
+            'originalDocument': blob_name,
+            'extractedAt': datetime.utcnow().isoformat(),
+            'contentType': 'extracted_text'
+        }
+        if version is not None:
+            # Number of this version in the text's history (text_versions)
+            text_metadata['version'] = str(version)
+        
+        if not version and if_match is None:
+            # Text stored fresh at version 0 starts a new history
+            try:
+                delete_versions(container_client, blob_name)
+            except Exception as history_error:
+                print(f"Failed to delete the text history of {blob_name}: {history_error}")
+        
         # Store the extracted text
-        blob_client.upload_blob(
-            extracted_text,
+        result = blob_client.upload_blob(
+            text_bytes,
             overwrite=True,
+            etag=if_match,
+            match_condition=MatchConditions.IfNotModified if if_match else None,
             content_settings=ContentSettings(
                 content_type='text/plain',
                 content_disposition=f'attachment; filename="{blob_name}.txt"'
             ),
-            metadata={
-                'originalDocument': blob_name,
-                'extractedAt': datetime.utcnow().isoformat(),
-                'contentType': 'extracted_text'
-            }
+            metadata=text_metadata
         )
+        metrics.STORAGE_BYTES_UPLOADED.inc(len(text_bytes))
+        
+        etag = (result or {}).get('etag')
+        after_text_stored(container_client, blob_name, extracted_text, etag, extraction)
         
         print(f"Stored extracted text for {blob_name} in {text_blob_name}")
-        return text_blob_name
+        return etag
     except Exception as error:
         print(f"Error storing extracted text for {blob_name}: {error}")
         raise error
@@ -103,16 +168,21 @@ def get_stored_extracted_text(blob_name: str) -> Optional[Dict[str, Any]]:
         
         # Download the stored text
         download_stream = blob_client.download_blob()
-        extracted_text = download_stream.readall().decode('utf-8')
+        text_bytes = download_stream.readall()
+        metrics.STORAGE_BYTES_DOWNLOADED.inc(len(text_bytes))
+        metrics.EXTRACTION_CACHE.inc(result='hit')
+        extracted_text = text_bytes.decode('utf-8')
         
         print(f"Retrieved stored extracted text for {blob_name}")
         return {
             'success': True,
             'text': extracted_text,
             'source': 'cached',
+            'etag': download_stream.properties.etag,
             'extractedAt': properties.metadata.get('extractedAt', datetime.utcnow().isoformat())
         }
     except ResourceNotFoundError:
+        metrics.EXTRACTION_CACHE.inc(result='miss')
         print(f"No stored extracted text found for {blob_name}")
         return None
     except Exception as error:
@@ -120,38 +190,52 @@ def get_stored_extracted_text(blob_name: str) -> Optional[Dict[str, Any]]:
         return None
 
 
-def extract_text_from_file(file_path: str) -> Dict[str, Any]:
-    """Extract text from a file using the appropriate extractor."""
+def extract_text_from_file(file_path: str, file_format: Optional[FileFormat] = None) -> Dict[str, Any]:
+    """Extract text from a file using the extractor registered for its content."""
+    file_path = Path(file_path)
+    if not file_path.exists():
+        return {
+            'success': False,
+            'text': '',
+            'error': f'File not found: {file_path}'
+        }
+    
     try:
-        file_path = Path(file_path)
-        
-        if not file_path.exists():
-            return {
-                'success': False,
-                'text': '',
-                'error': f'File not found: {file_path}'
-            }
-        
-        file_extension = file_path.suffix.lower()
-        
-        if file_extension not in {'.pdf', '.docx'}:
-            return {
-                'success': False,
-                'text': '',
-                'error': f'Unsupported file type for text extraction: {file_extension}'
-            }
-        
-        # Extract text based on file type
-        if file_extension == '.pdf':
-            text = extract_text_from_pdf(file_path)
-        elif file_extension == '.docx':
-            text = extract_text_from_docx(file_path)
-        else:
-            return {
-                'success': False,
-                'text': '',
-                'error': f'Unsupported file type: {file_extension}'
-            }
+        file_format = file_format or extractors.detect_file(file_path)
+    except UnsupportedFileType as error:
+        return {
+            'success': False,
+            'text': '',
+            'error': str(error)
+        }
+    return run_extractor(file_format, file_path, file_path)
+
+
+def extract_text_from_bytes(content: bytes, blob_name: str) -> Dict[str, Any]:
+    """Extract text from a document held in memory, such as an upload."""
+    try:
+        file_format = extractors.detect(content[:HEADER_BYTES], blob_name)
+    except UnsupportedFileType as error:
+        return {
+            'success': False,
+            'text': '',
+            'error': str(error)
+        }
+    return run_extractor(file_format, io.BytesIO(content), blob_name)
+
+
+def run_extractor(file_format: FileFormat, source: Any, label: Any) -> Dict[str, Any]:
+    """Run a format's extractor on a path or stream and time it."""
+    try:
+        # Extract text with the format's registered extractor
+        started = time.perf_counter()
+        with metrics.EXTRACTIONS_IN_FLIGHT.track_in_progress():
+            extracted = file_format.extract(source)
+        text = extracted.get('text')
+        page_count = extracted.get('pageCount')
+        page_offsets = extracted.get('pageOffsets')
+        duration = time.perf_counter() - started
+        metrics.record_extraction(file_format.name, duration, page_count)
         
         # Check if text was extracted successfully
         if not text or text.strip() == '':
@@ -164,11 +248,14 @@ def extract_text_from_file(file_path: str) -> Dict[str, Any]:
         return {
             'success': True,
             'text': text,
+            'pageCount': page_count,
+            'pageOffsets': page_offsets,
+            'durationMs': round(duration * 1000.0, 1),
             'error': None
         }
         
     except Exception as error:
-        print(f"Error extracting text from {file_path}: {error}")
+        print(f"Error extracting text from {label}: {error}")
         return {
             'success': False,
             'text': '',
@@ -176,6 +263,40 @@ def extract_text_from_file(file_path: str) -> Dict[str, Any]:
         }
 
 
+@app.before_request
+def start_request_timer():
+    """Remember when the request started for the latency metrics."""
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Count the request and record its latency per endpoint.
+
+    A streamed response (file listing, downloads, archives) is still being
+    generated here, so its latency is recorded when it is closed.
+    """
+    started = g.pop('request_started', None)
+    if started is not None:
+        handler = request.endpoint or 'unknown'
+        
+        def observe_duration():
+            metrics.REQUEST_DURATION.observe(time.perf_counter() - started, handler=handler)
+        
+        if response.is_streamed:
+            response.call_on_close(observe_duration)
+        else:
+            observe_duration()
+        metrics.REQUESTS.inc(handler=handler, status=str(response.status_code))
+    return response
+
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Expose process metrics in the Prometheus text format."""
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE, headers={'Cache-Control': 'no-store'})
+
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint."""
@@ -233,8 +354,17 @@ def upload_file():
                 'uploadedAt': datetime.utcnow().isoformat()
             }
         )
+        metrics.STORAGE_BYTES_UPLOADED.inc(len(file_content))
         
-        return jsonify({
+        # Render image thumbnails while the bytes are at hand; the thumbnail
+        # route renders them on first request if this fails
+        if thumbnails.is_image(unique_filename):
+            try:
+                thumbnails.store_derivatives(container_client, unique_filename, file_content)
+            except Exception as thumbnail_error:
+                print(f"Failed to render thumbnails for {unique_filename}: {thumbnail_error}")
+        
+        response_data = {
             'success': True,
             'blobName': unique_filename,
             'name': unique_filename,
@@ -242,42 +372,115 @@ def upload_file():
             'size': file_size,
             'type': file.content_type,
             'uploadedAt': datetime.utcnow().isoformat()
-        })
+        }
+        
+        # Extract from the bytes already in memory when EXTRACT_ON_UPLOAD is set
+        extraction = extract_on_upload(unique_filename, file_content, extractors,
+                                       extract_text_from_bytes, store_extracted_text)
+        if extraction is not None:
+            response_data['extraction'] = extraction
+            response_data['hasExtractedText'] = extraction['status'] == 'extracted'
+        
+        return jsonify(response_data)
         
     except Exception as error:
         print(f"Upload error: {error}")
         return jsonify({'error': 'Failed to upload file'}), 500
 
 
-@app.route('/api/files', methods=['GET'])
-def get_files():
-    """Get all files from Azure Blob Storage."""
+def after_upload(blob_name: str, part: UploadPart) -> Dict[str, Any]:
+    """Thumbnails and extract-on-upload, from the part's bytes when either needs them."""
+    if not thumbnails.is_image(blob_name) and EXTRACT_ON_UPLOAD == 'off':
+        return {}
+    part.stream.seek(0)
+    file_content = part.stream.read()
+    result = {}
+    if thumbnails.is_image(blob_name):
+        try:
+            thumbnails.store_derivatives(container_client, blob_name, file_content)
+        except Exception as thumbnail_error:
+            print(f"Failed to render thumbnails for {blob_name}: {thumbnail_error}")
+    extraction = extract_on_upload(blob_name, file_content, extractors,
+                                   extract_text_from_bytes, store_extracted_text)
+    if extraction is not None:
+        result['extraction'] = extraction
+        result['hasExtractedText'] = extraction['status'] == 'extracted'
+    return result
+
+
+@app.route('/api/upload/batch', methods=['POST'])
+def upload_batch_files():
+    """Upload every ``files`` part of a multipart request concurrently."""
     try:
-        files = []
-        
-        for blob in container_client.list_blobs():
-            # Skip text files in the documents_text directory
-            if blob.name.startswith('documents_text/'):
-                continue
-            
-            blob_client = container_client.get_blob_client(blob.name)
-            properties = blob_client.get_blob_properties()
-            
-            files.append({
-                'id': blob.name,
-                'name': blob.name,
-                'originalName': properties.metadata.get('originalName', blob.name),
-                'size': blob.size,
-                'type': blob.content_settings.content_type,
-                'uploadedAt': properties.metadata.get('uploadedAt', blob.creation_time.isoformat()),
-                'lastModified': blob.last_modified.isoformat()
-            })
+        uploaded_files = [file for file in request.files.getlist('files') if file.filename]
+        if not uploaded_files:
+            return jsonify({'error': 'No files uploaded'}), 400
+        if len(uploaded_files) > MAX_BATCH_FILES:
+            return jsonify({'error': f'Too many files; upload at most {MAX_BATCH_FILES} per request'}), 400
+        
+        parts = []
+        for file in uploaded_files:
+            file.seek(0, 2)
+            size = file.tell()
+            file.seek(0)
+            parts.append(UploadPart(secure_filename(file.filename), file.stream, size, file.content_type))
+        
+        results = upload_batch(
+            container_client, parts, MAX_FILE_SIZE, SUPPORTED_EXTENSIONS,
+            content_settings=lambda part: ContentSettings(
+                content_type=part.content_type,
+                content_disposition=f'attachment; filename="{part.filename}"'
+            ),
+            after_upload=after_upload
+        )
+        uploaded_count = sum(1 for result in results if result['success'])
         
-        return jsonify(files)
+        return jsonify({
+            'success': uploaded_count > 0,
+            'uploaded': uploaded_count,
+            'failed': len(results) - uploaded_count,
+            'files': results
+        }), 200 if uploaded_count else 400
         
+    except Exception as error:
+        print(f"Batch upload error: {error}")
+        return jsonify({'error': 'Failed to upload files'}), 500
+
+
+@app.route('/api/files', methods=['GET'])
+def get_files():
+    """Stream all files from Azure Blob Storage as a JSON array.
+
+    Entries are written as the listing pages arrive, so memory stays flat
+    and clients receive the first files before the scan finishes. Clients
+    that accept ``application/x-ndjson`` get one entry per line instead,
+    which they can parse as it arrives.
+    """
+    try:
+        # Fetch the first page before committing to a 200 response
+        entries = iter_file_entries(container_client, INTERNAL_PREFIXES)
+        first = next(entries, None)
     except Exception as error:
         print(f"Error fetching files: {error}")
         return jsonify({'error': 'Failed to fetch files'}), 500
+    
+    accepted = request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson'])
+    lines = accepted == 'application/x-ndjson'
+    
+    def generate():
+        items = chain([first], entries) if first is not None else ()
+        try:
+            if lines:
+                yield from stream_json_lines(items, app.json.dumps)
+            else:
+                yield from stream_json_array(items, app.json.dumps)
+        except Exception as error:
+            # Headers are gone; abort so the client sees a broken response
+            # rather than a silently truncated listing
+            print(f"Error fetching files: {error}")
+            raise
+    
+    return Response(generate(), mimetype='application/x-ndjson' if lines else 'application/json')
 
 
 @app.route('/api/extract-text/<blob_name>', methods=['POST'])
@@ -293,40 +496,76 @@ def extract_text(blob_name):
         # If no stored text, extract from the original document
         blob_client = container_client.get_blob_client(blob_name)
         
-        # Download to temp file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=Path(blob_name).suffix) as temp_file:
-            download_stream = blob_client.download_blob()
-            temp_file.write(download_stream.readall())
-            temp_file_path = temp_file.name
+        # Pick the extractor from the blob's first bytes, rejecting
+        # unsupported content before downloading the rest
+        header = read_blob_header(blob_client)
+        metrics.STORAGE_BYTES_DOWNLOADED.inc(len(header))
+        try:
+            file_format = extractors.detect(header, blob_name)
+        except UnsupportedFileType as error:
+            return jsonify({
+                'success': False,
+                'error': str(error)
+            }), 400
+        
+        # Parsing is CPU-bound: wait for an extraction slot, smallest documents first
+        document_size = len(header)
+        if document_size >= HEADER_BYTES:
+            document_size = blob_client.get_blob_properties().size
+        with extraction_admission.admit(document_size):
+            # Download to temp file
+            with tempfile.NamedTemporaryFile(delete=False, suffix=Path(blob_name).suffix) as temp_file:
+                if len(header) < HEADER_BYTES:
+                    # The header read already returned the whole blob
+                    file_content = header
+                else:
+                    download_stream = blob_client.download_blob()
+                    file_content = download_stream.readall()
+                    metrics.STORAGE_BYTES_DOWNLOADED.inc(len(file_content))
+                temp_file.write(file_content)
+                temp_file_path = temp_file.name
+        
+            try:
+                # Extract text
+                extraction_result = extract_text_from_file(temp_file_path, file_format)
+            finally:
+                # Clean up temp file
+                if os.path.exists(temp_file_path):
+                    os.unlink(temp_file_path)
+        
+        # The slot covers the download and the parse only: storing the
+        # text doesn't need it and would skew the Retry-After estimate
+        if not extraction_result['success']:
+            return jsonify({
+                'success': False,
+                'error': extraction_result['error']
+            }), 400
         
+        # Store the extracted text in Azure
+        etag = None
         try:
-            # Extract text
-            extraction_result = extract_text_from_file(temp_file_path)
-            
-            if extraction_result['success']:
-                # Store the extracted text in Azure
-                try:
-                    store_extracted_text(blob_name, extraction_result['text'])
-                except Exception as store_error:
-                    print(f"Failed to store extracted text for {blob_name}: {store_error}")
-                
-                return jsonify({
-                    'success': True,
-                    'text': extraction_result['text'],
-                    'source': 'extracted',
-                    'extractedAt': datetime.utcnow().isoformat()
-                })
-            else:
-                return jsonify({
-                    'success': False,
-                    'error': extraction_result['error']
-                }), 400
-                
-        finally:
-            # Clean up temp file
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
+            etag = store_extracted_text(blob_name, extraction_result['text'], extraction_result)
+        except Exception as store_error:
+            print(f"Failed to store extracted text for {blob_name}: {store_error}")
+        
+        return jsonify({
+            'success': True,
+            'text': extraction_result['text'],
+            'source': 'extracted',
+            'etag': etag,
+            'extractedAt': datetime.utcnow().isoformat()
+        })
                 
+    except Overloaded as overloaded:
+        response = jsonify({
+            'success': False,
+            'error': 'Too many extractions in progress; retry later',
+            'retryAfter': overloaded.retry_after
+        })
+        response.status_code = 429
+        response.headers['Retry-After'] = str(overloaded.retry_after)
+        response.headers['Access-Control-Expose-Headers'] = 'Retry-After'
+        return response
     except Exception as error:
         print(f"Text extraction error: {error}")
         return jsonify({
@@ -348,15 +587,25 @@ def save_edited_text(blob_name):
                 'error': 'No text provided'
             }), 400
         
-        # Store the edited text in Azure
-        store_extracted_text(blob_name, text)
+        # Store the edited text in Azure, keeping the replaced version in its
+        # history; only over the version it was based on when the client
+        # says which one that was
+        saved = save_text(container_client, blob_name, store_extracted_text, text=text,
+                          base_etag=data.get('baseEtag'))
         
         return jsonify({
             'success': True,
             'message': 'Edited text saved successfully',
+            'etag': saved['etag'],
+            'version': saved['version'],
             'savedAt': datetime.utcnow().isoformat()
         })
         
+    except (ResourceModifiedError, ResourceNotFoundError):
+        return jsonify({
+            'success': False,
+            'error': 'The text was changed elsewhere since it was loaded; reload it and reapply your edits'
+        }), 412
     except Exception as error:
         print(f"Save edited text error: {error}")
         return jsonify({
@@ -365,18 +614,208 @@ def save_edited_text(blob_name):
         }), 500
 
 
+@app.route('/api/save-edited-text/<blob_name>/patch', methods=['POST', 'PATCH'])
+def patch_edited_text(blob_name):
+    """Apply edits ({"baseEtag", "edits": [{"start", "end", "text"}]}) to stored text."""
+    try:
+        base_etag, edits = parse_patch_request(request.get_json(silent=True))
+    except ValueError as error:
+        return jsonify({'success': False, 'error': str(error)}), 400
+    
+    try:
+        saved = save_text(container_client, blob_name, store_extracted_text, edits=edits, base_etag=base_etag)
+        
+        return jsonify({
+            'success': True,
+            'message': 'Edited text saved successfully',
+            'etag': saved['etag'],
+            'version': saved['version'],
+            'length': utf16_length(saved['text']),
+            'savedAt': datetime.utcnow().isoformat()
+        })
+        
+    except ValueError as error:
+        return jsonify({'success': False, 'error': str(error)}), 400
+    except ResourceNotFoundError:
+        return jsonify({'success': False, 'error': f'No stored text for {blob_name}'}), 404
+    except ResourceModifiedError:
+        return jsonify({
+            'success': False,
+            'error': 'The text was changed elsewhere since it was loaded; reload it and reapply your edits'
+        }), 412
+    except Exception as error:
+        print(f"Patch edited text error: {error}")
+        return jsonify({
+            'success': False,
+            'error': f'Failed to save edited text: {str(error)}'
+        }), 500
+
+
+@app.route('/api/files/<blob_name>/versions', methods=['GET'])
+def text_versions(blob_name):
+    """List the saved versions of a document's text."""
+    try:
+        result = list_versions(container_client, blob_name)
+        if result is None:
+            return jsonify({'error': f'No stored text for {blob_name}'}), 404
+        return jsonify(result)
+        
+    except Exception as error:
+        print(f"Version listing error for {blob_name}: {error}")
+        return jsonify({'error': 'Failed to list versions'}), 500
+
+
+@app.route('/api/files/<blob_name>/versions/<int:version>', methods=['GET'])
+def text_version(blob_name, version):
+    """The text of one saved version of a document."""
+    try:
+        result = get_version(container_client, blob_name, version)
+        if result is None:
+            return jsonify({'error': f'No version {version} of the text of {blob_name}'}), 404
+        return jsonify(result)
+        
+    except Exception as error:
+        print(f"Version error for {blob_name}: {error}")
+        return jsonify({'error': 'Failed to load version'}), 500
+
+
+def index_warming_response(warming: IndexWarming, message: str):
+    """503 with Retry-After for a query that arrived before its index finished its first sync."""
+    response = jsonify({'error': message, 'retryAfter': warming.retry_after})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(warming.retry_after)
+    response.headers['Access-Control-Expose-Headers'] = 'Retry-After'
+    return response
+
+
+@app.route('/api/search', methods=['GET'])
+def search():
+    """Full-text search over extracted document text."""
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({'error': 'q parameter is required'}), 400
+    
+    try:
+        limit = min(int(request.args.get('limit', 20)), search_index.MAX_RESULTS)
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({'error': 'limit and offset must be integers'}), 400
+    
+    try:
+        return jsonify(search_index.search_documents(container_client, query, limit=limit, offset=offset))
+        
+    except IndexWarming as warming:
+        return index_warming_response(warming, 'The search index is still being built; retry shortly')
+    except Exception as error:
+        print(f"Search error: {error}")
+        return jsonify({'error': 'Search failed'}), 500
+
+
+@app.route('/api/similar', methods=['GET', 'POST'])
+def similar():
+    """Passages similar to a document (?blob_name=) or to free text (?q= or JSON {"text"})."""
+    blob_name = request.args.get('blob_name')
+    text = request.args.get('q')
+    if request.method == 'POST':
+        text = (request.get_json(silent=True) or {}).get('text')
+    if not blob_name and not (text or '').strip():
+        return jsonify({'error': 'blob_name or text is required'}), 400
+    
+    try:
+        limit = min(int(request.args.get('limit', 10)), similarity.MAX_RESULTS)
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    
+    try:
+        result = similarity.find_similar(container_client, text=text, blob_name=blob_name, limit=limit)
+        if result is None:
+            return jsonify({'error': f'No extracted text for {blob_name}'}), 404
+        return jsonify(result)
+        
+    except IndexWarming as warming:
+        return index_warming_response(warming, 'The similarity index is still being built; retry shortly')
+    except Exception as error:
+        print(f"Similarity search error: {error}")
+        return jsonify({'error': 'Similarity search failed'}), 500
+
+
+@app.route('/api/chunks/export', methods=['GET', 'POST'])
+def export_chunks():
+    """Stream stored chunks as JSON lines for a prefix or a list of documents."""
+    try:
+        options = chunk_store.parse_export_request(request.args, request.get_json(silent=True))
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+    
+    return Response(
+        chunk_store.export_all(container_client, prefix=options['prefix'], names=options['names']),
+        mimetype='application/x-ndjson'
+    )
+
+
+@app.route('/api/export/archive', methods=['GET', 'POST'])
+def export_archive():
+    """Stream a ZIP archive of documents (by prefix or names), optionally with their extracted text."""
+    try:
+        options = zipstream.parse_archive_request(request.args, request.get_json(silent=True))
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+
+    entries = zipstream.archive_entries(container_client, INTERNAL_PREFIXES, prefix=options['prefix'],
+                                        names=options['names'], include_text=options['includeText'])
+    filename = f"documents-{datetime.utcnow():%Y%m%d-%H%M%S}.zip"
+    return Response(
+        zipstream.stream_zip(container_client, entries),
+        mimetype='application/zip',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+        direct_passthrough=True
+    )
+
+
+@app.route('/api/duplicates', methods=['GET'])
+def duplicates():
+    """Near-duplicates of one document (?blob_name=) or all duplicate clusters."""
+    blob_name = request.args.get('blob_name')
+    try:
+        threshold = float(request.args.get('threshold', minhash.DUPLICATE_THRESHOLD))
+    except ValueError:
+        return jsonify({'error': 'threshold must be a number'}), 400
+    
+    try:
+        result = minhash.find_duplicates(container_client, INTERNAL_PREFIXES, blob_name=blob_name, threshold=threshold)
+        if result is None:
+            return jsonify({'error': f'No signature for {blob_name}; extract its text first'}), 404
+        return jsonify(result)
+        
+    except IndexWarming as warming:
+        return index_warming_response(warming, 'The duplicate index is still being built; retry shortly')
+    except Exception as error:
+        print(f"Duplicate detection error: {error}")
+        return jsonify({'error': 'Duplicate detection failed'}), 500
+
+
 @app.route('/api/files/<blob_name>/download', methods=['GET'])
 def get_download_url(blob_name):
     """Get secure download URL for a file."""
     try:
         blob_client = container_client.get_blob_client(blob_name)
         
+        # Without an account key (or with DOWNLOAD_PROXY set) there is no
+        # SAS URL to hand out; clients use the content endpoint instead
+        account_key = getattr(blob_service_client.credential, 'account_key', None)
+        if DOWNLOAD_PROXY or not account_key:
+            return jsonify({
+                'success': True,
+                'proxied': True,
+                'downloadPath': f"/api/files/{quote(blob_name, safe='')}/content"
+            })
+        
         # Generate SAS token for secure access
         sas_token = generate_blob_sas(
             account_name=blob_service_client.account_name,
             container_name=AZURE_CONTAINER_NAME,
             blob_name=blob_name,
-            account_key=blob_service_client.credential.account_key,
+            account_key=account_key,
             permission=BlobSasPermissions(read=True),
             expiry=datetime.utcnow() + timedelta(hours=1)
         )
@@ -394,6 +833,49 @@ def get_download_url(blob_name):
         return jsonify({'error': 'Failed to generate download URL'}), 500
 
 
+@app.route('/api/files/<blob_name>/content', methods=['GET'])
+def download_file(blob_name):
+    """Stream a document's bytes, with Range, If-Range and If-None-Match support."""
+    blob_client = container_client.get_blob_client(blob_name)
+    try:
+        properties = blob_client.get_blob_properties()
+    except ResourceNotFoundError:
+        return jsonify({'error': f'File not found: {blob_name}'}), 404
+    
+    plan = http_ranges.plan_response(request.headers, properties)
+    if plan.status in (304, 416):
+        return Response(status=plan.status, headers=plan.headers)
+    
+    # One chunk in memory at a time; a blob replaced mid-stream aborts the response
+    chunks = http_ranges.iter_blob_range(blob_client, plan.offset, plan.length, properties.etag)
+    return Response(chunks, status=plan.status, headers=plan.headers, direct_passthrough=True)
+
+
+@app.route('/api/files/<blob_name>/thumbnail', methods=['GET'])
+def get_thumbnail(blob_name):
+    """Thumbnail (?size=thumb) or preview (?size=preview) JPEG of an image."""
+    size = request.args.get('size', 'thumb')
+    if size not in thumbnails.SIZES:
+        return jsonify({'error': f"size must be one of: {', '.join(thumbnails.SIZES)}"}), 400
+    if not thumbnails.is_image(blob_name):
+        return jsonify({'error': 'Thumbnails are only available for images'}), 404
+    
+    try:
+        derivative = thumbnails.get_derivative(container_client, blob_name, size)
+        if derivative is None:
+            return jsonify({'error': f'File not found: {blob_name}'}), 404
+        
+        content, etag = derivative
+        headers = {'Cache-Control': thumbnails.CACHE_CONTROL, 'ETag': etag}
+        if request.headers.get('If-None-Match') == etag:
+            return Response(status=304, headers=headers)
+        return Response(content, mimetype=thumbnails.CONTENT_TYPE, headers=headers)
+        
+    except Exception as error:
+        print(f"Thumbnail error for {blob_name}: {error}")
+        return jsonify({'error': 'Failed to render thumbnail'}), 500
+
+
 @app.route('/api/files/<blob_name>', methods=['DELETE'])
 def delete_file(blob_name):
     """Delete file from Azure Blob Storage."""
@@ -412,6 +894,25 @@ def delete_file(blob_name):
         except ResourceNotFoundError:
             # Text blob doesn't exist, which is fine
             print(f"No extracted text to delete for {blob_name}")
+        try:
+            container_client.get_blob_client(chunk_store.chunks_blob_name(blob_name)).delete_blob()
+        except ResourceNotFoundError:
+            pass
+        # The document is gone already: log failures here instead of failing the delete
+        try:
+            thumbnails.delete_derivatives(container_client, blob_name)
+        except Exception as derivatives_error:
+            print(f"Failed to delete derivatives of {blob_name}: {derivatives_error}")
+        try:
+            delete_versions(container_client, blob_name)
+        except Exception as versions_error:
+            print(f"Failed to delete the text history of {blob_name}: {versions_error}")
+        
+        for name, index in (('search', search_index), ('similarity', similarity), ('duplicate', minhash)):
+            try:
+                index.get_index().remove_document(blob_name)
+            except Exception as index_error:
+                print(f"Failed to remove {blob_name} from the {name} index: {index_error}")
         
         return jsonify({
             'success': True,
@@ -1,8 +1,11 @@
 """
-Text extraction module for PDF and DOCX files.
+Text extraction module for PDF, DOCX, XLSX and plain text files.
+
+``formats.registry`` picks an extractor from a file's content.
 """
 
-from .pdf_extractor import extract_text_from_pdf
+from .pdf_extractor import extract_pages_from_pdf, extract_text_from_pdf
 from .docx_extractor import extract_text_from_docx
+from .xlsx_extractor import extract_text_from_xlsx
 
-__all__ = ['extract_text_from_pdf', 'extract_text_from_docx']
+__all__ = ['extract_pages_from_pdf', 'extract_text_from_pdf', 'extract_text_from_docx', 'extract_text_from_xlsx']
@@ -1,12 +1,13 @@
 from __future__ import annotations
 
 from pathlib import Path
+from typing import BinaryIO
 
 from docx import Document
 
 
-def extract_text_from_docx(path: str | Path) -> str:
-	"""Extract text from a DOCX file using python-docx."""
-	document = Document(str(path))
+def extract_text_from_docx(path: str | Path | BinaryIO) -> str:
+	"""Extract text from a DOCX file (path or binary stream) using python-docx."""
+	document = Document(path if hasattr(path, "read") else str(path))
 	paragraphs = [p.text for p in document.paragraphs if p.text]
 	return "\n".join(paragraphs)
@@ -0,0 +1,60 @@
+"""
+Formats the Flask backend can extract text from.
+
+The first registered format whose sniffer matches a file's header is used,
+so specific signatures come before the plain-text fallback. To support a
+new format, add its extractor module and register it here.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, BinaryIO
+
+from shared.extractor_registry import ExtractorRegistry, has_magic, is_utf8_text, is_zip, ooxml_package
+
+from .docx_extractor import extract_text_from_docx
+from .pdf_extractor import extract_pages_from_pdf
+from .xlsx_extractor import extract_text_from_xlsx
+
+registry = ExtractorRegistry()
+
+_IMAGE_SIGNATURES = (b"\x89PNG\r\n\x1a\n", b"\xff\xd8\xff", b"GIF87a", b"GIF89a", b"II*\x00", b"MM\x00*")
+
+
+def _extract_pdf(path: Path | BinaryIO) -> dict[str, Any]:
+	pages = extract_pages_from_pdf(path)
+	# Where each page starts in the joined text
+	offsets = []
+	position = 0
+	for page_text in pages:
+		offsets.append(position)
+		if page_text:
+			position += len(page_text) + 1
+	return {"text": "\n".join(filter(None, pages)), "pageCount": len(pages), "pageOffsets": offsets}
+
+
+def _is_image(header: bytes, filename: str) -> bool:
+	# BMP has only a two-byte signature; its reserved header fields are zero
+	is_bmp = header.startswith(b"BM") and header[6:10] == b"\x00" * 4
+	return is_bmp or header.startswith(_IMAGE_SIGNATURES)
+
+
+def _extract_plain_text(path: Path | BinaryIO) -> dict[str, Any]:
+	if hasattr(path, "read"):
+		return {"text": path.read().decode("utf-8-sig")}
+	with open(path, "r", encoding="utf-8-sig") as f:
+		return {"text": f.read()}
+
+
+registry.register("pdf", has_magic(b"%PDF-", within=1024), _extract_pdf)
+registry.register("docx", ooxml_package("word/", ".docx"), lambda path: {"text": extract_text_from_docx(path)})
+registry.register("xlsx", ooxml_package("xl/", ".xlsx"), lambda path: {"text": extract_text_from_xlsx(path)})
+registry.register(
+	"ole2",
+	has_magic(b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"),
+	reason="Legacy Office files (.doc, .xls) are not supported for text extraction; save the file as .docx or .xlsx",
+)
+registry.register("zip", is_zip, reason="ZIP archives other than DOCX and XLSX are not supported for text extraction")
+registry.register("image", _is_image, reason="Images contain no extractable text")
+registry.register("txt", is_utf8_text, _extract_plain_text)
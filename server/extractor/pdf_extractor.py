@@ -1,11 +1,46 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Optional
+from typing import BinaryIO, Optional
 
 from pypdf import PdfReader
 
 
+def extract_pages_from_pdf(path: str | Path | BinaryIO, password: Optional[str] = None) -> list[str]:
+	"""Extract the text of every page of a PDF file using pypdf.
+
+	Args:
+		path: Path to the PDF file, or a binary stream of its contents.
+		password: Optional password for encrypted PDFs.
+
+	Returns:
+		One string per page (empty for pages without text). Returns an empty
+		list if the PDF is encrypted and cannot be decrypted.
+	"""
+	if hasattr(path, "read"):
+		return _extract_pages(PdfReader(path), password)
+	with Path(path).open("rb") as file_obj:
+		return _extract_pages(PdfReader(file_obj), password)
+
+
+def _extract_pages(reader: PdfReader, password: Optional[str]) -> list[str]:
+	if reader.is_encrypted:
+		if password:
+			try:
+				reader.decrypt(password)
+			except Exception:
+				return []
+		else:
+			return []
+	texts: list[str] = []
+	for page in reader.pages:
+		try:
+			texts.append(page.extract_text() or "")
+		except Exception:
+			texts.append("")
+	return texts
+
+
 def extract_text_from_pdf(path: str | Path, password: Optional[str] = None) -> str:
 	"""Extract text from a PDF file using pypdf.
 
@@ -16,21 +51,4 @@ def extract_text_from_pdf(path: str | Path, password: Optional[str] = None) -> s
 	Returns:
 		Extracted text as a single string. Returns empty string if nothing could be extracted.
 	"""
-	pdf_path = Path(path)
-	with pdf_path.open("rb") as file_obj:
-		reader = PdfReader(file_obj)
-		if reader.is_encrypted:
-			if password:
-				try:
-					reader.decrypt(password)
-				except Exception:
-					return ""
-			else:
-				return ""
-		texts: list[str] = []
-		for page in reader.pages:
-			try:
-				texts.append(page.extract_text() or "")
-			except Exception:
-				continue
-		return "\n".join(filter(None, texts))
+	return "\n".join(filter(None, extract_pages_from_pdf(path, password)))
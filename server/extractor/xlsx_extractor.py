@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import datetime
+import io
+from pathlib import Path
+from typing import Any, BinaryIO
+
+from openpyxl import load_workbook
+
+MAX_ROWS_PER_SHEET = 200_000
+MAX_COLUMNS = 256
+MAX_TEXT_CHARS = 20_000_000
+# openpyxl yields every row up to the last one used, however sparse, so
+# scanned rows (empty ones included) are capped per sheet at this multiple
+# of max_rows_per_sheet, and across the workbook
+SCAN_FACTOR = 2
+MAX_SCANNED_ROWS = 500_000
+
+
+def _format_cell(value: Any) -> str:
+	if value is None:
+		return ""
+	if isinstance(value, float) and value.is_integer():
+		return str(int(value))
+	if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+		return value.isoformat()
+	if isinstance(value, str):
+		return " ".join(value.split())
+	return str(value)
+
+
+def extract_text_from_xlsx(path: str | Path | BinaryIO, max_rows_per_sheet: int = MAX_ROWS_PER_SHEET,
+		max_columns: int = MAX_COLUMNS, max_chars: int = MAX_TEXT_CHARS,
+		max_scanned_rows: int = MAX_SCANNED_ROWS) -> str:
+	"""Extract sheet contents from an XLSX file as tab-separated text using openpyxl.
+
+	Rows are streamed in read-only mode, so memory is bounded by the output
+	rather than the workbook size.
+
+	Args:
+		path: Path to the XLSX file, or a binary stream of its contents.
+		max_rows_per_sheet: Non-empty rows read per sheet before truncating.
+		max_columns: Cells read per row.
+		max_chars: Output size after which extraction stops.
+		max_scanned_rows: Rows, empty ones included, scanned across all sheets.
+
+	Returns:
+		One "# Sheet: <title>" block of TSV rows per sheet.
+	"""
+	workbook = load_workbook(path if hasattr(path, "read") else str(path), read_only=True, data_only=True)
+	output = io.StringIO()
+	scanned = 0
+	try:
+		for sheet in workbook.worksheets:
+			if output.tell() >= max_chars:
+				output.write("[Text limit reached; remaining sheets omitted]\n")
+				break
+			if scanned >= max_scanned_rows:
+				output.write("[Row limit reached; remaining sheets omitted]\n")
+				break
+			sheet.reset_dimensions()
+			output.write(f"# Sheet: {sheet.title}\n")
+			rows = 0
+			sheet_scan_limit = min(max_rows_per_sheet * SCAN_FACTOR, max_scanned_rows - scanned)
+			sheet_scanned = 0
+			# max_col stops rows from being built wider than max_columns (narrower
+			# ones are padded with None up to it)
+			for row in sheet.iter_rows(max_col=max_columns, values_only=True):
+				if sheet_scanned >= sheet_scan_limit:
+					output.write(f"[Sheet truncated after scanning {sheet_scanned} rows]\n")
+					break
+				sheet_scanned += 1
+				width = len(row)
+				while width and (row[width - 1] is None or row[width - 1] == ""):
+					width -= 1
+				if not width:
+					continue
+				cells = [_format_cell(value) for value in row[:width]]
+				if rows >= max_rows_per_sheet:
+					output.write(f"[Sheet truncated after {max_rows_per_sheet} rows]\n")
+					break
+				output.write("\t".join(cells) + "\n")
+				rows += 1
+				if output.tell() >= max_chars:
+					break
+			scanned += sheet_scanned
+			output.write("\n")
+	finally:
+		workbook.close()
+	return output.getvalue().strip()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Production launcher for the Python Flask backend
+
+Runs the app under gunicorn: a master process imports the app once
+(``preload_app``) and forks ``WEB_CONCURRENCY`` workers that share the
+imported modules copy-on-write, each serving ``WEB_THREADS`` requests at a
+time. Workers are recycled after ``WEB_MAX_REQUESTS`` requests (plus up to
+``WEB_MAX_REQUESTS_JITTER`` so they don't all restart together), finishing
+in-flight requests for up to ``WEB_GRACEFUL_TIMEOUT`` seconds first.
+
+gunicorn needs ``fork()``, so on Windows (or without gunicorn installed)
+the app is served by waitress in a single process with
+``WEB_CONCURRENCY * WEB_THREADS`` threads instead.
+
+    python serve.py
+    python serve.py --workers 4 --threads 8 --port 8000
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+# Add the current directory to Python path
+sys.path.insert(0, str(Path(__file__).parent))
+
+# Load environment variables
+from dotenv import load_dotenv
+load_dotenv()
+
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', str(os.cpu_count() or 2)) or 2)
+WEB_THREADS = int(os.getenv('WEB_THREADS', '4') or 4)
+WEB_MAX_REQUESTS = int(os.getenv('WEB_MAX_REQUESTS', '1000') or 0)
+WEB_MAX_REQUESTS_JITTER = int(os.getenv('WEB_MAX_REQUESTS_JITTER', str(WEB_MAX_REQUESTS // 10)) or 0)
+# Long enough for a 50 MB extraction to finish
+WEB_TIMEOUT = int(os.getenv('WEB_TIMEOUT', '120') or 120)
+WEB_GRACEFUL_TIMEOUT = int(os.getenv('WEB_GRACEFUL_TIMEOUT', '30') or 30)
+WEB_KEEPALIVE = int(os.getenv('WEB_KEEPALIVE', '5') or 5)
+
+def post_fork(server, worker) -> None:
+    """gunicorn hook: give the new worker its own connections, and start syncing its indexes.
+
+    Opening an index claims files no other live worker uses
+    (``index_sync.claim_path``), and a recycled worker's replacement takes
+    over its files and their contents.
+    """
+    import app as app_module
+
+    from shared import minhash, search_index, similarity
+
+    app_module.reconnect_storage()
+    # Build the indexes in the background now rather than on the first query
+    search = search_index.start_sync(app_module.container_client)
+    vectors = similarity.start_sync(app_module.container_client)
+    duplicates = minhash.start_sync(app_module.container_client, app_module.INTERNAL_PREFIXES)
+    server.log.info(f"Worker {worker.pid} using indexes {search.path}, {vectors.directory}, {duplicates.path}")
+
+
+def serve_gunicorn(host: str, port: int, workers: int, threads: int) -> None:
+    from gunicorn.app.base import BaseApplication
+
+    class Application(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f"{host}:{port}")
+            self.cfg.set('workers', workers)
+            self.cfg.set('threads', threads)
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('preload_app', True)
+            self.cfg.set('max_requests', WEB_MAX_REQUESTS)
+            self.cfg.set('max_requests_jitter', WEB_MAX_REQUESTS_JITTER)
+            self.cfg.set('timeout', WEB_TIMEOUT)
+            self.cfg.set('graceful_timeout', WEB_GRACEFUL_TIMEOUT)
+            self.cfg.set('keepalive', WEB_KEEPALIVE)
+            self.cfg.set('post_fork', post_fork)
+            if os.path.isdir('/dev/shm'):
+                # Worker heartbeats on tmpfs, so a slow disk can't stall them
+                self.cfg.set('worker_tmp_dir', '/dev/shm')
+
+        def load(self):
+            from app import app
+            return app
+
+    Application().run()
+
+
+def serve_waitress(host: str, port: int, threads: int) -> None:
+    from waitress import serve
+    from app import app
+
+    serve(app, host=host, port=port, threads=threads, channel_timeout=WEB_TIMEOUT)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Serve the Flask backend with a production WSGI server.')
+    parser.add_argument('--host', default=os.getenv('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=WEB_CONCURRENCY, help='Worker processes')
+    parser.add_argument('--threads', type=int, default=WEB_THREADS, help='Request threads per worker')
+    parser.add_argument('--server', choices=['auto', 'gunicorn', 'waitress'], default='auto')
+    args = parser.parse_args(argv)
+
+    # Check if Azure connection string is set
+    if not os.getenv('AZURE_STORAGE_CONNECTION_STRING'):
+        print("❌ Error: AZURE_STORAGE_CONNECTION_STRING environment variable is not set")
+        print("Please create a .env file with your Azure connection string")
+        return 1
+
+    server = args.server
+    if server == 'auto':
+        try:
+            import gunicorn  # noqa: F401
+            server = 'gunicorn' if os.name != 'nt' else 'waitress'
+        except ImportError:
+            server = 'waitress'
+
+    workers = max(1, args.workers)
+    threads = max(1, args.threads)
+    if server == 'gunicorn':
+        # Share the CPU between workers instead of letting each one run
+        # an extraction per core; must be set before the app is imported
+        os.environ.setdefault('EXTRACTION_CONCURRENCY', str(max(1, (os.cpu_count() or 2) // workers)))
+        print(f"🚀 Starting Python Flask backend on port {args.port} (gunicorn, {workers} workers × {threads} threads)")
+    else:
+        threads = workers * threads
+        print(f"🚀 Starting Python Flask backend on port {args.port} (waitress, {threads} threads)")
+    print(f"📁 Azure Container: {os.getenv('AZURE_CONTAINER_NAME', 'documents')}")
+    print(f"🔗 Health check: http://localhost:{args.port}/api/health")
+
+    if server == 'gunicorn':
+        serve_gunicorn(args.host, args.port, workers, threads)
+    else:
+        serve_waitress(args.host, args.port, threads)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -32,4 +32,5 @@ if __name__ == '__main__':
     print(f"🚀 Starting Python Flask backend on port {port}")
     print(f"📁 Azure Container: {os.getenv('AZURE_CONTAINER_NAME', 'documents')}")
     print(f"🔗 Health check: http://localhost:{port}/api/health")
+    print("⚠️  Development server; use serve.py for production")
     app.run(host='0.0.0.0', port=port, debug=True)
@@ -0,0 +1,160 @@
+"""
+Admission control for CPU-heavy text extraction
+
+Parsing documents is CPU-bound, so running every extraction request at
+once slows down all of them and every other request on the instance. The
+``AdmissionController`` lets ``EXTRACTION_CONCURRENCY`` extractions run
+per process and holds at most ``EXTRACTION_QUEUE_LIMIT`` more in a wait
+queue ordered by document size, so small documents go first. A request
+that finds the queue full, is displaced from it by a smaller document, or
+waits longer than ``EXTRACTION_QUEUE_TIMEOUT`` seconds is rejected with
+``Overloaded``, which handlers turn into 429 with ``Retry-After``. Cache
+hits never get here: handlers serve stored text before asking for a slot.
+"""
+
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from itertools import count
+from typing import Iterator, List, Optional
+
+from shared import metrics
+
+EXTRACTION_CONCURRENCY = int(os.getenv('EXTRACTION_CONCURRENCY', str(os.cpu_count() or 2)) or 2)
+EXTRACTION_QUEUE_LIMIT = int(os.getenv('EXTRACTION_QUEUE_LIMIT', str(2 * EXTRACTION_CONCURRENCY)))
+EXTRACTION_QUEUE_TIMEOUT = float(os.getenv('EXTRACTION_QUEUE_TIMEOUT', '10') or 10)
+# Retry-After bounds, in seconds
+MIN_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 60
+
+
+class Overloaded(Exception):
+    """Raised when an extraction cannot be admitted; ``retry_after`` is in seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ('priority', 'sequence', 'displaced')
+
+    def __init__(self, priority: float, sequence: int):
+        self.priority = priority
+        self.sequence = sequence
+        self.displaced = False
+
+    def key(self):
+        return self.priority, self.sequence
+
+
+class AdmissionController:
+    """Concurrency limit with a bounded wait queue served smallest priority first."""
+
+    def __init__(self, concurrency: int = EXTRACTION_CONCURRENCY, max_queue: int = EXTRACTION_QUEUE_LIMIT,
+                 timeout: float = EXTRACTION_QUEUE_TIMEOUT):
+        self.concurrency = max(1, concurrency)
+        self.max_queue = max(0, max_queue)
+        self.timeout = timeout
+        self._condition = threading.Condition()
+        self._running = 0
+        self._waiters: List[_Waiter] = []
+        self._sequence = count()
+        # Moving average of how long an admitted extraction holds its slot
+        self._average_seconds = 1.0
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely to be free, for ``Retry-After``."""
+        rounds = (len(self._waiters) + 1) / self.concurrency
+        estimate = math.ceil(self._average_seconds * rounds)
+        return max(MIN_RETRY_AFTER, min(MAX_RETRY_AFTER, estimate))
+
+    def _reject(self, reason: str) -> Overloaded:
+        metrics.EXTRACTION_ADMISSIONS.inc(result=reason)
+        return Overloaded(reason, self.retry_after())
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        return min(self._waiters, key=_Waiter.key) if self._waiters else None
+
+    def _set_queue_depth(self) -> None:
+        metrics.EXTRACTION_QUEUE_DEPTH.set(len(self._waiters))
+
+    def acquire(self, priority: float = 0) -> None:
+        """Take a slot, waiting in the queue if necessary; raises Overloaded."""
+        started = time.perf_counter()
+        with self._condition:
+            if self._running < self.concurrency and not self._waiters:
+                self._running += 1
+                metrics.EXTRACTION_ADMISSIONS.inc(result='admitted')
+                metrics.EXTRACTION_QUEUE_WAIT.observe(0)
+                return
+
+            waiter = _Waiter(priority, next(self._sequence))
+            if len(self._waiters) >= self.max_queue:
+                largest = max(self._waiters, key=_Waiter.key, default=None)
+                if largest is None or largest.key() <= waiter.key():
+                    raise self._reject('rejected')
+                # A smaller document takes the place of the largest waiting one
+                self._waiters.remove(largest)
+                largest.displaced = True
+            self._waiters.append(waiter)
+            self._set_queue_depth()
+            self._condition.notify_all()
+
+            deadline = started + self.timeout
+            try:
+                while True:
+                    if waiter.displaced:
+                        raise self._reject('displaced')
+                    if self._running < self.concurrency and self._next_waiter() is waiter:
+                        break
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        raise self._reject('timeout')
+                    self._condition.wait(remaining)
+            except BaseException:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    self._set_queue_depth()
+                    # The head of the queue may have changed
+                    self._condition.notify_all()
+                raise
+
+            self._waiters.remove(waiter)
+            self._set_queue_depth()
+            self._running += 1
+            # The next waiter is now the head and may fit in a slot that is still free
+            self._condition.notify_all()
+        metrics.EXTRACTION_ADMISSIONS.inc(result='admitted')
+        metrics.EXTRACTION_QUEUE_WAIT.observe(time.perf_counter() - started)
+
+    def release(self, seconds: Optional[float] = None) -> None:
+        with self._condition:
+            self._running -= 1
+            if seconds is not None:
+                self._average_seconds = 0.8 * self._average_seconds + 0.2 * seconds
+            self._condition.notify_all()
+
+    @contextmanager
+    def admit(self, priority: float = 0) -> Iterator[None]:
+        """Hold a slot for the duration of the block; raises Overloaded."""
+        self.acquire(priority)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - started)
+
+
+extraction_admission = AdmissionController()
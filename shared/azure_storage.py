@@ -2,13 +2,18 @@
 Shared Azure Storage utilities for Azure Functions
 """
 
+import io
 import os
 import tempfile
+import time
+import uuid
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Optional, Dict, Any
+from urllib.parse import quote
+from typing import Optional, Dict, Any, Tuple, BinaryIO, Union
 
 from azure.storage.blob import BlobServiceClient, generate_blob_sas, BlobSasPermissions, ContentSettings
+from azure.core import MatchConditions
 from azure.core.exceptions import ResourceNotFoundError
 
 # Import text extraction modules
@@ -17,13 +22,21 @@ import os
 # Add the parent directory to the Python path for Azure Functions
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from extractor.pdf_extractor import extract_text_from_pdf
-from extractor.docx_extractor import extract_text_from_docx
+from extractor.formats import registry as extractors
+from shared import metrics, minhash, search_index, similarity
+from shared.derived_text import after_text_stored
+from shared.thumbnails import DERIVATIVES_PREFIX
+from shared.text_versions import VERSIONS_PREFIX, delete_versions
+from shared.zipstream import EXPORTS_PREFIX
+from shared.extractor_registry import HEADER_BYTES, FileFormat, UnsupportedFileType, read_blob_header
+from shared.timing import span, timed
 
 # Configuration
 AZURE_CONNECTION_STRING = os.getenv('AZURE_STORAGE_CONNECTION_STRING')
 AZURE_CONTAINER_NAME = os.getenv('AZURE_CONTAINER_NAME', 'documents')
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+# Serve downloads through DownloadFile instead of SAS URLs
+DOWNLOAD_PROXY = os.getenv('DOWNLOAD_PROXY', '').lower() in ('1', 'true', 'yes')
 
 # Initialize Azure Blob Service Client
 blob_service_client = BlobServiceClient.from_connection_string(AZURE_CONNECTION_STRING)
@@ -38,6 +51,10 @@ except ResourceNotFoundError:
 
 SUPPORTED_EXTENSIONS = {'.pdf', '.docx', '.txt', '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.xlsx', '.xls'}
 
+# Blob prefixes used by the application itself, hidden from document listings
+PROFILES_PREFIX = 'profiles/'
+INTERNAL_PREFIXES = ('documents_text/', PROFILES_PREFIX, DERIVATIVES_PREFIX, EXPORTS_PREFIX, VERSIONS_PREFIX)
+
 
 def generate_unique_filename(original_name: str) -> str:
     """Generate a unique filename to handle duplicates."""
@@ -49,7 +66,8 @@ def generate_unique_filename(original_name: str) -> str:
         try:
             # Check if blob exists
             blob_client = container_client.get_blob_client(new_name)
-            blob_client.get_blob_properties()
+            with span('storage.get_blob_properties'):
+                blob_client.get_blob_properties()
             # If we get here, the blob exists, so increment the counter
             new_name = f"{name} ({counter}){ext}"
             counter += 1
@@ -60,29 +78,67 @@ def generate_unique_filename(original_name: str) -> str:
     return new_name
 
 
-def store_extracted_text(blob_name: str, extracted_text: str) -> str:
-    """Store extracted text in Azure Blob Storage."""
+def forget_document_text(blob_name: str) -> None:
+    """Drop a deleted document from the derived indexes."""
+    for name, index in (('search', search_index), ('similarity', similarity), ('duplicate', minhash)):
+        try:
+            index.get_index().remove_document(blob_name)
+        except Exception as error:
+            print(f"Failed to remove {blob_name} from the {name} index: {error}")
+
+
+def store_extracted_text(blob_name: str, extracted_text: str, extraction: Optional[Dict[str, Any]] = None,
+                         if_match: Optional[str] = None, version: Optional[int] = None) -> Optional[str]:
+    """Store extracted text in Azure Blob Storage.
+    
+    ``extraction`` is the result of ``extract_text_from_file`` when the text
+    was just extracted (rather than edited); its page offsets give stored
+    chunks their page numbers. Chunks and indexes are updated in the
+    background (``derived_text``). With ``if_match`` the write only succeeds
+    while the stored text still has that ETag (ResourceModifiedError
+    otherwise). Returns the new ETag, which clients send back as the base
+    of their next edit.
+    ``version`` numbers the text in its history (``text_versions``).
+    """
     try:
         text_blob_name = f"documents_text/{blob_name}.txt"
         blob_client = container_client.get_blob_client(text_blob_name)
+        text_bytes = extracted_text.encode('utf-8')
+        text_metadata = {
+            'originalDocument': blob_name,
+            'extractedAt': datetime.utcnow().isoformat(),
+            'contentType': 'extracted_text'
+        }
+        if version is not None:
+            # Number of this version in the text's history (text_versions)
+            text_metadata['version'] = str(version)
+        
+        if not version and if_match is None:
+            # Text stored fresh at version 0 starts a new history
+            try:
+                delete_versions(container_client, blob_name)
+            except Exception as history_error:
+                print(f"Failed to delete the text history of {blob_name}: {history_error}")
         
         # Store the extracted text
-        blob_client.upload_blob(
-            extracted_text,
-            overwrite=True,
-            content_settings=ContentSettings(
-                content_type='text/plain',
-                content_disposition=f'attachment; filename="{blob_name}.txt"'
-            ),
-            metadata={
-                'originalDocument': blob_name,
-                'extractedAt': datetime.utcnow().isoformat(),
-                'contentType': 'extracted_text'
-            }
-        )
+        with span('storage.upload_blob'):
+            result = blob_client.upload_blob(
+                text_bytes,
+                overwrite=True,
+                etag=if_match,
+                match_condition=MatchConditions.IfNotModified if if_match else None,
+                content_settings=ContentSettings(
+                    content_type='text/plain',
+                    content_disposition=f'attachment; filename="{blob_name}.txt"'
+                ),
+                metadata=text_metadata
+            )
+        metrics.STORAGE_BYTES_UPLOADED.inc(len(text_bytes))
+        etag = (result or {}).get('etag')
+        after_text_stored(container_client, blob_name, extracted_text, etag, extraction)
         
         print(f"Stored extracted text for {blob_name} in {text_blob_name}")
-        return text_blob_name
+        return etag
     except Exception as error:
         print(f"Error storing extracted text for {blob_name}: {error}")
         raise error
@@ -95,20 +151,28 @@ def get_stored_extracted_text(blob_name: str) -> Optional[Dict[str, Any]]:
         blob_client = container_client.get_blob_client(text_blob_name)
         
         # Check if the text blob exists
-        properties = blob_client.get_blob_properties()
+        with span('storage.get_blob_properties'):
+            properties = blob_client.get_blob_properties()
         
         # Download the stored text
-        download_stream = blob_client.download_blob()
-        extracted_text = download_stream.readall().decode('utf-8')
+        with span('storage.download_blob'):
+            download_stream = blob_client.download_blob()
+            text_bytes = download_stream.readall()
+        metrics.STORAGE_BYTES_DOWNLOADED.inc(len(text_bytes))
+        metrics.EXTRACTION_CACHE.inc(result='hit')
+        extracted_text = text_bytes.decode('utf-8')
         
         print(f"Retrieved stored extracted text for {blob_name}")
         return {
             'success': True,
             'text': extracted_text,
             'source': 'cached',
+            # Of the version downloaded, the base for patching it
+            'etag': download_stream.properties.etag,
             'extractedAt': properties.metadata.get('extractedAt', datetime.utcnow().isoformat())
         }
     except ResourceNotFoundError:
+        metrics.EXTRACTION_CACHE.inc(result='miss')
         print(f"No stored extracted text found for {blob_name}")
         return None
     except Exception as error:
@@ -116,42 +180,67 @@ def get_stored_extracted_text(blob_name: str) -> Optional[Dict[str, Any]]:
         return None
 
 
-def extract_text_from_file(file_path: str) -> Dict[str, Any]:
-    """Extract text from a file using the appropriate extractor."""
+def detect_blob_format(blob_client, blob_name: str) -> Tuple[FileFormat, bytes]:
+    """Sniff a blob's format from a ranged read of its first bytes.
+
+    Raises UnsupportedFileType before the rest of the blob is downloaded.
+    Returns the format and the header, which is the whole blob when it is
+    shorter than ``HEADER_BYTES``.
+    """
+    header = read_blob_header(blob_client)
+    metrics.STORAGE_BYTES_DOWNLOADED.inc(len(header))
+    return extractors.detect(header, blob_name), header
+
+
+def extract_text_from_file(file_path: str, file_format: Optional[FileFormat] = None) -> Dict[str, Any]:
+    """Extract text from a file using the extractor registered for its content.
+
+    ``file_format`` is the result of an earlier ``detect_blob_format``;
+    without it the format is sniffed from the file's header.
+    """
+    file_path = Path(file_path)
+    if not file_path.exists():
+        return {
+            'success': False,
+            'text': '',
+            'error': f'File not found: {file_path}'
+        }
+    
     try:
-        file_path = Path(file_path)
-        
-        if not file_path.exists():
-            return {
-                'success': False,
-                'text': '',
-                'error': f'File not found: {file_path}'
-            }
-        
-        file_extension = file_path.suffix.lower()
-        
-        if file_extension not in {'.pdf', '.docx', '.txt'}:
-            return {
-                'success': False,
-                'text': '',
-                'error': f'Unsupported file type for text extraction: {file_extension}'
-            }
-        
-        # Extract text based on file type
-        if file_extension == '.pdf':
-            text = extract_text_from_pdf(file_path)
-        elif file_extension == '.docx':
-            text = extract_text_from_docx(file_path)
-        elif file_extension == '.txt':
-            # For text files, just read the content directly
-            with open(file_path, 'r', encoding='utf-8') as f:
-                text = f.read()
-        else:
-            return {
-                'success': False,
-                'text': '',
-                'error': f'Unsupported file type: {file_extension}'
-            }
+        file_format = file_format or extractors.detect_file(file_path)
+    except UnsupportedFileType as error:
+        return {
+            'success': False,
+            'text': '',
+            'error': str(error)
+        }
+    return _run_extractor(file_format, file_path, file_path)
+
+
+def extract_text_from_bytes(content: bytes, blob_name: str) -> Dict[str, Any]:
+    """Extract text from a document held in memory, such as an upload."""
+    try:
+        file_format = extractors.detect(content[:HEADER_BYTES], blob_name)
+    except UnsupportedFileType as error:
+        return {
+            'success': False,
+            'text': '',
+            'error': str(error)
+        }
+    return _run_extractor(file_format, io.BytesIO(content), blob_name)
+
+
+def _run_extractor(file_format: FileFormat, source: Union[Path, BinaryIO], label: Any) -> Dict[str, Any]:
+    try:
+        # Extract text with the format's registered extractor
+        started = time.perf_counter()
+        with span(f'extract.parse.{file_format.name}'), metrics.EXTRACTIONS_IN_FLIGHT.track_in_progress():
+            extracted = file_format.extract(source)
+        text = extracted.get('text')
+        page_count = extracted.get('pageCount')
+        offsets = extracted.get('pageOffsets')
+        duration = time.perf_counter() - started
+        metrics.record_extraction(file_format.name, duration, page_count)
         
         # Check if text was extracted successfully
         if not text or text.strip() == '':
@@ -164,11 +253,14 @@ def extract_text_from_file(file_path: str) -> Dict[str, Any]:
         return {
             'success': True,
             'text': text,
+            'pageCount': page_count,
+            'pageOffsets': offsets,
+            'durationMs': round(duration * 1000.0, 1),
             'error': None
         }
         
     except Exception as error:
-        print(f"Error extracting text from {file_path}: {error}")
+        print(f"Error extracting text from {label}: {error}")
         return {
             'success': False,
             'text': '',
@@ -176,34 +268,86 @@ def extract_text_from_file(file_path: str) -> Dict[str, Any]:
         }
 
 
+def store_profile(handler_name: str, blob_name: str, profile_data: bytes,
+                  summary: str, details: Dict[str, Any]) -> str:
+    """Store a request profile and its text summary under the profiles/ prefix."""
+    now = datetime.utcnow()
+    profile_name = (
+        f"{PROFILES_PREFIX}{handler_name}/{now:%Y-%m-%d}/"
+        f"{now:%H%M%S}-{uuid.uuid4().hex[:8]}-{blob_name or 'request'}"
+    )
+    metadata = {key: str(value) for key, value in details.items()}
+    metadata.update({
+        'handler': handler_name,
+        'originalDocument': blob_name,
+        'profiledAt': now.isoformat()
+    })
+    
+    container_client.get_blob_client(f"{profile_name}.prof").upload_blob(
+        profile_data,
+        overwrite=True,
+        content_settings=ContentSettings(content_type='application/octet-stream'),
+        metadata=metadata
+    )
+    container_client.get_blob_client(f"{profile_name}.txt").upload_blob(
+        summary.encode('utf-8'),
+        overwrite=True,
+        content_settings=ContentSettings(content_type='text/plain'),
+        metadata=metadata
+    )
+    
+    print(f"Stored profile for {handler_name} {blob_name} in {profile_name}.prof")
+    return f"{profile_name}.prof"
+
+
+def _proxied_download(blob_name: str) -> Dict[str, Any]:
+    return {
+        'success': True,
+        'proxied': True,
+        'downloadPath': f"/api/files/{quote(blob_name, safe='')}/content"
+    }
+
+
+def sas_download_url(blob_name: str) -> Optional[str]:
+    """A read-only URL for a blob, valid for an hour; None when no SAS can be made."""
+    blob_client = container_client.get_blob_client(blob_name)
+    
+    # Since we're using a connection string with SAS token, 
+    # we can use the blob URL directly with the existing SAS token
+    # Extract the SAS token from the connection string
+    connection_string = AZURE_CONNECTION_STRING
+    if 'SharedAccessSignature=' in connection_string:
+        # Extract the SAS token part
+        sas_part = connection_string.split('SharedAccessSignature=')[1]
+        return f"{blob_client.url}?{sas_part}"
+    
+    # Fallback: try to generate a new SAS token
+    try:
+        sas_token = generate_blob_sas(
+            account_name=blob_service_client.account_name,
+            container_name=AZURE_CONTAINER_NAME,
+            blob_name=blob_name,
+            account_key=blob_service_client.credential.account_key,
+            permission=BlobSasPermissions(read=True),
+            expiry=datetime.utcnow() + timedelta(hours=1)
+        )
+    except Exception:
+        # Without a key there is no SAS
+        return None
+    return f"{blob_client.url}?{sas_token}"
+
+
+@timed('storage.get_download_url')
 def get_download_url(blob_name: str) -> Dict[str, Any]:
     """Get secure download URL for a file."""
     try:
-        blob_client = container_client.get_blob_client(blob_name)
+        if DOWNLOAD_PROXY:
+            return _proxied_download(blob_name)
         
-        # Since we're using a connection string with SAS token, 
-        # we can use the blob URL directly with the existing SAS token
-        # Extract the SAS token from the connection string
-        connection_string = AZURE_CONNECTION_STRING
-        if 'SharedAccessSignature=' in connection_string:
-            # Extract the SAS token part
-            sas_part = connection_string.split('SharedAccessSignature=')[1]
-            download_url = f"{blob_client.url}?{sas_part}"
-        else:
-            # Fallback: try to generate a new SAS token
-            try:
-                sas_token = generate_blob_sas(
-                    account_name=blob_service_client.account_name,
-                    container_name=AZURE_CONTAINER_NAME,
-                    blob_name=blob_name,
-                    account_key=blob_service_client.credential.account_key,
-                    permission=BlobSasPermissions(read=True),
-                    expiry=datetime.utcnow() + timedelta(hours=1)
-                )
-                download_url = f"{blob_client.url}?{sas_token}"
-            except Exception:
-                # If SAS generation fails, return the blob URL without SAS
-                download_url = blob_client.url
+        download_url = sas_download_url(blob_name)
+        if download_url is None:
+            # The DownloadFile proxy serves it
+            return _proxied_download(blob_name)
         
         return {
             'success': True,
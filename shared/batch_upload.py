@@ -0,0 +1,158 @@
+"""
+Uploading many files in one request
+
+Unique names for the whole batch are resolved from one listing per file
+name stem instead of a probe per candidate name, and the parts are
+uploaded concurrently, so a batch takes about as long as its largest file.
+Uploads use ``overwrite=False``: a name taken by a concurrent upload after
+the listing makes that one upload move on to the next free name instead
+of overwriting the other file.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterable, List, NamedTuple, Optional, Set
+
+from azure.core.exceptions import ResourceExistsError
+from azure.storage.blob import ContentSettings
+
+from shared import metrics
+from shared.timing import span
+
+UPLOAD_CONCURRENCY = int(os.getenv('UPLOAD_CONCURRENCY', '8') or 8)
+MAX_BATCH_FILES = 100
+# Attempts per file when names are taken between the listing and the upload
+MAX_NAME_ATTEMPTS = 5
+
+
+class UploadPart(NamedTuple):
+    """One file of a batch; ``stream`` is positioned at the start of the file."""
+    filename: str
+    stream: BinaryIO
+    size: int
+    content_type: Optional[str] = None
+
+
+def next_free_name(filename: str, taken: Set[str]) -> str:
+    """First of ``name.ext``, ``name (1).ext``, ... not in ``taken``, as generate_unique_filename picks."""
+    name, ext = os.path.splitext(filename)
+    candidate = filename
+    counter = 1
+    while candidate in taken:
+        candidate = f"{name} ({counter}){ext}"
+        counter += 1
+    return candidate
+
+
+def resolve_unique_names(container_client, filenames: List[str], taken: Optional[Set[str]] = None) -> List[str]:
+    """Unique blob names for ``filenames``, distinct from existing blobs and each other.
+
+    All candidates for a file start with its stem, so one listing per
+    distinct stem finds every name that could collide. The listed and the
+    resolved names are added to ``taken`` when it is given.
+    """
+    taken = set() if taken is None else taken
+    stems = sorted({os.path.splitext(filename)[0] for filename in filenames})
+
+    def list_names(stem: str) -> List[str]:
+        with span('storage.list_blobs'):
+            return [blob.name for blob in container_client.list_blobs(name_starts_with=stem)]
+
+    with ThreadPoolExecutor(max_workers=max(1, min(UPLOAD_CONCURRENCY, len(stems)))) as executor:
+        for names in executor.map(list_names, stems):
+            taken.update(names)
+
+    resolved = []
+    for filename in filenames:
+        name = next_free_name(filename, taken)
+        taken.add(name)
+        resolved.append(name)
+    return resolved
+
+
+def upload_part(container_client, blob_name: str, part: UploadPart,
+                content_settings: Optional[ContentSettings] = None, reserved: Iterable[str] = ()) -> str:
+    """Upload one part without overwriting; returns the name it was stored under.
+
+    A name taken in the meantime moves the part to the next free name that
+    is not ``reserved``: already listed, or resolved for another part of
+    the batch.
+    """
+    taken = set(reserved)
+    start = part.stream.tell()
+    for attempt in range(MAX_NAME_ATTEMPTS):
+        try:
+            with span('storage.upload_blob'):
+                container_client.get_blob_client(blob_name).upload_blob(
+                    part.stream,
+                    length=part.size,
+                    overwrite=False,
+                    content_settings=content_settings,
+                    metadata={
+                        'originalName': part.filename,
+                        'uploadedAt': datetime.utcnow().isoformat()
+                    }
+                )
+            metrics.STORAGE_BYTES_UPLOADED.inc(part.size)
+            return blob_name
+        except ResourceExistsError:
+            if attempt == MAX_NAME_ATTEMPTS - 1:
+                raise
+            taken.add(blob_name)
+            blob_name = next_free_name(part.filename, taken)
+            part.stream.seek(start)
+    return blob_name
+
+
+def upload_batch(container_client, parts: List[UploadPart], max_file_size: int,
+                 supported_extensions: Set[str],
+                 content_settings: Optional[Callable[[UploadPart], ContentSettings]] = None,
+                 after_upload: Optional[Callable[[str, UploadPart], Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    """Validate, name and upload ``parts`` concurrently; one result per part, in order.
+
+    ``after_upload(blob_name, part)`` runs in the same worker once a part is
+    stored (thumbnails, extract-on-upload) and its result is merged into
+    that part's entry. One part failing does not affect the others.
+    """
+    results: List[Dict[str, Any]] = []
+    accepted = []
+    for part in parts:
+        result = {'originalName': part.filename, 'size': part.size}
+        extension = Path(part.filename).suffix.lower()
+        if part.size > max_file_size:
+            result.update(success=False, error=f'File too large. Maximum size is {max_file_size // (1024 * 1024)}MB')
+        elif extension not in supported_extensions:
+            result.update(success=False, error=f'Unsupported file type: {extension}')
+        else:
+            accepted.append((part, result))
+        results.append(result)
+
+    if not accepted:
+        return results
+
+    # Existing and resolved names, so a part that loses its name to a
+    # concurrent upload skips straight past them
+    reserved: Set[str] = set()
+    names = resolve_unique_names(container_client, [part.filename for part, _ in accepted], reserved)
+
+    def upload(job) -> None:
+        (part, result), blob_name = job
+        try:
+            settings = content_settings(part) if content_settings else None
+            blob_name = upload_part(container_client, blob_name, part, settings, reserved - {blob_name})
+            result.update(success=True, filename=blob_name)
+        except Exception as error:
+            print(f"Upload error for {part.filename}: {error}")
+            result.update(success=False, error='Failed to upload file')
+            return
+        if after_upload:
+            try:
+                result.update(after_upload(blob_name, part) or {})
+            except Exception as error:
+                print(f"Post-upload processing failed for {blob_name}: {error}")
+
+    with ThreadPoolExecutor(max_workers=max(1, min(UPLOAD_CONCURRENCY, len(accepted)))) as executor:
+        list(executor.map(upload, zip(accepted, names)))
+    return results
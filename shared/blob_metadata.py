@@ -0,0 +1,41 @@
+"""
+Merging updates into blob metadata
+
+``set_blob_metadata`` replaces the whole metadata dictionary, so updates
+are merged into the current values and written back conditionally on the
+ETag that was read; a concurrent writer causes a re-read instead of a lost
+update.
+"""
+
+from typing import Dict, Optional
+
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceModifiedError
+
+from shared.timing import span
+
+MAX_ATTEMPTS = 3
+
+
+def merge_blob_metadata(container_client, blob_name: str, updates: Dict[str, str]) -> Optional[Dict[str, str]]:
+    """Merge ``updates`` into a blob's metadata in one write; returns the new metadata."""
+    if not updates:
+        return None
+    blob_client = container_client.get_blob_client(blob_name)
+    for attempt in range(MAX_ATTEMPTS):
+        with span('storage.get_blob_properties'):
+            properties = blob_client.get_blob_properties()
+        metadata = dict(properties.metadata or {})
+        metadata.update(updates)
+        try:
+            with span('storage.set_blob_metadata'):
+                blob_client.set_blob_metadata(
+                    metadata,
+                    etag=properties.etag,
+                    match_condition=MatchConditions.IfNotModified
+                )
+            return metadata
+        except ResourceModifiedError:
+            if attempt == MAX_ATTEMPTS - 1:
+                raise
+    return None
@@ -0,0 +1,190 @@
+"""
+Stored LLM-ready chunks of extracted text
+
+Whenever text is stored, its token-bounded chunks (``chunking.chunk_tokens``)
+are written once as JSON lines to ``documents_text/<blob>.chunks.jsonl``,
+next to ``documents_text/<blob>.txt``. The chunks blob records the ETag of
+the text it was built from and the chunker settings; export regenerates it
+only when either no longer matches (for example text stored before chunking
+existed, or a chunker upgrade).
+
+Export reads documents one at a time from a blob listing and yields their
+stored JSON lines as they are downloaded, so memory stays bounded by one
+download chunk regardless of corpus size.
+"""
+
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import ContentSettings
+
+from shared import metrics
+from shared.chunking import CHUNK_MAX_TOKENS, CHUNK_OVERLAP_TOKENS, chunk_tokens
+from shared.search_index import TEXT_PREFIX, TEXT_SUFFIX
+from shared.timing import span
+
+CHUNKS_SUFFIX = '.chunks.jsonl'
+# Bump when chunk_tokens output changes, so stored chunks are rebuilt on export
+CHUNKER_VERSION = '1'
+CHUNKER_SETTINGS = f'{CHUNKER_VERSION}:{CHUNK_MAX_TOKENS}:{CHUNK_OVERLAP_TOKENS}'
+
+EXPORT_PAGE_DOCUMENTS = 50
+MAX_EXPORT_PAGE_DOCUMENTS = 200
+
+
+def chunks_blob_name(blob_name: str) -> str:
+    return f"{TEXT_PREFIX}{blob_name}{CHUNKS_SUFFIX}"
+
+
+def build_chunk_lines(blob_name: str, text: str, page_offsets: Optional[Sequence[int]] = None) -> Tuple[bytes, int]:
+    """JSONL bytes with one chunk per line, and the number of chunks."""
+    chunks = chunk_tokens(text, page_offsets=page_offsets)
+    lines = ''.join(json.dumps({'document': blob_name, **chunk}, ensure_ascii=False) + '\n' for chunk in chunks)
+    return lines.encode('utf-8'), len(chunks)
+
+
+def store_chunks(container_client, blob_name: str, text: str, text_etag: Optional[str],
+                 page_offsets: Optional[Sequence[int]] = None) -> bytes:
+    """Chunk ``text`` and store the JSONL next to it; returns the stored bytes."""
+    with span('chunks.build'):
+        data, count = build_chunk_lines(blob_name, text, page_offsets)
+    with span('storage.upload_blob'):
+        container_client.get_blob_client(chunks_blob_name(blob_name)).upload_blob(
+            data,
+            overwrite=True,
+            content_settings=ContentSettings(content_type='application/x-ndjson'),
+            metadata={
+                'originalDocument': blob_name,
+                'textEtag': text_etag or '',
+                'chunker': CHUNKER_SETTINGS,
+                'chunkCount': str(count),
+                'hasPages': 'true' if page_offsets else 'false'
+            }
+        )
+    metrics.STORAGE_BYTES_UPLOADED.inc(len(data))
+    return data
+
+
+def is_current(chunks_metadata: Optional[Dict[str, str]], text_etag: Optional[str]) -> bool:
+    """True when stored chunks were built from the text with ``text_etag`` by this chunker."""
+    return bool(chunks_metadata and text_etag
+                and chunks_metadata.get('textEtag') == text_etag
+                and chunks_metadata.get('chunker') == CHUNKER_SETTINGS)
+
+
+def iter_document_chunks(container_client, blob_name: str, text_etag: Optional[str] = None,
+                         chunks_metadata: Optional[Dict[str, str]] = None) -> Iterator[bytes]:
+    """Yield the stored JSONL of one document, rebuilding it first when stale.
+
+    ``text_etag`` and ``chunks_metadata`` come from a listing when available
+    and are looked up otherwise. Yields nothing when there is no text.
+    """
+    chunks_client = container_client.get_blob_client(chunks_blob_name(blob_name))
+    if text_etag is None:
+        try:
+            text_etag = container_client.get_blob_client(f"{TEXT_PREFIX}{blob_name}{TEXT_SUFFIX}") \
+                .get_blob_properties().etag
+        except ResourceNotFoundError:
+            return
+    if chunks_metadata is None:
+        try:
+            chunks_metadata = chunks_client.get_blob_properties().metadata
+        except ResourceNotFoundError:
+            chunks_metadata = None
+
+    if is_current(chunks_metadata, text_etag):
+        try:
+            downloader = chunks_client.download_blob()
+            for data in downloader.chunks():
+                metrics.STORAGE_BYTES_DOWNLOADED.inc(len(data))
+                yield data
+            return
+        except ResourceNotFoundError:
+            pass
+
+    # Missing or stale: rebuild from the current text (page numbers are only
+    # known at extraction time, so rebuilt chunks have none)
+    try:
+        text_downloader = container_client.get_blob_client(f"{TEXT_PREFIX}{blob_name}{TEXT_SUFFIX}").download_blob()
+    except ResourceNotFoundError:
+        return
+    text_bytes = text_downloader.readall()
+    metrics.STORAGE_BYTES_DOWNLOADED.inc(len(text_bytes))
+    yield store_chunks(container_client, blob_name, text_bytes.decode('utf-8'), text_downloader.properties.etag)
+
+
+def list_documents_page(container_client, prefix: str = '', limit: int = EXPORT_PAGE_DOCUMENTS,
+                        continuation_token: Optional[str] = None) -> Tuple[List[Tuple[str, str, Optional[Dict[str, str]]]], Optional[str]]:
+    """One listing page of documents with text under ``prefix``.
+
+    Returns ``[(blob_name, text_etag, chunks_metadata)]`` and the token for
+    the next page. A document's chunks blob sorts before its text blob, so
+    its metadata is normally part of the same page; otherwise it is looked
+    up on export.
+    """
+    pages = container_client.list_blobs(
+        name_starts_with=f"{TEXT_PREFIX}{prefix}",
+        include=['metadata'],
+        results_per_page=2 * limit
+    ).by_page(continuation_token=continuation_token)
+    documents = []
+    chunks_metadata: Dict[str, Dict[str, str]] = {}
+    with span('storage.list_blobs'):
+        page = next(pages, [])
+        for blob in page:
+            name = blob.name[len(TEXT_PREFIX):]
+            if name.endswith(CHUNKS_SUFFIX):
+                chunks_metadata[name[:-len(CHUNKS_SUFFIX)]] = blob.metadata or {}
+            elif name.endswith(TEXT_SUFFIX):
+                blob_name = name[:-len(TEXT_SUFFIX)]
+                documents.append((blob_name, blob.etag, chunks_metadata.pop(blob_name, None)))
+    return documents, pages.continuation_token
+
+
+def export_chunks(container_client, documents: Iterable[Tuple[str, Optional[str], Optional[Dict[str, str]]]]) -> Iterator[bytes]:
+    """Concatenated JSONL chunks of ``documents`` (as from ``list_documents_page``)."""
+    for blob_name, text_etag, chunks_metadata in documents:
+        try:
+            yield from iter_document_chunks(container_client, blob_name, text_etag, chunks_metadata)
+        except Exception as error:
+            print(f"Chunk export failed for {blob_name}: {error}")
+            yield (json.dumps({'document': blob_name, 'error': str(error)}) + '\n').encode('utf-8')
+
+
+def export_all(container_client, prefix: str = '', names: Optional[Sequence[str]] = None) -> Iterator[bytes]:
+    """Stream the chunks of every document under ``prefix``, or of ``names``."""
+    if names is not None:
+        yield from export_chunks(container_client, ((name, None, None) for name in names))
+        return
+    continuation_token = None
+    while True:
+        documents, continuation_token = list_documents_page(
+            container_client, prefix, MAX_EXPORT_PAGE_DOCUMENTS, continuation_token)
+        yield from export_chunks(container_client, documents)
+        if not continuation_token:
+            break
+
+
+def parse_export_request(params: Dict[str, Any], body: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Export options from query parameters and an optional JSON body.
+
+    ``names`` is a JSON list in the body or a comma-separated parameter,
+    ``prefix`` restricts the listing, and ``limit``/``cursor`` page through
+    it. Raises ValueError for malformed values.
+    """
+    if body is not None and not isinstance(body, dict):
+        raise ValueError('Invalid JSON body')
+    body = body or {}
+    names = body.get('names')
+    if names is None and params.get('names'):
+        names = [name for name in params['names'].split(',') if name]
+    if names is not None and not (isinstance(names, list) and all(isinstance(name, str) for name in names)):
+        raise ValueError('names must be a list of blob names')
+    limit = int(body.get('limit') or params.get('limit') or EXPORT_PAGE_DOCUMENTS)
+    return {
+        'names': names,
+        'prefix': body.get('prefix') or params.get('prefix') or '',
+        'limit': max(1, min(limit, MAX_EXPORT_PAGE_DOCUMENTS)),
+        'cursor': body.get('cursor') or params.get('cursor') or None
+    }
@@ -0,0 +1,143 @@
+"""
+Split extracted text into bounded chunks
+
+``chunk_text`` packs whole paragraphs into chunks of at most ``max_words``
+words, cutting long paragraphs at sentence and then word boundaries; it is
+used for similarity vectors. ``chunk_tokens`` produces overlapping windows
+bounded by an approximate token count, with page provenance, for language
+model ingestion. Every chunk records its character offsets into the
+original text.
+"""
+
+import bisect
+import re
+from typing import Any, Dict, List, Optional, Sequence
+
+CHUNK_MAX_WORDS = 200
+CHUNK_MAX_TOKENS = 512
+CHUNK_OVERLAP_TOKENS = 64
+
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+_WORD = re.compile(r'\S+')
+# Words and individual punctuation marks; close to what subword tokenizers
+# produce for prose without depending on a model's vocabulary
+_TOKEN = re.compile(r'\w+|[^\w\s]')
+_SENTENCE_PUNCTUATION = frozenset('.!?')
+
+
+def _pieces(text: str, start: int, end: int, pattern: re.Pattern) -> List[tuple]:
+    """Split text[start:end] on ``pattern`` into (start, end) spans without the separators."""
+    spans = []
+    position = start
+    for match in pattern.finditer(text, start, end):
+        if match.start() > position:
+            spans.append((position, match.start()))
+        position = match.end()
+    if position < end:
+        spans.append((position, end))
+    return spans
+
+
+def _units(text: str, max_words: int) -> List[tuple]:
+    """(start, end, words) spans no longer than ``max_words``, in text order."""
+    units = []
+    for para_start, para_end in _pieces(text, 0, len(text), _PARAGRAPH_BREAK):
+        words = len(_WORD.findall(text, para_start, para_end))
+        if words == 0:
+            continue
+        if words <= max_words:
+            units.append((para_start, para_end, words))
+            continue
+        for sent_start, sent_end in _pieces(text, para_start, para_end, _SENTENCE_END):
+            sentence_words = list(_WORD.finditer(text, sent_start, sent_end))
+            for i in range(0, len(sentence_words), max_words):
+                group = sentence_words[i:i + max_words]
+                units.append((group[0].start(), group[-1].end(), len(group)))
+    return units
+
+
+def chunk_text(text: str, max_words: int = CHUNK_MAX_WORDS) -> List[Dict[str, Any]]:
+    """Pack paragraphs (or their pieces) greedily into chunks of at most ``max_words`` words.
+
+    Returns dicts with ``index``, ``start``, ``end``, ``words`` and ``text``
+    where ``text == original[start:end]``.
+    """
+    chunks: List[Dict[str, Any]] = []
+    current_start = current_end = None
+    current_words = 0
+
+    def flush() -> None:
+        if current_start is not None:
+            chunks.append({
+                'index': len(chunks),
+                'start': current_start,
+                'end': current_end,
+                'words': current_words,
+                'text': text[current_start:current_end]
+            })
+
+    for start, end, words in _units(text or '', max_words):
+        if current_start is not None and current_words + words > max_words:
+            flush()
+            current_start = None
+        if current_start is None:
+            current_start, current_words = start, 0
+        current_end = end
+        current_words += words
+    flush()
+    return chunks
+
+
+def count_tokens(text: str) -> int:
+    """Approximate token count used for chunk bounds."""
+    return sum(1 for _ in _TOKEN.finditer(text or ''))
+
+
+def chunk_tokens(text: str, max_tokens: int = CHUNK_MAX_TOKENS, overlap: int = CHUNK_OVERLAP_TOKENS,
+                 page_offsets: Optional[Sequence[int]] = None) -> List[Dict[str, Any]]:
+    """Overlapping windows of at most ``max_tokens`` tokens.
+
+    A window ends at the last sentence or line break in its final quarter
+    when there is one, and the next window starts ``overlap`` tokens before
+    that end. With ``page_offsets`` (start offset of every page, see
+    ``extractor.pdf_extractor.page_offsets``) chunks carry the 1-based
+    ``pageStart``/``pageEnd`` they span.
+    """
+    if overlap >= max_tokens:
+        raise ValueError('overlap must be smaller than max_tokens')
+
+    text = text or ''
+    spans = [match.span() for match in _TOKEN.finditer(text)]
+    # breaks[i]: a new sentence or line starts at token i
+    breaks = [False] * len(spans)
+    for i in range(1, len(spans)):
+        previous_start, previous_end = spans[i - 1]
+        breaks[i] = (text[previous_start:previous_end] in _SENTENCE_PUNCTUATION
+                     or '\n' in text[previous_end:spans[i][0]])
+
+    chunks: List[Dict[str, Any]] = []
+    first = 0
+    while first < len(spans):
+        last = min(first + max_tokens, len(spans))
+        if last < len(spans):
+            for candidate in range(last, first + max_tokens * 3 // 4, -1):
+                if breaks[candidate]:
+                    last = candidate
+                    break
+        start, end = spans[first][0], spans[last - 1][1]
+        chunk = {
+            'chunk': len(chunks),
+            'start': start,
+            'end': end,
+            'tokens': last - first,
+            'text': text[start:end]
+        }
+        if page_offsets:
+            chunk['pageStart'] = bisect.bisect_right(page_offsets, start)
+            chunk['pageEnd'] = bisect.bisect_right(page_offsets, end - 1)
+        chunks.append(chunk)
+        if last >= len(spans):
+            break
+        first = max(last - overlap, first + 1)
+    return chunks
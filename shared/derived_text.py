@@ -0,0 +1,75 @@
+"""
+Data derived from stored text
+
+Storing text only writes ``documents_text/<blob>.txt``. For freshly
+extracted text the document's statistics and MinHash signature are then
+merged into its metadata in one small write, which listings rely on. The
+rest (stored chunks, the search and similarity index entries, the LSH
+buckets) is handed to ``index_sync.index_updates``, so a request never
+waits for it. A dropped or failed update is repaired by the next
+background sync, and chunks are rebuilt on export when they are stale.
+"""
+
+from typing import Any, Dict, Optional, Sequence
+
+from shared import chunk_store, document_stats, minhash, search_index, similarity
+from shared.blob_metadata import merge_blob_metadata
+from shared.index_sync import index_updates
+
+
+def record_source_metadata(container_client, blob_name: str, text: str,
+                           extraction: Dict[str, Any]) -> Dict[str, str]:
+    """Merge statistics and the MinHash signature of extracted text into its document's metadata.
+
+    Returns the metadata computed; failures are logged only.
+    """
+    source_metadata: Dict[str, str] = {}
+    try:
+        source_metadata.update(document_stats.compute_stats(text, extraction))
+    except Exception as error:
+        print(f"Failed to compute statistics for {blob_name}: {error}")
+    try:
+        source_metadata.update(minhash.signature_metadata(text))
+    except Exception as error:
+        print(f"Failed to compute MinHash signature for {blob_name}: {error}")
+    try:
+        merge_blob_metadata(container_client, blob_name, source_metadata)
+    except Exception as error:
+        print(f"Failed to update metadata of {blob_name}: {error}")
+    return source_metadata
+
+
+def update_derived(container_client, blob_name: str, text: str, etag: Optional[str],
+                   page_offsets: Optional[Sequence[int]] = None,
+                   source_metadata: Optional[Dict[str, str]] = None) -> None:
+    """Bring chunks and the local indexes in step with newly stored text; failures are logged only."""
+    try:
+        chunk_store.store_chunks(container_client, blob_name, text, etag, page_offsets=page_offsets)
+    except Exception as error:
+        print(f"Failed to store chunks for {blob_name}: {error}")
+    try:
+        search_index.get_index().index_document(blob_name, text, etag=etag)
+    except Exception as error:
+        print(f"Failed to index extracted text for {blob_name}: {error}")
+    try:
+        similarity.get_index().add_document(blob_name, text, etag=etag)
+    except Exception as error:
+        print(f"Failed to add {blob_name} to the similarity index: {error}")
+    if source_metadata:
+        try:
+            minhash.remember(blob_name, source_metadata)
+        except Exception as error:
+            print(f"Failed to add {blob_name} to the duplicate index: {error}")
+
+
+def after_text_stored(container_client, blob_name: str, text: str, etag: Optional[str],
+                      extraction: Optional[Dict[str, Any]] = None) -> None:
+    """Record source metadata of freshly extracted text and queue the derived-index updates.
+
+    ``extraction`` is the result of extracting the text, None for edits.
+    """
+    source_metadata = None
+    if extraction is not None:
+        source_metadata = record_source_metadata(container_client, blob_name, text, extraction)
+    index_updates.submit(update_derived, container_client, blob_name, text, etag,
+                         (extraction or {}).get('pageOffsets'), source_metadata)
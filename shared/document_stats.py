@@ -0,0 +1,81 @@
+"""
+Document statistics computed once at extraction time
+
+The values are stored as strings in the source blob's metadata, which a
+listing with ``include=['metadata']`` returns for free, so ``/api/files``
+can show page and word counts, language and extraction time without
+opening any document.
+"""
+
+import re
+from typing import Any, Dict, Optional
+
+_WORD = re.compile(r'\w+')
+
+# Frequent function words; enough to tell these languages apart on a page of text
+_STOPWORDS = {
+    'en': frozenset('the and of to in is that for it with as was on be by this are or from at'.split()),
+    'de': frozenset('der die und das ist nicht mit den von zu sich des ein eine auf für im dem auch'.split()),
+    'fr': frozenset('le la les et des est pas une dans que pour qui sur du au avec par il elle'.split()),
+    'es': frozenset('el la los las y de que en un una por con para es se del al como su'.split()),
+    'it': frozenset('il di che la e un una per non sono della con del le gli nel si anche'.split()),
+    'nl': frozenset('de het een en van is dat niet op te zijn met voor die er aan ook als'.split()),
+    'pt': frozenset('o a os as e de do da que em um uma para com não por se dos das no'.split()),
+}
+# Words sampled for language detection; the start of a document is representative enough
+_LANGUAGE_SAMPLE_WORDS = 5000
+_MIN_STOPWORD_HITS = 5
+
+STATS_KEYS = ('pageCount', 'characterCount', 'wordCount', 'language', 'extractionMs')
+_INTEGER_KEYS = ('pageCount', 'characterCount', 'wordCount')
+
+
+def detect_language(text: str) -> Optional[str]:
+    """ISO 639-1 code of the language whose stopwords dominate ``text``, or None."""
+    counts = {language: 0 for language in _STOPWORDS}
+    for index, match in enumerate(_WORD.finditer(text.lower())):
+        if index >= _LANGUAGE_SAMPLE_WORDS:
+            break
+        word = match.group()
+        for language, stopwords in _STOPWORDS.items():
+            if word in stopwords:
+                counts[language] += 1
+    language, hits = max(counts.items(), key=lambda item: item[1])
+    return language if hits >= _MIN_STOPWORD_HITS else None
+
+
+def compute_stats(text: str, extraction: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+    """Metadata values describing ``text`` and how it was extracted."""
+    extraction = extraction or {}
+    stats = {
+        'characterCount': str(len(text)),
+        'wordCount': str(sum(1 for _ in _WORD.finditer(text)))
+    }
+    if extraction.get('pageCount') is not None:
+        stats['pageCount'] = str(extraction['pageCount'])
+    if extraction.get('durationMs') is not None:
+        stats['extractionMs'] = str(extraction['durationMs'])
+    language = detect_language(text)
+    if language:
+        stats['language'] = language
+    return stats
+
+
+def stats_from_metadata(metadata: Optional[Dict[str, str]]) -> Dict[str, Any]:
+    """Typed statistics for a listing entry; missing values are None."""
+    metadata = metadata or {}
+    stats: Dict[str, Any] = {}
+    for key in STATS_KEYS:
+        value = metadata.get(key)
+        if value is not None and key in _INTEGER_KEYS:
+            try:
+                value = int(value)
+            except ValueError:
+                value = None
+        elif value is not None and key == 'extractionMs':
+            try:
+                value = float(value)
+            except ValueError:
+                value = None
+        stats[key] = value
+    return stats
@@ -0,0 +1,174 @@
+"""
+Extractor registry keyed by file content
+
+Formats are recognised from the first few KB of a file (magic bytes, the
+member names of a ZIP container, or valid UTF-8) rather than from the
+blob name, so a mislabeled upload is rejected after a small ranged read
+instead of a full download. Each extractor package builds an
+``ExtractorRegistry`` and registers its formats; adding a format means
+registering it there, not editing the code that downloads and dispatches.
+"""
+
+import codecs
+import struct
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple, Union
+
+from azure.core.exceptions import HttpResponseError
+
+from shared.timing import span
+
+# Enough for magic bytes and the first ZIP member names of an OOXML package
+HEADER_BYTES = 8192
+
+_ZIP_LOCAL_HEADER = b'PK\x03\x04'
+_ZIP_EMPTY = b'PK\x05\x06'
+_OOXML_PART_PREFIXES = ('word/', 'xl/', 'ppt/')
+
+Sniffer = Callable[[bytes, str], bool]
+Extractor = Callable[[Union[Path, BinaryIO]], Dict[str, Any]]
+
+
+class UnsupportedFileType(ValueError):
+    """Raised when a file's content matches no extractor."""
+
+
+class FileFormat:
+    """A registered format: how to recognise it and how to extract its text.
+
+    ``extract`` takes a file path or a binary stream and returns a
+    dictionary with ``text`` and, where known, ``pageCount`` and
+    ``pageOffsets``. Formats registered with a ``reason`` instead are
+    recognised only to be rejected with that message.
+    """
+
+    def __init__(self, name: str, sniff: Sniffer, extract: Optional[Extractor] = None,
+                 reason: Optional[str] = None):
+        self.name = name
+        self.sniff = sniff
+        self.extract = extract
+        self.reason = reason
+
+    def __repr__(self) -> str:
+        return f"FileFormat({self.name!r})"
+
+
+class ExtractorRegistry:
+    """Formats in registration order; the first whose sniffer matches wins."""
+
+    def __init__(self):
+        self._formats: List[FileFormat] = []
+
+    def register(self, name: str, sniff: Sniffer, extract: Optional[Extractor] = None,
+                 reason: Optional[str] = None) -> FileFormat:
+        if (extract is None) == (reason is None):
+            raise ValueError('Register a format with either an extractor or a rejection reason')
+        file_format = FileFormat(name, sniff, extract, reason)
+        self._formats = [existing for existing in self._formats if existing.name != name]
+        self._formats.append(file_format)
+        return file_format
+
+    @property
+    def formats(self) -> Tuple[FileFormat, ...]:
+        return tuple(self._formats)
+
+    def detect(self, header: bytes, filename: str = '') -> FileFormat:
+        """The format of a file starting with ``header``; raises UnsupportedFileType."""
+        if not header:
+            raise UnsupportedFileType('The file is empty')
+        for file_format in self._formats:
+            if file_format.sniff(header, filename):
+                if file_format.reason:
+                    raise UnsupportedFileType(file_format.reason)
+                return file_format
+        extension = Path(filename).suffix.lower()
+        detail = f" ({extension} content not recognised)" if extension else ''
+        raise UnsupportedFileType(f'Unsupported file type for text extraction{detail}')
+
+    def detect_file(self, file_path: Path) -> FileFormat:
+        with open(file_path, 'rb') as f:
+            header = f.read(HEADER_BYTES)
+        return self.detect(header, Path(file_path).name)
+
+
+def read_blob_header(blob_client, length: int = HEADER_BYTES) -> bytes:
+    """The first ``length`` bytes of a blob, fetched with a ranged download.
+
+    A result shorter than ``length`` is the whole blob.
+    """
+    try:
+        with span('storage.download_blob_header'):
+            return blob_client.download_blob(offset=0, length=length).readall()
+    except HttpResponseError as error:
+        # A range of an empty blob is not satisfiable (416)
+        if error.status_code == 416:
+            return b''
+        raise
+
+
+def has_magic(*signatures: bytes, within: int = 0) -> Sniffer:
+    """Sniffer matching files that start with one of ``signatures``.
+
+    With ``within`` the signature may appear anywhere in that many leading
+    bytes (PDF readers accept junk before ``%PDF-``).
+    """
+    def sniff(header: bytes, filename: str) -> bool:
+        if within:
+            return any(signature in header[:within] for signature in signatures)
+        return header.startswith(signatures)
+    return sniff
+
+
+def zip_member_names(header: bytes) -> List[str]:
+    """Names of the ZIP members whose local headers lie within ``header``."""
+    names = []
+    position = header.find(_ZIP_LOCAL_HEADER)
+    while 0 <= position and position + 30 <= len(header):
+        name_length, = struct.unpack_from('<H', header, position + 26)
+        raw_name = header[position + 30:position + 30 + name_length]
+        if len(raw_name) < name_length:
+            break
+        try:
+            names.append(raw_name.decode('utf-8'))
+        except UnicodeDecodeError:
+            pass
+        position = header.find(_ZIP_LOCAL_HEADER, position + 30 + name_length)
+    return names
+
+
+def is_zip(header: bytes, filename: str = '') -> bool:
+    return header.startswith((_ZIP_LOCAL_HEADER, _ZIP_EMPTY))
+
+
+def ooxml_package(part_prefix: str, extension: str) -> Sniffer:
+    """Sniffer for an Office Open XML package whose main part is under ``part_prefix``.
+
+    Members are usually written in a fixed order, so the main part shows up
+    within the header; when no OOXML part does (a large first member), the
+    file name's extension decides.
+    """
+    def sniff(header: bytes, filename: str) -> bool:
+        if not is_zip(header):
+            return False
+        names = zip_member_names(header)
+        if any(name.startswith(part_prefix) for name in names):
+            return True
+        if any(name.startswith(_OOXML_PART_PREFIXES) for name in names):
+            return False
+        return filename.lower().endswith(extension)
+    return sniff
+
+
+def is_utf8_text(header: bytes, filename: str = '') -> bool:
+    """Whether ``header`` is the start of a UTF-8 (or ASCII) text file.
+
+    The header may end inside a multi-byte character, so it is decoded
+    incrementally without requiring a complete final sequence.
+    """
+    if b'\x00' in header:
+        return False
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(header, final=False)
+    except UnicodeDecodeError:
+        return False
+    return True
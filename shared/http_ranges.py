@@ -0,0 +1,149 @@
+"""
+Serving blobs over HTTP with Range support
+
+``plan_response`` turns a request's ``Range``, ``If-Range`` and
+``If-None-Match`` headers and the blob's properties into a status code,
+headers and the byte range to send; ``iter_blob_range`` then reads that
+range from storage in fixed-size ranged downloads, so a proxy holds one
+chunk per download in memory however large the blob is. Only single byte
+ranges are served; multi-range requests get the whole blob, which RFC 9110
+allows.
+"""
+
+import os
+import re
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Iterator, NamedTuple, Optional, Tuple
+
+from azure.core import MatchConditions
+
+from shared import metrics
+from shared.timing import span
+
+DOWNLOAD_CHUNK_BYTES = int(os.getenv('DOWNLOAD_CHUNK_BYTES', str(4 * 1024 * 1024)) or 4 * 1024 * 1024)
+
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class ResponsePlan(NamedTuple):
+    status: int
+    headers: Dict[str, str]
+    offset: int = 0
+    length: int = 0
+
+
+def parse_range(value: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """``(start, end)`` (inclusive) of a single byte range, or None to send everything.
+
+    Raises ValueError when the range cannot be satisfied for ``size`` bytes.
+    """
+    if not value:
+        return None
+    match = _RANGE.match(value.strip().replace(' ', ''))
+    if not match or match.group(1) == match.group(2) == '':
+        # Malformed or multi-range: ignore the header
+        return None
+    if size == 0:
+        # An empty blob has no bytes to satisfy any range
+        raise ValueError('range not satisfiable')
+    first, last = match.groups()
+    if first == '':
+        # Suffix range: the last N bytes
+        suffix = int(last)
+        if suffix == 0:
+            raise ValueError('empty suffix range')
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        raise ValueError('range not satisfiable')
+    return start, end
+
+
+def _if_range_allows(value: Optional[str], etag: str, last_modified) -> bool:
+    """Whether an ``If-Range`` precondition still matches the blob."""
+    if not value:
+        return True
+    value = value.strip()
+    if value.startswith(('"', 'W/')):
+        # Weak validators never match (strong comparison)
+        return value == etag
+    try:
+        return parsedate_to_datetime(value) >= last_modified.replace(microsecond=0)
+    except (TypeError, ValueError):
+        return False
+
+
+def plan_response(request_headers, properties) -> ResponsePlan:
+    """Status, headers and byte range for serving a blob with these properties."""
+    size = properties.size
+    etag = properties.etag
+    settings = properties.content_settings
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': etag,
+        'Last-Modified': format_datetime(properties.last_modified, usegmt=True),
+        'Content-Type': (settings.content_type if settings else None) or 'application/octet-stream'
+    }
+    if settings and settings.content_disposition:
+        headers['Content-Disposition'] = settings.content_disposition
+
+    if_none_match = request_headers.get('If-None-Match')
+    if if_none_match and (if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]):
+        return ResponsePlan(304, headers)
+
+    byte_range = None
+    if _if_range_allows(request_headers.get('If-Range'), etag, properties.last_modified):
+        try:
+            byte_range = parse_range(request_headers.get('Range'), size)
+        except ValueError:
+            headers['Content-Range'] = f'bytes */{size}'
+            return ResponsePlan(416, headers)
+
+    if byte_range is None:
+        headers['Content-Length'] = str(size)
+        return ResponsePlan(200, headers, 0, size)
+    start, end = byte_range
+    headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+    headers['Content-Length'] = str(end - start + 1)
+    return ResponsePlan(206, headers, start, end - start + 1)
+
+
+def iter_blob_range(blob_client, offset: int, length: int, etag: str,
+                    chunk_size: int = DOWNLOAD_CHUNK_BYTES) -> Iterator[bytes]:
+    """Yield ``length`` bytes of a blob from ``offset``, one ranged download per chunk.
+
+    Every chunk is conditional on ``etag``, so a blob replaced mid-download
+    fails the download instead of mixing two versions.
+    """
+    end = offset + length
+    position = offset
+    while position < end:
+        count = min(chunk_size, end - position)
+        with span('storage.download_blob'):
+            chunk = blob_client.download_blob(
+                offset=position,
+                length=count,
+                etag=etag,
+                match_condition=MatchConditions.IfNotModified
+            ).readall()
+        metrics.STORAGE_BYTES_DOWNLOADED.inc(len(chunk))
+        if not chunk:
+            break
+        yield chunk
+        position += len(chunk)
+
+
+def limit_range(plan: ResponsePlan, max_bytes: int, size: int) -> ResponsePlan:
+    """Shorten a 206 plan to at most ``max_bytes``, for transports that buffer responses.
+
+    Clients reading a range (media and PDF viewers) continue from the end
+    given in ``Content-Range``.
+    """
+    if plan.status != 206 or plan.length <= max_bytes:
+        return plan
+    headers = dict(plan.headers)
+    end = plan.offset + max_bytes - 1
+    headers['Content-Range'] = f'bytes {plan.offset}-{end}/{size}'
+    headers['Content-Length'] = str(max_bytes)
+    return plan._replace(headers=headers, length=max_bytes)
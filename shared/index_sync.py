@@ -0,0 +1,170 @@
+"""
+Background reconciliation of the local search, similarity and duplicate indexes
+
+These indexes are per-instance caches of blob storage that are kept
+current as text is written and reconciled against one container listing
+now and then to pick up writes made elsewhere. That listing (and, on a
+fresh instance, downloading the whole corpus) must not run inside a query,
+so ``BackgroundSync`` runs the index's ``sync()`` on a daemon thread every
+``interval`` seconds. Until the first sync of the process has completed the
+index is incomplete, and queries raise ``IndexWarming`` instead of
+answering with partial results; handlers turn it into 503 with
+``Retry-After``.
+
+Updates for text written by this instance (chunks, index entries, the
+duplicate signature) go through ``index_updates`` instead of running in
+the request that stored the text: one daemon thread applies them in
+order. When more than INDEX_QUEUE_SIZE are waiting, new ones are dropped;
+the next sync, or for chunks the next export, catches up with that text.
+
+The index files are written by one process at a time. ``claim_path`` gives
+each process the first of ``path``, ``<path>-1``, ... whose lock no other
+live process holds, so several Functions worker processes or gunicorn
+workers on one host never append to the same files.
+"""
+
+import os
+import queue
+import threading
+import time
+from itertools import count
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, one process per index path is assumed
+    fcntl = None
+
+# Seconds before retrying a failed sync, and the Retry-After while warming
+SYNC_RETRY_SECONDS = 5
+INDEX_QUEUE_SIZE = int(os.getenv('INDEX_QUEUE_SIZE', '1000') or 1000)
+
+
+_claims_lock = threading.Lock()
+# Claimed path and the open lock file, by requested path, for this process
+_claims: Dict[str, Tuple[int, str, Any]] = {}
+
+
+def _slot_path(path: str, slot: int) -> str:
+    """``path`` for slot 0, ``<root>-<slot><ext>`` for the others."""
+    if slot == 0:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}-{slot}{ext}"
+
+
+def claim_path(path: str) -> str:
+    """The slot of ``path`` this process owns, claimed on first use.
+
+    The exclusive lock on ``<slot path>.lock`` is held for the life of the
+    process and released by the OS when it exits, so a restarted or
+    recycled process takes over the files, and the cache, of the one it
+    replaces.
+    """
+    if fcntl is None:
+        return path
+    with _claims_lock:
+        claim = _claims.get(path)
+        # A forked child holds no lock of its own, so it claims again
+        if claim is not None and claim[0] == os.getpid():
+            return claim[1]
+        for slot in count():
+            claimed = _slot_path(path, slot)
+            os.makedirs(os.path.dirname(os.path.abspath(claimed)), exist_ok=True)
+            lock_file = open(claimed + '.lock', 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                continue
+            _claims[path] = (os.getpid(), claimed, lock_file)
+            return claimed
+
+
+class IndexWarming(Exception):
+    """Raised while an index has not completed its first sync; ``retry_after`` is in seconds."""
+
+    def __init__(self, name: str, retry_after: int = SYNC_RETRY_SECONDS):
+        super().__init__(f"The {name} index is still being built")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class BackgroundSync:
+    """Runs ``index.sync(container_client, force=True, **options)`` on a daemon thread every ``interval`` seconds."""
+
+    def __init__(self, name: str, interval: float):
+        self.name = name
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+
+    def start(self, index, container_client, **options) -> None:
+        """Start the thread unless it is already running in this process."""
+        with self._lock:
+            # Threads don't survive fork(), so a forked worker starts its own
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, args=(index, container_client, options),
+                                            name=f"{self.name}-sync", daemon=True)
+            self._thread.start()
+
+    def _run(self, index, container_client, options: Dict[str, Any]) -> None:
+        while True:
+            try:
+                index.sync(container_client, force=True, **options)
+                delay = self.interval
+            except Exception as error:
+                print(f"{self.name.capitalize()} index sync failed: {error}")
+                delay = SYNC_RETRY_SECONDS
+            time.sleep(delay)
+
+
+class UpdateQueue:
+    """Runs submitted calls in submission order on one daemon thread."""
+
+    def __init__(self, name: str, max_size: int = INDEX_QUEUE_SIZE):
+        self.name = name
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._queue: Optional[queue.Queue] = None
+        self._pid: Optional[int] = None
+
+    def submit(self, function: Callable[..., Any], *args: Any) -> bool:
+        """Queue ``function(*args)``; False when the queue is full and the call was dropped."""
+        try:
+            self._running_queue().put_nowait((function, args))
+            return True
+        except queue.Full:
+            print(f"{self.name.capitalize()} queue is full; leaving the update to the next sync")
+            return False
+
+    def join(self) -> None:
+        """Wait until every submitted call has run."""
+        self._running_queue().join()
+
+    def _running_queue(self) -> queue.Queue:
+        with self._lock:
+            # Threads don't survive fork(), so a forked worker starts its own
+            if self._queue is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue(self.max_size)
+                threading.Thread(target=self._run, args=(self._queue,), name=f"{self.name}-worker",
+                                 daemon=True).start()
+            return self._queue
+
+    def _run(self, calls: queue.Queue) -> None:
+        while True:
+            function, args = calls.get()
+            try:
+                function(*args)
+            except Exception as error:
+                print(f"{self.name.capitalize()} failed: {error}")
+            finally:
+                calls.task_done()
+
+
+# Derived-index work for text stored by this process
+index_updates = UpdateQueue('index update')
@@ -0,0 +1,160 @@
+"""
+Single-pass listings of documents and their companion blobs
+
+Documents live at the container root (or under user folders); derived
+blobs such as extracted text live under internal prefixes, named
+``<prefix><document><suffix>``. ``iter_documents`` lists documents in name
+order without descending into internal prefixes, and ``merge_companions``
+joins that stream with the sorted listing of one companion prefix in a
+single streaming pass, so no per-document lookups are needed.
+``iter_file_entries`` builds the file listing served by both apps from
+those two listings alone, and ``stream_json_array`` / ``stream_json_lines``
+serialize it (or any other iterable) a bounded buffer at a time.
+"""
+
+import json
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+
+from azure.storage.blob import BlobPrefix
+
+from shared.document_stats import stats_from_metadata
+from shared.search_index import TEXT_PREFIX, TEXT_SUFFIX
+
+# Streamed responses are written in pieces of about this size
+STREAM_FLUSH_BYTES = 64 * 1024
+
+
+def iter_documents(container_client, skip_prefixes: Tuple[str, ...], name_starts_with: str = '',
+                   include: Optional[list] = None) -> Iterator[Any]:
+    """Blobs outside ``skip_prefixes``, in name order.
+
+    Walks the container with a ``/`` delimiter so that skipped prefixes are
+    never listed. The service returns a page's folder prefixes before its
+    blobs; every page covers a contiguous range of names, so sorting each
+    page and expanding folders in place keeps the overall name order.
+    """
+    pages = container_client.walk_blobs(
+        name_starts_with=name_starts_with or None,
+        include=include,
+        delimiter='/'
+    ).by_page()
+    for page in pages:
+        for item in sorted(page, key=lambda item: item.name):
+            if isinstance(item, BlobPrefix):
+                if not item.name.startswith(skip_prefixes):
+                    yield from iter_documents(container_client, skip_prefixes, item.name, include)
+            else:
+                yield item
+
+
+def merge_companions(documents: Iterable[Any], companions: Iterable[Any], prefix: str,
+                     suffix: str) -> Iterator[Tuple[str, Optional[Any], Optional[Any]]]:
+    """Full outer join of documents with companions named ``prefix + document + suffix``.
+
+    Both inputs must be sorted by name, as blob listings are. Yields
+    ``(document_name, document, companion)`` with ``None`` for the missing
+    side: every document once, in order, and every companion without a
+    document (an orphan) as soon as no later document can match it.
+
+    Stripping ``prefix``/``suffix`` does not preserve order ("a b.txt" sorts
+    before "a.txt" although "a" sorts before "a b"), so companions are read
+    up to the name the current document's companion would have and kept in
+    a small pending map until matched or known to be orphaned.
+    """
+    companions = iter(companions)
+    lookahead = next(companions, None)
+    pending = {}
+
+    def source_of(companion: Any) -> Optional[str]:
+        name = companion.name
+        if name.startswith(prefix) and name.endswith(suffix) and len(name) > len(prefix) + len(suffix):
+            return name[len(prefix):-len(suffix)]
+        return None
+
+    for document in documents:
+        name = document.name
+        limit = prefix + name + suffix
+        while lookahead is not None and lookahead.name <= limit:
+            source = source_of(lookahead)
+            if source is not None:
+                pending[source] = lookahead
+            lookahead = next(companions, None)
+
+        companion = pending.pop(name, None)
+        # Documents arrive in order, so pending sources before this one never match
+        for source in [source for source in pending if source < name]:
+            yield source, None, pending.pop(source)
+        yield name, document, companion
+
+    for source in sorted(pending):
+        yield source, None, pending[source]
+    while lookahead is not None:
+        source = source_of(lookahead)
+        if source is not None:
+            yield source, None, lookahead
+        lookahead = next(companions, None)
+
+
+def file_entry(blob: Any, text_blob: Optional[Any]) -> Dict[str, Any]:
+    """Listing entry of a document listed with its metadata, and of its extracted text blob."""
+    metadata = blob.metadata or {}
+    created = blob.creation_time.isoformat() if blob.creation_time else None
+    return {
+        'id': blob.name,
+        'name': blob.name,
+        'originalName': metadata.get('originalName', blob.name),
+        'size': blob.size,
+        'type': blob.content_settings.content_type if blob.content_settings else 'application/octet-stream',
+        'uploadedAt': metadata.get('uploadedAt', created),
+        'lastModified': blob.last_modified.isoformat() if blob.last_modified else None,
+        'hasExtractedText': text_blob is not None,
+        'extractedAt': text_blob.last_modified.isoformat() if text_blob is not None and text_blob.last_modified else None,
+        **stats_from_metadata(metadata)
+    }
+
+
+def iter_file_entries(container_client, skip_prefixes: Tuple[str, ...]) -> Iterator[Dict[str, Any]]:
+    """Listing entries of every document, in name order, one listing page at a time.
+
+    Documents are listed with their metadata and joined with one listing of
+    the extracted text, so the whole scan makes no per-document requests
+    and holds no more than a page of each listing in memory.
+    """
+    documents = iter_documents(container_client, skip_prefixes, include=['metadata'])
+    texts = container_client.list_blobs(name_starts_with=TEXT_PREFIX)
+    for name, blob, text_blob in merge_companions(documents, texts, TEXT_PREFIX, TEXT_SUFFIX):
+        if blob is not None:
+            # Otherwise extracted text whose document is gone
+            yield file_entry(blob, text_blob)
+
+
+def stream_json_array(items: Iterable[Any], dumps: Callable[[Any], str] = json.dumps,
+                      flush_bytes: int = STREAM_FLUSH_BYTES) -> Iterator[bytes]:
+    """``items`` as one JSON array, in UTF-8 pieces of about ``flush_bytes``."""
+    buffer = ['[']
+    size = 1
+    for index, item in enumerate(items):
+        text = dumps(item)
+        buffer.append(text if index == 0 else ',' + text)
+        size += len(text) + 1
+        if size >= flush_bytes:
+            yield ''.join(buffer).encode('utf-8')
+            buffer, size = [], 0
+    buffer.append(']')
+    yield ''.join(buffer).encode('utf-8')
+
+
+def stream_json_lines(items: Iterable[Any], dumps: Callable[[Any], str] = json.dumps,
+                      flush_bytes: int = STREAM_FLUSH_BYTES) -> Iterator[bytes]:
+    """``items`` as JSON lines (one document per line), in pieces of about ``flush_bytes``."""
+    buffer = []
+    size = 0
+    for item in items:
+        text = dumps(item) + '\n'
+        buffer.append(text)
+        size += len(text)
+        if size >= flush_bytes:
+            yield ''.join(buffer).encode('utf-8')
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
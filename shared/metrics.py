@@ -0,0 +1,278 @@
+"""
+In-process metrics registry with Prometheus text exposition
+
+Used by both the Azure Functions and the Flask backend. Metrics are plain
+Python objects guarded by one lock each, so recording a value costs a dict
+lookup and an addition. ``render()`` produces the text served at
+``/api/metrics``.
+"""
+
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from shared.timing import get_histograms
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RATE_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self.samples())
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    """Monotonically increasing value, optionally split by labels."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}'
+                for key, value in items]
+
+
+class Gauge(Counter):
+    """Value that can go up and down."""
+
+    kind = 'gauge'
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_in_progress(self, **labels: str) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram, optionally split by labels."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DURATION_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        # label values -> [bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._values.items())
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.label_names, key, le)} {int(cumulative)}')
+            labels = _format_labels(self.label_names, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(series[-1])}')
+            lines.append(f'{self.name}_count{labels} {int(cumulative)}')
+        return lines
+
+
+class Registry:
+    """Holds metrics and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], str]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'Metric already registered: {metric.name}')
+            self._metrics[metric.name] = metric
+        return metric
+
+    def register_collector(self, collector: Callable[[], str]) -> None:
+        """Add a callable producing extra exposition text at render time."""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = [self._metrics[name] for name in sorted(self._metrics)]
+            collectors = list(self._collectors)
+        blocks = [metric.render() for metric in metrics]
+        blocks.extend(text for text in (collector() for collector in collectors) if text)
+        return '\n'.join(blocks) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.register(Counter(
+    'http_requests_total', 'HTTP requests handled, by handler and status code.', ('handler', 'status')))
+REQUEST_DURATION = REGISTRY.register(Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by handler.', ('handler',)))
+EXTRACTION_CACHE = REGISTRY.register(Counter(
+    'extraction_cache_requests_total', 'Extracted-text cache lookups, by result (hit or miss).', ('result',)))
+EXTRACTIONS_IN_FLIGHT = REGISTRY.register(Gauge(
+    'extractions_in_flight', 'Text extractions currently running in this process.'))
+EXTRACTION_DURATION = REGISTRY.register(Histogram(
+    'extraction_duration_seconds', 'Time spent parsing documents, by format.', ('format',)))
+EXTRACTION_PAGES = REGISTRY.register(Counter(
+    'extraction_pages_total', 'Pages extracted, by format.', ('format',)))
+EXTRACTION_PAGES_PER_SECOND = REGISTRY.register(Histogram(
+    'extraction_pages_per_second', 'Extraction speed of individual documents, by format.', ('format',),
+    buckets=RATE_BUCKETS))
+UPLOAD_EXTRACTIONS = REGISTRY.register(Counter(
+    'upload_extractions_total', 'Extract-on-upload outcomes (extracted, queued, deferred, failed, unsupported).',
+    ('result',)))
+UPLOAD_EXTRACTION_PENDING_BYTES = REGISTRY.register(Gauge(
+    'upload_extraction_pending_bytes', 'Upload bytes held in memory awaiting background extraction.'))
+EXPORT_ARCHIVE_FILES = REGISTRY.register(Counter(
+    'export_archive_files_total', 'Files written into exported ZIP archives.'))
+EXTRACTION_ADMISSIONS = REGISTRY.register(Counter(
+    'extraction_admissions_total', 'Extraction admission decisions (admitted, rejected, displaced, timeout).',
+    ('result',)))
+EXTRACTION_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    'extraction_queue_depth', 'Extractions waiting for a slot in this process.'))
+EXTRACTION_QUEUE_WAIT = REGISTRY.register(Histogram(
+    'extraction_queue_wait_seconds', 'Time admitted extractions waited for a slot.'))
+TEXT_CACHE_GC_DELETED = REGISTRY.register(Counter(
+    'text_cache_gc_deleted_total', 'Orphaned text cache blobs deleted, by kind (text, chunks, versions, exports).', ('kind',)))
+TEXT_CACHE_GC_BYTES = REGISTRY.register(Counter(
+    'text_cache_gc_deleted_bytes_total', 'Bytes reclaimed by deleting orphaned text cache blobs.'))
+STORAGE_BYTES_DOWNLOADED = REGISTRY.register(Counter(
+    'storage_downloaded_bytes_total', 'Bytes downloaded from blob storage.'))
+STORAGE_BYTES_UPLOADED = REGISTRY.register(Counter(
+    'storage_uploaded_bytes_total', 'Bytes uploaded to blob storage.'))
+
+
+def _render_span_histograms() -> str:
+    """Expose the request timing histograms (shared.timing) when timing is enabled."""
+    snapshots = get_histograms()
+    if not snapshots:
+        return ''
+    name = 'span_duration_milliseconds'
+    lines = [f'# HELP {name} Duration of timed request phases (TIMING_ENABLED).', f'# TYPE {name} histogram']
+    for span_name, snapshot in snapshots.items():
+        cumulative = 0
+        for bound, count in snapshot['buckets'].items():
+            cumulative += count
+            lines.append(f'{name}_bucket{{span="{_escape(span_name)}",le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{span="{_escape(span_name)}"}} {snapshot["totalMs"]}')
+        lines.append(f'{name}_count{{span="{_escape(span_name)}"}} {snapshot["count"]}')
+    return '\n'.join(lines)
+
+
+REGISTRY.register_collector(_render_span_histograms)
+
+
+def record_extraction(file_format: str, seconds: float, pages: Optional[int]) -> None:
+    """Record one finished extraction."""
+    EXTRACTION_DURATION.observe(seconds, format=file_format)
+    if pages:
+        EXTRACTION_PAGES.inc(pages, format=file_format)
+        if seconds > 0:
+            EXTRACTION_PAGES_PER_SECOND.observe(pages / seconds, format=file_format)
+
+
+def instrumented(handler_name: str) -> Callable:
+    """Decorator counting requests and latency of an Azure Functions handler."""
+    def decorator(handler: Callable) -> Callable:
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            status = 500
+            try:
+                response = handler(*args, **kwargs)
+                status = getattr(response, 'status_code', 200)
+                return response
+            finally:
+                REQUEST_DURATION.observe(time.perf_counter() - started, handler=handler_name)
+                REQUESTS.inc(handler=handler_name, status=str(status))
+        return wrapper
+    return decorator
+
+
+def render() -> str:
+    """Render every registered metric in the Prometheus text format."""
+    return REGISTRY.render()
@@ -0,0 +1,397 @@
+"""
+Near-duplicate detection with MinHash and locality-sensitive hashing
+
+At extraction time the text of a document is reduced to a MinHash
+signature: for each of ``NUM_PERMUTATIONS`` hash functions, the minimum
+hash over the document's word shingles. The fraction of equal positions in
+two signatures estimates the Jaccard similarity of their shingle sets, so a
+rescan or re-export of the same contract scores close to 1 while unrelated
+documents score close to 0.
+
+Signatures are stored base64-encoded in the source blob's metadata. The LSH
+index splits every signature into ``BANDS`` bands of ``ROWS`` values and
+buckets documents by band; only documents sharing a bucket are compared, so
+a lookup costs one indexed query per band instead of a scan of the
+container. With 8 bands of 16 rows, pairs above roughly 0.88 similarity
+almost always share a bucket and pairs below 0.5 almost never do.
+
+The buckets are kept in a local SQLite database (``MINHASH_INDEX_PATH``),
+updated by ``remember()`` whenever a signature is stored and reconciled
+with the container's metadata by a background thread every
+``MINHASH_SYNC_INTERVAL`` seconds (``shared.index_sync``), so queries never
+list the container. The database survives restarts; a new one answers
+``IndexWarming`` until its first sync has completed.
+"""
+
+import base64
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from itertools import groupby
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+import numpy as np
+from azure.core.exceptions import ResourceNotFoundError
+
+from shared.index_sync import BackgroundSync, IndexWarming, claim_path
+from shared.listing import iter_documents
+from shared.timing import span
+
+MINHASH_INDEX_PATH = os.getenv('MINHASH_INDEX_PATH') or os.path.join(tempfile.gettempdir(), 'langazure-minhash.sqlite3')
+# Seconds between consistency checks against blob storage
+MINHASH_SYNC_INTERVAL = float(os.getenv('MINHASH_SYNC_INTERVAL', '60') or 60)
+
+NUM_PERMUTATIONS = 128
+BANDS = 8
+ROWS = NUM_PERMUTATIONS // BANDS
+SHINGLE_WORDS = 3
+SIGNATURE_VERSION = '1'
+METADATA_KEY = 'minhash'
+
+DUPLICATE_THRESHOLD = 0.8
+# Shingles hashed per block, bounding the temporary (block x permutations) matrix
+_BLOCK = 8192
+
+_TOKEN = re.compile(r'\w+')
+_MAX_HASH = np.uint32(0xFFFFFFFF)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS signatures (
+    name TEXT PRIMARY KEY,
+    signature BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS buckets (
+    band INTEGER NOT NULL,
+    bucket BLOB NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (band, bucket, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Multiply-shift hashing: h(x) = ((a * x + b) mod 2^64) >> 32 with odd a
+_rng = np.random.default_rng(0x6C616E67)
+_A = _rng.integers(1, 2 ** 63, size=NUM_PERMUTATIONS, dtype=np.uint64) | np.uint64(1)
+_B = _rng.integers(0, 2 ** 63, size=NUM_PERMUTATIONS, dtype=np.uint64)
+
+
+def shingle_hashes(text: str, size: int = SHINGLE_WORDS) -> np.ndarray:
+    """Distinct 32-bit hashes of the word ``size``-grams of ``text``."""
+    words = _TOKEN.findall((text or '').lower())
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    tokens = np.fromiter((zlib.crc32(word.encode('utf-8')) for word in words), dtype=np.uint64, count=len(words))
+    if len(tokens) < size:
+        size = len(tokens)
+    combined = np.zeros(len(tokens) - size + 1, dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for offset in range(size):
+            combined = combined * np.uint64(1000003) + tokens[offset:len(tokens) - size + 1 + offset]
+    return np.unique(combined & np.uint64(0xFFFFFFFF))
+
+
+def signature(text: str) -> Optional[np.ndarray]:
+    """MinHash signature (``NUM_PERMUTATIONS`` uint32 values), or None for text without words."""
+    shingles = shingle_hashes(text)
+    if not len(shingles):
+        return None
+    minimums = np.full(NUM_PERMUTATIONS, _MAX_HASH, dtype=np.uint32)
+    with span('minhash.signature'), np.errstate(over='ignore'):
+        for begin in range(0, len(shingles), _BLOCK):
+            block = shingles[begin:begin + _BLOCK, None]
+            hashes = ((block * _A + _B) >> np.uint64(32)).astype(np.uint32)
+            np.minimum(minimums, hashes.min(axis=0), out=minimums)
+    return minimums
+
+
+def encode(values: np.ndarray) -> str:
+    """Compact ASCII form for blob metadata."""
+    return f"{SIGNATURE_VERSION}:" + base64.b64encode(values.astype('<u4').tobytes()).decode('ascii')
+
+
+def decode(value: Optional[str]) -> Optional[np.ndarray]:
+    """Inverse of ``encode``; None for missing, malformed or outdated values."""
+    if not value:
+        return None
+    version, _, payload = value.partition(':')
+    if version != SIGNATURE_VERSION:
+        return None
+    try:
+        values = np.frombuffer(base64.b64decode(payload), dtype='<u4')
+    except ValueError:
+        return None
+    return values if len(values) == NUM_PERMUTATIONS else None
+
+
+def similarity(first: np.ndarray, second: np.ndarray) -> float:
+    """Estimated Jaccard similarity of two signatures."""
+    return float(np.count_nonzero(first == second)) / NUM_PERMUTATIONS
+
+
+def band_keys(values: np.ndarray) -> List[tuple]:
+    """(band, bucket) keys of a signature: the raw bytes of each band of ``ROWS`` values."""
+    data = values.astype('<u4').tobytes()
+    width = 4 * ROWS
+    return [(band, data[band * width:(band + 1) * width]) for band in range(BANDS)]
+
+
+def signature_metadata(text: str) -> Dict[str, str]:
+    """Metadata update storing the signature of ``text`` (empty when it has no words)."""
+    values = signature(text)
+    return {METADATA_KEY: encode(values)} if values is not None else {}
+
+
+class LSHIndex:
+    """Banded LSH buckets over MinHash signatures, stored in SQLite."""
+
+    def __init__(self, path: str = MINHASH_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._last_sync = 0.0
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # WAL lets several worker processes on one instance share the file
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(_SCHEMA)
+        self._synced = self._connection.execute(
+            "SELECT 1 FROM state WHERE key = 'synced_at'").fetchone() is not None
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            connection = self._connection
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                yield connection
+                connection.execute('COMMIT')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+
+    @staticmethod
+    def _remove(connection: sqlite3.Connection, name: str) -> bool:
+        row = connection.execute('SELECT signature FROM signatures WHERE name = ?', (name,)).fetchone()
+        if row is None:
+            return False
+        values = np.frombuffer(row[0], dtype='<u4')
+        connection.executemany('DELETE FROM buckets WHERE band = ? AND bucket = ? AND name = ?',
+                               [(band, bucket, name) for band, bucket in band_keys(values)])
+        connection.execute('DELETE FROM signatures WHERE name = ?', (name,))
+        return True
+
+    def add(self, name: str, values: np.ndarray) -> None:
+        """Add or replace the signature of one document."""
+        with self._transaction() as connection:
+            self._remove(connection, name)
+            connection.execute('INSERT INTO signatures (name, signature) VALUES (?, ?)',
+                               (name, values.astype('<u4').tobytes()))
+            connection.executemany('INSERT OR IGNORE INTO buckets (band, bucket, name) VALUES (?, ?, ?)',
+                                   [(band, bucket, name) for band, bucket in band_keys(values)])
+
+    def remove_document(self, name: str) -> bool:
+        """Drop a document from the index; returns False if it was not indexed."""
+        with self._transaction() as connection:
+            return self._remove(connection, name)
+
+    def signature_of(self, name: str) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self._connection.execute('SELECT signature FROM signatures WHERE name = ?', (name,)).fetchone()
+        return np.frombuffer(row[0], dtype='<u4') if row else None
+
+    def _signatures(self, names: List[str]) -> Dict[str, np.ndarray]:
+        signatures = {}
+        with self._lock:
+            # Stay well below SQLite's limit on bound parameters
+            for begin in range(0, len(names), 500):
+                batch = names[begin:begin + 500]
+                rows = self._connection.execute(
+                    f"SELECT name, signature FROM signatures WHERE name IN ({','.join('?' * len(batch))})", batch)
+                signatures.update((name, np.frombuffer(data, dtype='<u4')) for name, data in rows)
+        return signatures
+
+    @property
+    def document_count(self) -> int:
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM signatures').fetchone()[0]
+
+    def candidates(self, values: np.ndarray) -> Set[str]:
+        """Documents sharing at least one band bucket with ``values``."""
+        found: Set[str] = set()
+        with self._lock:
+            for band, bucket in band_keys(values):
+                found.update(name for (name,) in self._connection.execute(
+                    'SELECT name FROM buckets WHERE band = ? AND bucket = ?', (band, bucket)))
+        return found
+
+    def query(self, name: str, threshold: float = DUPLICATE_THRESHOLD) -> Optional[List[Dict[str, Any]]]:
+        """Near-duplicates of an indexed document, most similar first; None if not indexed."""
+        values = self.signature_of(name)
+        if values is None:
+            return None
+        matches = []
+        for other, other_values in self._signatures(sorted(self.candidates(values) - {name})).items():
+            score = similarity(values, other_values)
+            if score >= threshold:
+                matches.append({'name': other, 'similarity': round(score, 4)})
+        return sorted(matches, key=lambda match: (-match['similarity'], match['name']))
+
+    def clusters(self, threshold: float = DUPLICATE_THRESHOLD) -> List[List[str]]:
+        """Groups of two or more documents linked by pairwise similarity >= threshold."""
+        with self._lock:
+            # Only documents sharing a bucket with another one can be in a cluster
+            rows = self._connection.execute(
+                """
+                SELECT band, bucket, name FROM buckets
+                WHERE (band, bucket) IN (SELECT band, bucket FROM buckets GROUP BY band, bucket HAVING COUNT(*) > 1)
+                ORDER BY band, bucket, name
+                """
+            ).fetchall()
+        shared_buckets = [[name for _, _, name in members]
+                          for _, members in groupby(rows, key=lambda row: (row[0], row[1]))]
+        signatures = self._signatures(sorted({name for members in shared_buckets for name in members}))
+        parent = {name: name for name in signatures}
+
+        def find(name: str) -> str:
+            while parent[name] != name:
+                parent[name] = parent[parent[name]]
+                name = parent[name]
+            return name
+
+        for members in shared_buckets:
+            members = [name for name in members if name in signatures]
+            for i, first in enumerate(members):
+                for second in members[i + 1:]:
+                    if find(first) != find(second) and \
+                            similarity(signatures[first], signatures[second]) >= threshold:
+                        parent[find(second)] = find(first)
+
+        groups: Dict[str, List[str]] = {}
+        for name in signatures:
+            groups.setdefault(find(name), []).append(name)
+        return sorted((sorted(group) for group in groups.values() if len(group) > 1), key=lambda group: group[0])
+
+    @property
+    def synced(self) -> bool:
+        """True once this database has completed a sync, in this or an earlier process."""
+        return self._synced
+
+    def sync(self, container_client, force: bool = False, skip_prefixes: tuple = ()) -> Dict[str, int]:
+        """Reconcile the buckets with the signatures in document metadata.
+
+        Runs at most once per ``MINHASH_SYNC_INTERVAL`` unless forced, one
+        sync at a time. Documents under ``skip_prefixes`` are not listed.
+        """
+        with self._sync_lock:
+            if not force and self._last_sync and time.monotonic() - self._last_sync < MINHASH_SYNC_INTERVAL:
+                return {'indexed': 0, 'removed': 0}
+            result = self._sync(container_client, skip_prefixes)
+            with self._transaction() as connection:
+                connection.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('synced_at', ?)",
+                                   (str(time.time()),))
+            self._last_sync = time.monotonic()
+            self._synced = True
+        return result
+
+    def _sync(self, container_client, skip_prefixes: tuple) -> Dict[str, int]:
+        with self._lock:
+            indexed = dict(self._connection.execute('SELECT name, signature FROM signatures').fetchall())
+        seen = set()
+        added = removed = 0
+        with span('minhash.sync'):
+            for blob in iter_documents(container_client, skip_prefixes, include=['metadata']):
+                values = decode((blob.metadata or {}).get(METADATA_KEY))
+                if values is None:
+                    continue
+                seen.add(blob.name)
+                if indexed.get(blob.name) == values.astype('<u4').tobytes():
+                    continue
+                self.add(blob.name, values)
+                added += 1
+            for name in set(indexed) - seen:
+                self.remove_document(name)
+                removed += 1
+
+        if added or removed:
+            print(f"Duplicate index synced: {added} indexed, {removed} removed")
+        return {'indexed': added, 'removed': removed}
+
+
+_index: Optional[LSHIndex] = None
+_index_lock = threading.Lock()
+_background_sync = BackgroundSync('duplicate', MINHASH_SYNC_INTERVAL)
+
+
+def get_index() -> LSHIndex:
+    """The process-wide index, opened on first use at the path this process claims (``claim_path``)."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = LSHIndex(claim_path(MINHASH_INDEX_PATH))
+    return _index
+
+
+def start_sync(container_client, internal_prefixes: tuple = ()) -> LSHIndex:
+    """The process-wide index, kept in sync with ``container_client`` in the background."""
+    index = get_index()
+    _background_sync.start(index, container_client, skip_prefixes=internal_prefixes)
+    return index
+
+
+def remember(name: str, metadata: Dict[str, str]) -> None:
+    """Add a freshly computed signature to the index."""
+    values = decode(metadata.get(METADATA_KEY))
+    if values is not None:
+        get_index().add(name, values)
+
+
+def _read_signature(container_client, blob_name: str) -> Optional[np.ndarray]:
+    try:
+        with span('storage.get_blob_properties'):
+            metadata = container_client.get_blob_client(blob_name).get_blob_properties().metadata
+    except ResourceNotFoundError:
+        return None
+    return decode((metadata or {}).get(METADATA_KEY))
+
+
+def find_duplicates(container_client, internal_prefixes: tuple, blob_name: Optional[str] = None,
+                    threshold: float = DUPLICATE_THRESHOLD) -> Optional[Dict[str, Any]]:
+    """Duplicates endpoint body shared by the Azure Functions and Flask apps.
+
+    With ``blob_name`` returns that document's near-duplicates (None when it
+    has no signature yet), otherwise every cluster in the container. Raises
+    IndexWarming until the index has completed its first sync.
+    """
+    started = time.perf_counter()
+    index = start_sync(container_client, internal_prefixes)
+    if not index.synced:
+        raise IndexWarming('duplicate')
+    if blob_name:
+        duplicates = index.query(blob_name, threshold)
+        if duplicates is None and not blob_name.startswith(internal_prefixes):
+            # Extracted on another instance since the last sync
+            values = _read_signature(container_client, blob_name)
+            if values is not None:
+                index.add(blob_name, values)
+                duplicates = index.query(blob_name, threshold)
+        if duplicates is None:
+            return None
+        result: Dict[str, Any] = {'name': blob_name, 'duplicates': duplicates}
+    else:
+        result = {'clusters': index.clusters(threshold), 'documents': index.document_count}
+    result['threshold'] = threshold
+    result['tookMs'] = round((time.perf_counter() - started) * 1000.0, 2)
+    return result
@@ -0,0 +1,154 @@
+"""
+On-demand profiling of production requests
+
+A handler wrapped with ``profiled()`` runs under cProfile when either
+
+- the request carries a valid ``X-Profile-Request`` header, signed with
+  ``PROFILE_SIGNING_KEY`` (see ``sign_profile_request``), or
+- it is picked by random sampling at ``PROFILE_SAMPLE_RATE`` (0.0 - 1.0).
+
+The resulting profile is handed to a ``store`` callable together with the
+details the handler attached through ``annotate()`` (document hash, page
+count, ...). Requests that are not profiled pay for one header lookup and
+one random number.
+
+Generate a header value for a document:
+    PROFILE_SIGNING_KEY=... python -m shared.profiling report.pdf --ttl 600
+"""
+
+import argparse
+import contextvars
+import cProfile
+import functools
+import hashlib
+import hmac
+import io
+import marshal
+import os
+import pstats
+import random
+import time
+from typing import Any, Callable, Dict, Optional
+
+PROFILE_HEADER = 'X-Profile-Request'
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', '0') or 0)
+PROFILE_SIGNING_KEY = os.getenv('PROFILE_SIGNING_KEY', '')
+SUMMARY_LINES = 40
+
+_annotations: contextvars.ContextVar = contextvars.ContextVar('profile_annotations', default=None)
+
+
+def sign_profile_request(subject: str, expires_at: int, key: str = PROFILE_SIGNING_KEY) -> str:
+    """Build an ``X-Profile-Request`` header value valid until ``expires_at`` (Unix time)."""
+    signature = hmac.new(key.encode('utf-8'), f'{subject}:{expires_at}'.encode('utf-8'), hashlib.sha256)
+    return f'{expires_at}.{signature.hexdigest()}'
+
+
+def verify_profile_request(value: str, subject: str, key: str = PROFILE_SIGNING_KEY) -> bool:
+    """Check an ``X-Profile-Request`` header value for ``subject``."""
+    if not key or not value:
+        return False
+    expires_at, _, signature = value.partition('.')
+    try:
+        if int(expires_at) < time.time():
+            return False
+    except ValueError:
+        return False
+    expected = sign_profile_request(subject, int(expires_at), key).partition('.')[2]
+    return hmac.compare_digest(expected, signature)
+
+
+def profile_trigger(headers: Any, subject: str) -> Optional[str]:
+    """Return why a request should be profiled ('header' or 'sampled'), or None."""
+    header = headers.get(PROFILE_HEADER) if headers else None
+    if header and verify_profile_request(header, subject):
+        return 'header'
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return 'sampled'
+    return None
+
+
+def is_profiling() -> bool:
+    """True while the current request runs under the profiler."""
+    return _annotations.get() is not None
+
+
+def is_profile_requested() -> bool:
+    """True when the current request asked for profiling with a signed header.
+
+    Handlers use this to bypass caches, so the expensive path being
+    investigated actually runs under the profiler.
+    """
+    annotations = _annotations.get()
+    return annotations is not None and annotations.get('trigger') == 'header'
+
+
+def annotate(**values: Any) -> None:
+    """Attach details to the current profile; ignored when not profiling."""
+    annotations = _annotations.get()
+    if annotations is not None:
+        annotations.update({key: value for key, value in values.items() if value is not None})
+
+
+def summarize(profiler: cProfile.Profile, limit: int = SUMMARY_LINES) -> str:
+    """Human-readable top functions by cumulative time."""
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(limit)
+    return stream.getvalue()
+
+
+def profiled(handler_name: str, store: Callable[[str, str, bytes, str, Dict[str, Any]], Optional[str]]) -> Callable:
+    """Decorator profiling an Azure Functions handler on demand.
+
+    ``store(handler_name, subject, profile_data, summary, annotations)``
+    receives the marshalled ``pstats`` data (loadable with
+    ``pstats.Stats(path)``) and returns where the profile was saved, which
+    is echoed back in an ``X-Profile-Id`` response header.
+    """
+    def decorator(handler: Callable) -> Callable:
+        @functools.wraps(handler)
+        def wrapper(req, *args, **kwargs):
+            subject = (req.route_params or {}).get('blob_name', '')
+            trigger = profile_trigger(req.headers, subject)
+            if trigger is None:
+                return handler(req, *args, **kwargs)
+
+            annotations: Dict[str, Any] = {'trigger': trigger}
+            token = _annotations.set(annotations)
+            profiler = cProfile.Profile()
+            started = time.perf_counter()
+            try:
+                profiler.enable()
+                try:
+                    response = handler(req, *args, **kwargs)
+                finally:
+                    profiler.disable()
+            finally:
+                _annotations.reset(token)
+
+            annotations['durationMs'] = round((time.perf_counter() - started) * 1000.0, 1)
+            try:
+                profiler.create_stats()
+                profile_id = store(handler_name, subject, marshal.dumps(profiler.stats),
+                                   summarize(profiler), annotations)
+                if profile_id and response is not None:
+                    response.headers['X-Profile-Id'] = profile_id
+            except Exception as error:
+                print(f"Failed to store profile for {handler_name} {subject}: {error}")
+            return response
+        return wrapper
+    return decorator
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Generate a signed X-Profile-Request header value.')
+    parser.add_argument('subject', help='Blob name of the document to profile')
+    parser.add_argument('--ttl', type=int, default=600, help='Seconds the header stays valid')
+    args = parser.parse_args()
+    if not PROFILE_SIGNING_KEY:
+        parser.error('PROFILE_SIGNING_KEY is not set')
+    print(f'{PROFILE_HEADER}: {sign_profile_request(args.subject, int(time.time()) + args.ttl)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+JSON responses for the Azure Functions handlers
+
+Every handler answers with the same CORS headers, a JSON body, and the
+same shapes for errors and preflight requests. ``Cors`` builds each set of
+header maps once at import instead of per response, ``dumps`` serializes
+with orjson when it is installed (several times faster than the stdlib
+encoder on megabyte-sized extracted text) and falls back to ``json``
+otherwise, and ``preflight`` answers OPTIONS before a handler runs.
+"""
+
+import functools
+import json
+from types import MappingProxyType
+from typing import Any, Callable, Mapping, Optional
+
+import azure.functions as func
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_MIMETYPE = 'application/json'
+ALLOW_METHODS = 'GET, POST, PUT, DELETE, OPTIONS'
+ALLOW_HEADERS = 'Content-Type, Authorization'
+PREFLIGHT_MAX_AGE = '86400'
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def dumps(data: Any) -> bytes:
+    """``data`` as UTF-8 JSON bytes."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, option=_ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            # Lone surrogates, integers over 64 bits and other values only
+            # the stdlib encoder accepts
+            pass
+    return json.dumps(data, separators=(',', ':')).encode('ascii')
+
+
+class Cors:
+    """Precomputed CORS headers for one set of allowed methods and request headers."""
+
+    def __init__(self, methods: str = ALLOW_METHODS, allow_headers: str = ALLOW_HEADERS,
+                 expose_headers: Optional[str] = None):
+        base = {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': methods,
+            'Access-Control-Allow-Headers': allow_headers
+        }
+        self.headers: Mapping[str, str] = MappingProxyType(
+            {**base, 'Access-Control-Expose-Headers': expose_headers} if expose_headers else base
+        )
+        self.preflight_headers: Mapping[str, str] = MappingProxyType(
+            {**base, 'Access-Control-Max-Age': PREFLIGHT_MAX_AGE}
+        )
+
+    def with_headers(self, headers: Optional[Mapping[str, str]] = None) -> Mapping[str, str]:
+        """The CORS headers plus ``headers``."""
+        return {**self.headers, **headers} if headers else self.headers
+
+
+DEFAULT_CORS = Cors()
+
+
+def json_response(data: Any, status_code: int = 200, headers: Optional[Mapping[str, str]] = None,
+                  cors: Cors = DEFAULT_CORS) -> func.HttpResponse:
+    return func.HttpResponse(
+        dumps(data),
+        status_code=status_code,
+        mimetype=JSON_MIMETYPE,
+        headers=cors.with_headers(headers)
+    )
+
+
+def error_response(message: str, status_code: int, headers: Optional[Mapping[str, str]] = None,
+                   cors: Cors = DEFAULT_CORS, **fields: Any) -> func.HttpResponse:
+    """``{**fields, "error": message}`` with ``status_code``."""
+    return json_response({**fields, 'error': message}, status_code, headers, cors)
+
+
+def server_error(log_message: str, message: str, cors: Cors = DEFAULT_CORS, **fields: Any) -> func.HttpResponse:
+    """Log ``log_message`` and answer 500 with ``message``, which is shown to the client."""
+    print(log_message)
+    return error_response(message, 500, cors=cors, **fields)
+
+
+def preflight(cors: Cors = DEFAULT_CORS) -> Callable:
+    """Decorator answering CORS preflight (OPTIONS) requests before the handler runs."""
+    def decorator(handler: Callable) -> Callable:
+        @functools.wraps(handler)
+        def wrapper(req: func.HttpRequest, *args, **kwargs):
+            if req.method == 'OPTIONS':
+                return func.HttpResponse(status_code=200, headers=cors.preflight_headers)
+            return handler(req, *args, **kwargs)
+        return wrapper
+    return decorator
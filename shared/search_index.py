@@ -0,0 +1,268 @@
+"""
+Full-text search over extracted document text
+
+Extracted text is indexed into a local SQLite FTS5 database as it is
+written (``store_extracted_text`` and saved edits), so searching never has
+to download the ``documents_text/`` blobs. The database is a per-instance
+cache of blob storage: ``sync()`` compares it against one listing of
+``documents_text/`` and only re-downloads text whose ETag changed. It runs
+on a background thread (``shared.index_sync``) every
+``SEARCH_SYNC_INTERVAL`` seconds, which fills a fresh instance and picks up
+writes made by other instances; searches never list or download text, and
+are answered with ``IndexWarming`` until the first sync has completed.
+
+Results are ranked with BM25 and returned with a highlighted snippet.
+"""
+
+import html
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from shared.index_sync import BackgroundSync, IndexWarming, claim_path
+from shared.timing import span
+
+SEARCH_INDEX_PATH = os.getenv('SEARCH_INDEX_PATH') or os.path.join(tempfile.gettempdir(), 'langazure-search.sqlite3')
+# Seconds between consistency checks against blob storage
+SEARCH_SYNC_INTERVAL = float(os.getenv('SEARCH_SYNC_INTERVAL', '60') or 60)
+
+TEXT_PREFIX = 'documents_text/'
+TEXT_SUFFIX = '.txt'
+MAX_RESULTS = 100
+SNIPPET_TOKENS = 16
+
+# Private-use characters mark matches in snippets until the text is escaped
+_MATCH_START = '\ue000'
+_MATCH_END = '\ue001'
+
+_QUERY_TERM = re.compile(r'"([^"]*)"|(\S+)')
+_WORD = re.compile(r'\w+')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    blob_name TEXT NOT NULL UNIQUE,
+    etag TEXT,
+    indexed_at REAL NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS document_text USING fts5(
+    body,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+
+def build_match_expression(query: str) -> Optional[str]:
+    """Turn free text into a safe FTS5 MATCH expression.
+
+    Words are ANDed together, ``"quoted text"`` is matched as a phrase and a
+    trailing ``*`` makes a prefix search. FTS5 operators typed by the user
+    are treated as plain words, so a query can never be a syntax error.
+    """
+    terms = []
+    for match in _QUERY_TERM.finditer(query or ''):
+        if match.group(1) is not None:
+            words = _WORD.findall(match.group(1))
+            if words:
+                terms.append('"' + ' '.join(words) + '"')
+            continue
+        token = match.group(2)
+        words = _WORD.findall(token)
+        if not words:
+            continue
+        phrase = '"' + ' '.join(words) + '"'
+        terms.append(phrase + '*' if token.endswith('*') and len(words) == 1 else phrase)
+    return ' '.join(terms) if terms else None
+
+
+def text_blob_to_document(text_blob_name: str) -> Optional[str]:
+    """Map ``documents_text/<blob>.txt`` back to ``<blob>``."""
+    if not (text_blob_name.startswith(TEXT_PREFIX) and text_blob_name.endswith(TEXT_SUFFIX)):
+        return None
+    return text_blob_name[len(TEXT_PREFIX):-len(TEXT_SUFFIX)]
+
+
+def _format_snippet(snippet: str) -> str:
+    return html.escape(snippet).replace(_MATCH_START, '<mark>').replace(_MATCH_END, '</mark>')
+
+
+class SearchIndex:
+    """SQLite FTS5 index of extracted text, keyed by document blob name."""
+
+    def __init__(self, path: str = SEARCH_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._last_sync = 0.0
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        # WAL lets several worker processes on one instance share the file
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def index_document(self, blob_name: str, text: str, etag: Optional[str] = None) -> None:
+        """Add or replace the text of one document."""
+        with self._lock, span('search.index'):
+            connection = self._connection
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                row = connection.execute('SELECT id FROM documents WHERE blob_name = ?', (blob_name,)).fetchone()
+                if row is None:
+                    document_id = connection.execute(
+                        'INSERT INTO documents (blob_name, etag, indexed_at) VALUES (?, ?, ?)',
+                        (blob_name, etag, time.time())).lastrowid
+                else:
+                    document_id = row[0]
+                    connection.execute('UPDATE documents SET etag = ?, indexed_at = ? WHERE id = ?',
+                                       (etag, time.time(), document_id))
+                    connection.execute('DELETE FROM document_text WHERE rowid = ?', (document_id,))
+                connection.execute('INSERT INTO document_text (rowid, body) VALUES (?, ?)', (document_id, text))
+                connection.execute('COMMIT')
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+
+    def remove_document(self, blob_name: str) -> bool:
+        """Drop a document from the index; returns False if it was not indexed."""
+        with self._lock:
+            connection = self._connection
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                row = connection.execute('SELECT id FROM documents WHERE blob_name = ?', (blob_name,)).fetchone()
+                if row is not None:
+                    connection.execute('DELETE FROM document_text WHERE rowid = ?', (row[0],))
+                    connection.execute('DELETE FROM documents WHERE id = ?', (row[0],))
+                connection.execute('COMMIT')
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+        return row is not None
+
+    def indexed_etags(self) -> Dict[str, Optional[str]]:
+        with self._lock:
+            return dict(self._connection.execute('SELECT blob_name, etag FROM documents').fetchall())
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+        """Ranked documents matching ``query``, best first, with snippets."""
+        expression = build_match_expression(query)
+        if expression is None:
+            return []
+        limit = max(1, min(int(limit), MAX_RESULTS))
+        with self._lock, span('search.query'):
+            rows = self._connection.execute(
+                """
+                SELECT documents.blob_name,
+                       bm25(document_text) AS rank,
+                       snippet(document_text, 0, ?, ?, '…', ?)
+                FROM document_text
+                JOIN documents ON documents.id = document_text.rowid
+                WHERE document_text MATCH ?
+                ORDER BY rank
+                LIMIT ? OFFSET ?
+                """,
+                (_MATCH_START, _MATCH_END, SNIPPET_TOKENS, expression, limit, max(0, int(offset)))
+            ).fetchall()
+        return [
+            {
+                'name': blob_name,
+                # bm25() is lower-is-better; flip it so higher scores rank first
+                'score': round(-rank, 4),
+                'snippet': _format_snippet(snippet)
+            }
+            for blob_name, rank, snippet in rows
+        ]
+
+    @property
+    def synced(self) -> bool:
+        """True once a sync has completed in this process."""
+        return self._last_sync > 0
+
+    def sync(self, container_client, force: bool = False) -> Dict[str, int]:
+        """Reconcile the index with the text blobs in ``container_client``.
+
+        Runs at most once per ``SEARCH_SYNC_INTERVAL`` unless forced, one
+        sync at a time. Only text whose ETag differs from the indexed one is
+        downloaded.
+        """
+        with self._sync_lock:
+            if not force and self.synced and time.monotonic() - self._last_sync < SEARCH_SYNC_INTERVAL:
+                return {'indexed': 0, 'removed': 0}
+            result = self._sync(container_client)
+            self._last_sync = time.monotonic()
+        return result
+
+    def _sync(self, container_client) -> Dict[str, int]:
+        indexed = self.indexed_etags()
+        seen = set()
+        added = removed = 0
+        with span('search.sync'):
+            for blob in container_client.list_blobs(name_starts_with=TEXT_PREFIX):
+                blob_name = text_blob_to_document(blob.name)
+                if blob_name is None:
+                    continue
+                seen.add(blob_name)
+                if blob_name in indexed and indexed[blob_name] == blob.etag:
+                    continue
+                try:
+                    text = container_client.get_blob_client(blob.name).download_blob().readall().decode('utf-8')
+                except Exception as error:
+                    print(f"Search index: failed to read {blob.name}: {error}")
+                    continue
+                self.index_document(blob_name, text, etag=blob.etag)
+                added += 1
+            for blob_name in set(indexed) - seen:
+                self.remove_document(blob_name)
+                removed += 1
+
+        if added or removed:
+            print(f"Search index synced: {added} indexed, {removed} removed")
+        return {'indexed': added, 'removed': removed}
+
+
+_index: Optional[SearchIndex] = None
+_index_lock = threading.Lock()
+_background_sync = BackgroundSync('search', SEARCH_SYNC_INTERVAL)
+
+
+def get_index() -> SearchIndex:
+    """The process-wide index, opened on first use at the path this process claims (``claim_path``)."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = SearchIndex(claim_path(SEARCH_INDEX_PATH))
+    return _index
+
+
+def start_sync(container_client) -> SearchIndex:
+    """The process-wide index, kept in sync with ``container_client`` in the background."""
+    index = get_index()
+    _background_sync.start(index, container_client)
+    return index
+
+
+def search_documents(container_client, query: str, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+    """Search endpoint body shared by the Azure Functions and Flask apps.
+
+    Raises IndexWarming until the index has completed its first sync.
+    """
+    started = time.perf_counter()
+    index = start_sync(container_client)
+    if not index.synced:
+        raise IndexWarming('search')
+    results = index.search(query, limit=limit, offset=offset)
+    return {
+        'query': query,
+        'results': results,
+        'count': len(results),
+        'offset': offset,
+        'tookMs': round((time.perf_counter() - started) * 1000.0, 2)
+    }
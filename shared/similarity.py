@@ -0,0 +1,455 @@
+"""
+Passage similarity search with hashed TF-IDF vectors
+
+Extracted text is split into chunks (``shared.chunking``) and each chunk is
+turned into a fixed-width term-frequency vector with the hashing trick, so
+no vocabulary has to be built or shared between instances. Vectors are
+appended to one contiguous float32 file that is memory-mapped as an
+``(rows, SIMILARITY_DIM)`` matrix; adding a document only appends rows.
+
+IDF weights are kept as per-dimension chunk frequencies and applied at
+query time: the cosine similarity of TF-IDF vectors ``idf * t`` and
+``idf * q`` is ``t . (idf^2 * q) / (|idf * t| |idf * q|)``, so a query is one
+batched matrix product over the stored term-frequency rows. Row norms under
+the current IDF are cached and recomputed only after the corpus changed.
+
+Rows record where their chunk lies in the stored text (character and
+UTF-8 byte offsets and the text's ETag) but not the text itself, so the
+index does not hold a second copy of the corpus on disk or in memory; the
+passages of the top results are read from ``documents_text/`` with ranged
+downloads.
+
+Replaced or deleted documents leave tombstoned rows behind until the file
+is compacted. Like the search index, the files are a per-instance cache of
+``documents_text/``, reconciled against it with ``sync()`` on a background
+thread (``shared.index_sync``). Each process claims a directory of its
+own (``index_sync.claim_path``).
+"""
+
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceModifiedError, ResourceNotFoundError
+
+from shared import metrics
+from shared.chunking import chunk_text
+from shared.index_sync import BackgroundSync, IndexWarming, claim_path
+from shared.search_index import TEXT_PREFIX, TEXT_SUFFIX, text_blob_to_document
+from shared.timing import span
+
+SIMILARITY_INDEX_DIR = os.getenv('SIMILARITY_INDEX_DIR') or os.path.join(tempfile.gettempdir(), 'langazure-similarity')
+SIMILARITY_DIM = int(os.getenv('SIMILARITY_DIM', '2048') or 2048)
+SIMILARITY_SYNC_INTERVAL = float(os.getenv('SIMILARITY_SYNC_INTERVAL', '60') or 60)
+
+MAX_RESULTS = 50
+# Rows scored per matrix product, bounding temporary memory to BLOCK_ROWS x query chunks
+BLOCK_ROWS = 16384
+# Compact once tombstoned rows outnumber live ones (and there are enough to matter)
+COMPACT_MIN_DEAD = 1024
+# Ranged downloads in flight while the passages of results are read
+PASSAGE_FETCH_CONCURRENCY = 8
+
+_TOKEN = re.compile(r'\w+')
+
+
+def hash_vectors(texts: Iterable[str], dim: int = SIMILARITY_DIM) -> np.ndarray:
+    """Sublinear term-frequency vectors (``1 + log tf``) of hashed tokens, one row per text."""
+    texts = list(texts)
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        token_counts = Counter(_TOKEN.findall(text.lower()))
+        if not token_counts:
+            continue
+        # crc32 is stable across processes, unlike hash()
+        buckets = np.fromiter((zlib.crc32(token.encode('utf-8')) % dim for token in token_counts),
+                              dtype=np.int64, count=len(token_counts))
+        weights = np.fromiter(token_counts.values(), dtype=np.float64, count=len(token_counts))
+        counts = np.bincount(buckets, weights=weights, minlength=dim).astype(np.float32)
+        nonzero = counts > 0
+        matrix[row, nonzero] = 1.0 + np.log(counts[nonzero])
+    return matrix
+
+
+def byte_ranges(text: str, chunks: List[Dict[str, Any]]) -> List[tuple]:
+    """UTF-8 (start, end) byte offsets of ``chunks``, which must be in text order."""
+    ranges = []
+    position = offset = 0
+    for chunk in chunks:
+        offset += len(text[position:chunk['start']].encode('utf-8'))
+        start = offset
+        offset += len(text[chunk['start']:chunk['end']].encode('utf-8'))
+        position = chunk['end']
+        ranges.append((start, offset))
+    return ranges
+
+
+class SimilarityIndex:
+    """Append-only memory-mapped matrix of chunk vectors plus per-row metadata.
+
+    Files in ``directory``:
+      vectors.f32  raw float32 rows of width ``dim``
+      rows.jsonl   one line per row (document, chunk character and byte
+                   offsets, ETag) and one ``{"remove": ...}`` line per
+                   tombstoned document
+    """
+
+    def __init__(self, directory: str = SIMILARITY_INDEX_DIR, dim: int = SIMILARITY_DIM):
+        self.directory = directory
+        self.dim = dim
+        self.vectors_path = os.path.join(directory, 'vectors.f32')
+        self.rows_path = os.path.join(directory, 'rows.jsonl')
+        self._lock = threading.RLock()
+        self._sync_lock = threading.Lock()
+        self._last_sync = 0.0
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    # -- persistence ---------------------------------------------------------
+
+    def _load(self) -> None:
+        self.rows: List[Optional[Dict[str, Any]]] = []
+        self.documents: Dict[str, Dict[str, Any]] = {}
+        # Rows written before byte offsets were recorded; re-added by sync()
+        outdated = set()
+        if os.path.exists(self.rows_path):
+            with open(self.rows_path, 'r', encoding='utf-8') as rows_file:
+                for line in rows_file:
+                    entry = json.loads(line)
+                    if 'remove' in entry:
+                        self._tombstone(entry['remove'])
+                        outdated.discard(entry['remove'])
+                    else:
+                        self._add_row(entry)
+                        if 'byteStart' not in entry:
+                            outdated.add(entry['name'])
+        for name in outdated:
+            self._tombstone(name)
+
+        # An interrupted append can leave the two files out of step: drop
+        # vectors without metadata, and documents whose vectors are missing
+        row_bytes = 4 * self.dim
+        stored_bytes = os.path.getsize(self.vectors_path) if os.path.exists(self.vectors_path) else 0
+        stored_rows = stored_bytes // row_bytes
+        incomplete = stored_rows < len(self.rows)
+        if incomplete:
+            for entry in self.rows[stored_rows:]:
+                if entry is not None:
+                    self._tombstone(entry['name'])
+            del self.rows[stored_rows:]
+        if stored_bytes > len(self.rows) * row_bytes:
+            with open(self.vectors_path, 'r+b') as vectors_file:
+                vectors_file.truncate(len(self.rows) * row_bytes)
+        self._matrix = self._open_matrix(len(self.rows))
+
+        live = np.array([entry is not None for entry in self.rows], dtype=bool)
+        self.df = np.zeros(self.dim, dtype=np.float64)
+        for begin in range(0, len(self.rows), BLOCK_ROWS):
+            block = np.asarray(self._matrix[begin:begin + BLOCK_ROWS])
+            self.df += (block[live[begin:begin + BLOCK_ROWS]] > 0).sum(axis=0)
+        self._norms: Optional[np.ndarray] = None
+        self._live: Optional[np.ndarray] = None
+        if incomplete or outdated:
+            self.compact()
+
+    def _open_matrix(self, rows: int) -> np.ndarray:
+        if rows == 0:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(rows, self.dim))
+
+    def _add_row(self, entry: Dict[str, Any]) -> None:
+        self.rows.append(entry)
+        document = self.documents.setdefault(entry['name'], {'etag': entry.get('etag'), 'rows': []})
+        document['rows'].append(len(self.rows) - 1)
+
+    def _tombstone(self, name: str) -> List[int]:
+        document = self.documents.pop(name, None)
+        if document is None:
+            return []
+        for row in document['rows']:
+            self.rows[row] = None
+        return document['rows']
+
+    # -- updates -------------------------------------------------------------
+
+    @property
+    def live_rows(self) -> int:
+        return sum(len(document['rows']) for document in self.documents.values())
+
+    def add_document(self, name: str, text: str, etag: Optional[str] = None) -> int:
+        """Chunk, vectorize and append a document, replacing any earlier version."""
+        chunks = chunk_text(text)
+        with span('similarity.vectorize'):
+            vectors = hash_vectors(chunk['text'] for chunk in chunks)
+        with self._lock:
+            self._remove(name)
+            if not chunks:
+                return 0
+            first_row = len(self.rows)
+            with open(self.vectors_path, 'ab') as vectors_file:
+                vectors_file.write(vectors.tobytes())
+            entries = [
+                {'name': name, 'etag': etag, 'chunk': chunk['index'], 'start': chunk['start'],
+                 'end': chunk['end'], 'byteStart': byte_start, 'byteEnd': byte_end}
+                for chunk, (byte_start, byte_end) in zip(chunks, byte_ranges(text, chunks))
+            ]
+            with open(self.rows_path, 'a', encoding='utf-8') as rows_file:
+                rows_file.writelines(json.dumps(entry) + '\n' for entry in entries)
+            for entry in entries:
+                self._add_row(entry)
+            self.df += (vectors > 0).sum(axis=0)
+            self._matrix = self._open_matrix(len(self.rows))
+            self._norms = self._live = None
+            print(f"Similarity index: added {len(chunks)} chunks of {name} at row {first_row}")
+        return len(chunks)
+
+    def remove_document(self, name: str) -> bool:
+        with self._lock:
+            removed = self._remove(name)
+            if removed and len(self.rows) - self.live_rows >= max(COMPACT_MIN_DEAD, self.live_rows):
+                self.compact()
+        return removed
+
+    def _remove(self, name: str) -> bool:
+        rows = self._tombstone(name)
+        if not rows:
+            return False
+        with open(self.rows_path, 'a', encoding='utf-8') as rows_file:
+            rows_file.write(json.dumps({'remove': name}) + '\n')
+        self.df -= (np.asarray(self._matrix[rows]) > 0).sum(axis=0)
+        self._norms = self._live = None
+        return True
+
+    def compact(self) -> None:
+        """Rewrite the files without tombstoned rows."""
+        with self._lock, span('similarity.compact'):
+            live = [row for row, entry in enumerate(self.rows) if entry is not None]
+            vectors_tmp = self.vectors_path + '.tmp'
+            rows_tmp = self.rows_path + '.tmp'
+            with open(vectors_tmp, 'wb') as vectors_file, open(rows_tmp, 'w', encoding='utf-8') as rows_file:
+                for begin in range(0, len(live), BLOCK_ROWS):
+                    block_rows = live[begin:begin + BLOCK_ROWS]
+                    vectors_file.write(np.asarray(self._matrix[block_rows]).tobytes())
+                    rows_file.writelines(json.dumps(self.rows[row]) + '\n' for row in block_rows)
+            self._matrix = None
+            os.replace(vectors_tmp, self.vectors_path)
+            os.replace(rows_tmp, self.rows_path)
+            self._load()
+
+    # -- queries -------------------------------------------------------------
+
+    def _idf(self) -> np.ndarray:
+        live = max(self.live_rows, 1)
+        return (np.log((1.0 + live) / (1.0 + self.df)) + 1.0).astype(np.float32)
+
+    def _live_mask(self) -> np.ndarray:
+        if self._live is None:
+            self._live = np.fromiter((entry is not None for entry in self.rows), dtype=bool, count=len(self.rows))
+        return self._live
+
+    def _row_norms(self, idf_squared: np.ndarray) -> np.ndarray:
+        """|idf * t| for every row, cached until the corpus changes."""
+        if self._norms is None or len(self._norms) != len(self.rows):
+            norms = np.empty(len(self.rows), dtype=np.float32)
+            for begin in range(0, len(self.rows), BLOCK_ROWS):
+                block = np.asarray(self._matrix[begin:begin + BLOCK_ROWS])
+                norms[begin:begin + len(block)] = np.sqrt(np.square(block) @ idf_squared)
+            self._norms = norms
+        return self._norms
+
+    def query_vectors(self, vectors: np.ndarray, limit: int = 10,
+                      exclude: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Top passages by cosine similarity to any of the query ``vectors``."""
+        limit = max(1, min(int(limit), MAX_RESULTS))
+        with self._lock:
+            if not self.documents or not len(vectors):
+                return []
+            with span('similarity.query'):
+                idf_squared = np.square(self._idf())
+                norms = self._row_norms(idf_squared)
+                weighted = vectors * idf_squared
+                query_norms = np.sqrt(np.square(vectors) @ idf_squared)
+                query_norms[query_norms == 0] = 1.0
+                weighted /= query_norms[:, None]
+
+                candidates = self._live_mask().copy()
+                if exclude in self.documents:
+                    candidates[self.documents[exclude]['rows']] = False
+                best_rows = np.empty(0, dtype=np.int64)
+                best_scores = np.empty(0, dtype=np.float32)
+                for begin in range(0, len(self.rows), BLOCK_ROWS):
+                    block = np.asarray(self._matrix[begin:begin + BLOCK_ROWS])
+                    # One product scores every row of the block against every query chunk
+                    scores = (block @ weighted.T).max(axis=1)
+                    block_norms = norms[begin:begin + len(block)]
+                    scores = np.divide(scores, block_norms, out=np.zeros_like(scores), where=block_norms > 0)
+                    scores[~candidates[begin:begin + len(block)]] = -1.0
+                    keep = min(limit, len(scores))
+                    top = np.argpartition(-scores, keep - 1)[:keep]
+                    best_rows = np.concatenate([best_rows, top + begin])
+                    best_scores = np.concatenate([best_scores, scores[top]])
+
+                order = np.argsort(-best_scores)[:limit]
+            results = []
+            for index in order:
+                score = float(best_scores[index])
+                if score <= 0:
+                    break
+                entry = self.rows[int(best_rows[index])]
+                results.append({
+                    'name': entry['name'],
+                    'chunk': entry['chunk'],
+                    'start': entry['start'],
+                    'end': entry['end'],
+                    'score': round(score, 4),
+                    'etag': entry.get('etag'),
+                    'byteStart': entry['byteStart'],
+                    'byteEnd': entry['byteEnd']
+                })
+        return results
+
+    def similar_to_text(self, text: str, limit: int = 10) -> List[Dict[str, Any]]:
+        return self.query_vectors(hash_vectors([text], self.dim), limit=limit)
+
+    def similar_to_document(self, name: str, limit: int = 10) -> Optional[List[Dict[str, Any]]]:
+        """Passages of other documents closest to any chunk of ``name``; None if not indexed."""
+        with self._lock:
+            document = self.documents.get(name)
+            if document is None:
+                return None
+            vectors = np.asarray(self._matrix[document['rows']])
+        return self.query_vectors(vectors, limit=limit, exclude=name)
+
+    @property
+    def synced(self) -> bool:
+        """True once a sync has completed in this process."""
+        return self._last_sync > 0
+
+    def sync(self, container_client, force: bool = False) -> Dict[str, int]:
+        """Reconcile with ``documents_text/``, one sync at a time; only changed text is downloaded."""
+        with self._sync_lock:
+            if not force and self.synced and time.monotonic() - self._last_sync < SIMILARITY_SYNC_INTERVAL:
+                return {'indexed': 0, 'removed': 0}
+            result = self._sync(container_client)
+            self._last_sync = time.monotonic()
+        return result
+
+    def _sync(self, container_client) -> Dict[str, int]:
+        with self._lock:
+            indexed = {name: document['etag'] for name, document in self.documents.items()}
+        seen = set()
+        added = removed = 0
+        with span('similarity.sync'):
+            for blob in container_client.list_blobs(name_starts_with=TEXT_PREFIX):
+                name = text_blob_to_document(blob.name)
+                if name is None:
+                    continue
+                seen.add(name)
+                if name in indexed and indexed[name] == blob.etag:
+                    continue
+                try:
+                    text = container_client.get_blob_client(blob.name).download_blob().readall().decode('utf-8')
+                except Exception as error:
+                    print(f"Similarity index: failed to read {blob.name}: {error}")
+                    continue
+                self.add_document(name, text, etag=blob.etag)
+                added += 1
+            for name in set(indexed) - seen:
+                self.remove_document(name)
+                removed += 1
+        return {'indexed': added, 'removed': removed}
+
+
+_index: Optional[SimilarityIndex] = None
+_index_lock = threading.Lock()
+_background_sync = BackgroundSync('similarity', SIMILARITY_SYNC_INTERVAL)
+
+
+def get_index() -> SimilarityIndex:
+    """The process-wide index, loaded on first use from the directory this process claims (``claim_path``)."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = SimilarityIndex(claim_path(SIMILARITY_INDEX_DIR))
+    return _index
+
+
+def start_sync(container_client) -> SimilarityIndex:
+    """The process-wide index, kept in sync with ``container_client`` in the background."""
+    index = get_index()
+    _background_sync.start(index, container_client)
+    return index
+
+
+def _read_passage(container_client, result: Dict[str, Any]) -> Optional[str]:
+    """The text of one result's chunk, or None if its text changed since it was indexed."""
+    etag = result['etag']
+    try:
+        with span('storage.download_blob'):
+            data = container_client.get_blob_client(f"{TEXT_PREFIX}{result['name']}{TEXT_SUFFIX}").download_blob(
+                offset=result['byteStart'],
+                length=result['byteEnd'] - result['byteStart'],
+                etag=etag,
+                match_condition=MatchConditions.IfNotModified if etag else None
+            ).readall()
+    except (ResourceModifiedError, ResourceNotFoundError):
+        return None
+    metrics.STORAGE_BYTES_DOWNLOADED.inc(len(data))
+    return data.decode('utf-8')
+
+
+def attach_passages(container_client, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """``results`` with the ``text`` of their chunks, dropping those whose text has changed."""
+    if not results:
+        return results
+    with ThreadPoolExecutor(max_workers=min(PASSAGE_FETCH_CONCURRENCY, len(results))) as executor:
+        passages = list(executor.map(lambda result: _read_passage(container_client, result), results))
+    attached = []
+    for result, passage in zip(results, passages):
+        # A stale row; the next sync re-indexes the document
+        if passage is None:
+            continue
+        attached.append({
+            'name': result['name'],
+            'chunk': result['chunk'],
+            'start': result['start'],
+            'end': result['end'],
+            'score': result['score'],
+            'text': passage
+        })
+    return attached
+
+
+def find_similar(container_client, text: Optional[str] = None, blob_name: Optional[str] = None,
+                 limit: int = 10) -> Optional[Dict[str, Any]]:
+    """Similar-passages endpoint body shared by the Azure Functions and Flask apps.
+
+    Returns None when ``blob_name`` has no extracted text, and raises
+    IndexWarming until the index has completed its first sync.
+    """
+    started = time.perf_counter()
+    index = start_sync(container_client)
+    if not index.synced:
+        raise IndexWarming('similarity')
+    if blob_name:
+        results = index.similar_to_document(blob_name, limit=limit)
+        if results is None:
+            return None
+    else:
+        results = index.similar_to_text(text or '', limit=limit)
+    results = attach_passages(container_client, results)
+    return {
+        'results': results,
+        'count': len(results),
+        'tookMs': round((time.perf_counter() - started) * 1000.0, 2)
+    }
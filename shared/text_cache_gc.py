@@ -0,0 +1,238 @@
+"""
+Garbage collection of orphaned extracted text
+
+``documents_text/<document>.txt``, ``<document>.chunks.jsonl`` and the
+text's history under ``versions/<document>/`` are deleted together with
+their document, but a delete that fails halfway, or a document removed
+outside the app, leaves them behind. They then cost storage and are
+scanned by every listing join and index sync.
+
+``collect_garbage`` finds them by joining the sorted document listing with
+the sorted ``documents_text/`` listing in one streaming pass per kind
+(``shared.listing.merge_companions``), so memory does not grow with the
+container, and deletes them in batches of up to 256. A document's history
+records are joined as one companion named ``versions/<document>/``, and
+the document is looked up once more before its history is deleted.
+Archives built by ``ExportArchive`` (the ``exports`` kind) have no
+document; they are deleted once older than ``EXPORT_MAX_AGE`` seconds. Blobs modified within
+the last ``TEXT_CACHE_GC_MIN_AGE`` seconds are left alone, since their
+document may have been uploaded after the document listing passed its
+name, and each delete is conditional on the ETag that was listed.
+
+Run it from the repository root, or let the ``CleanupTextCache`` timer
+function run it daily:
+
+    python -m shared.text_cache_gc --dry-run
+    python -m shared.text_cache_gc --kinds text --min-age 86400
+    python -m shared.text_cache_gc --kinds exports --export-max-age 3600
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from azure.core import MatchConditions
+
+from shared import metrics
+from shared.chunk_store import CHUNKS_SUFFIX
+from shared.listing import iter_documents, merge_companions
+from shared.search_index import TEXT_PREFIX, TEXT_SUFFIX
+from shared.text_versions import VERSIONS_PREFIX
+from shared.zipstream import EXPORTS_PREFIX
+from shared.timing import span
+
+GC_MIN_AGE = float(os.getenv('TEXT_CACHE_GC_MIN_AGE', '3600') or 3600)
+# Export archives outlive the download URL handed out for them (one hour)
+EXPORT_MAX_AGE = float(os.getenv('EXPORT_MAX_AGE', '86400') or 86400)
+# Blob batch requests take at most 256 sub-requests
+GC_BATCH_SIZE = 256
+# Kinds of companion blob: (prefix, suffix) around the document name
+GC_KINDS: Dict[str, Tuple[str, str]] = {
+    'text': (TEXT_PREFIX, TEXT_SUFFIX),
+    'chunks': (TEXT_PREFIX, CHUNKS_SUFFIX),
+    'versions': (VERSIONS_PREFIX, '/'),
+}
+# Kinds stored as many blobs under ``prefix + document + suffix``
+GROUPED_KINDS = ('versions',)
+# Kinds without a document, deleted by age: prefix
+EXPIRING_KINDS: Dict[str, str] = {
+    'exports': EXPORTS_PREFIX,
+}
+ALL_KINDS = tuple(GC_KINDS) + tuple(EXPIRING_KINDS)
+SAMPLE_NAMES = 20
+
+
+class BlobGroup:
+    """Blobs listed under one ``name``, joined with their document as a single companion."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.blobs: List[Any] = []
+
+    @property
+    def size(self) -> int:
+        return sum(blob.size or 0 for blob in self.blobs)
+
+    @property
+    def last_modified(self) -> Optional[datetime]:
+        return max((blob.last_modified for blob in self.blobs if blob.last_modified), default=None)
+
+
+def iter_groups(blobs: Iterable[Any]) -> Iterator[BlobGroup]:
+    """Runs of consecutive blobs in the same folder, one ``BlobGroup`` each."""
+    group = None
+    for blob in blobs:
+        name = blob.name.rsplit('/', 1)[0] + '/'
+        if group is None or group.name != name:
+            if group is not None:
+                yield group
+            group = BlobGroup(name)
+        group.blobs.append(blob)
+    if group is not None:
+        yield group
+
+
+def iter_orphans(container_client, skip_prefixes: Tuple[str, ...], prefix: str, suffix: str,
+                 grouped: bool = False) -> Iterator[Any]:
+    """Blobs named ``prefix + document + suffix`` whose document does not exist, in name order.
+
+    With ``grouped`` the blobs under ``prefix + document + suffix`` are
+    yielded as one ``BlobGroup`` per document.
+    """
+    documents = iter_documents(container_client, skip_prefixes)
+    companions = container_client.list_blobs(name_starts_with=prefix)
+    if grouped:
+        companions = iter_groups(companions)
+    for name, document, companion in merge_companions(documents, companions, prefix, suffix):
+        if document is None:
+            yield companion
+
+
+def _delete_batch(container_client, blobs: List[Any], kind: str, counts: Dict[str, Any]) -> None:
+    requests = [
+        {'name': blob.name, 'etag': blob.etag, 'match_condition': MatchConditions.IfNotModified}
+        for blob in blobs
+    ]
+    try:
+        with span('storage.delete_blobs'):
+            responses = list(container_client.delete_blobs(*requests, raise_on_any_failure=False))
+    except Exception as error:
+        print(f"Text cache GC: failed to delete a batch of {len(blobs)} {kind} blobs: {error}")
+        counts['failed'] += len(blobs)
+        return
+
+    # Sub-responses come back in request order
+    for blob, response in zip(blobs, responses):
+        status = response.status_code
+        if 200 <= status < 300:
+            counts['deleted'] += 1
+            counts['deletedBytes'] += blob.size or 0
+            metrics.TEXT_CACHE_GC_DELETED.inc(kind=kind)
+            metrics.TEXT_CACHE_GC_BYTES.inc(blob.size or 0)
+        elif status == 404:
+            # Deleted by someone else in the meantime
+            counts['missing'] += 1
+        elif status == 412:
+            # Rewritten since it was listed, so its document is back
+            counts['changed'] += 1
+        else:
+            print(f"Text cache GC: could not delete {blob.name}: HTTP {status}")
+            counts['failed'] += 1
+
+
+def collect_garbage(container_client, skip_prefixes: Tuple[str, ...], kinds: Sequence[str] = ALL_KINDS,
+                    dry_run: bool = False, min_age: float = GC_MIN_AGE,
+                    batch_size: int = GC_BATCH_SIZE, export_max_age: float = EXPORT_MAX_AGE) -> Dict[str, Any]:
+    """Delete (or with ``dry_run`` only count) orphaned companion blobs and expired exports of ``kinds``.
+
+    Returns counts and bytes per kind and in total; for ``exports`` the
+    orphans are the archives older than ``export_max_age``.
+    """
+    unknown = set(kinds) - set(ALL_KINDS)
+    if unknown:
+        raise ValueError(f"Unknown kinds: {', '.join(sorted(unknown))}")
+
+    started = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    report: Dict[str, Any] = {'dryRun': dry_run, 'minAgeSeconds': min_age, 'exportMaxAgeSeconds': export_max_age,
+                              'kinds': {}}
+    for kind in kinds:
+        grouped = kind in GROUPED_KINDS
+        if kind in EXPIRING_KINDS:
+            prefix, suffix = EXPIRING_KINDS[kind], ''
+            cutoff = now - timedelta(seconds=export_max_age)
+            candidates = container_client.list_blobs(name_starts_with=prefix)
+        else:
+            prefix, suffix = GC_KINDS[kind]
+            cutoff = now - timedelta(seconds=min_age)
+            candidates = iter_orphans(container_client, skip_prefixes, prefix, suffix, grouped)
+        counts: Dict[str, Any] = {
+            'orphans': 0, 'orphanBytes': 0, 'tooRecent': 0,
+            'deleted': 0, 'deletedBytes': 0, 'missing': 0, 'changed': 0, 'failed': 0,
+            'sample': []
+        }
+        batch: List[Any] = []
+        for blob in candidates:
+            if blob.last_modified and blob.last_modified > cutoff:
+                counts['tooRecent'] += 1
+                continue
+            blobs = blob.blobs if grouped else [blob]
+            if grouped:
+                # Records of one document are not always listed together
+                # (``versions/a/000001`` < ``versions/a/000001x/...`` <
+                # ``versions/a/000002``), so make sure the document is gone
+                document = blob.name[len(prefix):-len(suffix)]
+                with span('storage.get_blob_properties'):
+                    if container_client.get_blob_client(document).exists():
+                        continue
+            counts['orphans'] += len(blobs)
+            counts['orphanBytes'] += blob.size or 0
+            if len(counts['sample']) < SAMPLE_NAMES:
+                counts['sample'].append(blob.name)
+            if dry_run:
+                continue
+            batch.extend(blobs)
+            while len(batch) >= batch_size:
+                _delete_batch(container_client, batch[:batch_size], kind, counts)
+                batch = batch[batch_size:]
+        if batch:
+            _delete_batch(container_client, batch, kind, counts)
+        report['kinds'][kind] = counts
+
+    report['orphans'] = sum(counts['orphans'] for counts in report['kinds'].values())
+    report['orphanBytes'] = sum(counts['orphanBytes'] for counts in report['kinds'].values())
+    report['deleted'] = sum(counts['deleted'] for counts in report['kinds'].values())
+    report['bytesReclaimed'] = sum(counts['deletedBytes'] for counts in report['kinds'].values())
+    report['durationMs'] = round((time.perf_counter() - started) * 1000.0, 1)
+    return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Delete extracted text and text history whose document no longer exists, and old exports.')
+    parser.add_argument('--dry-run', action='store_true', help='Only report what would be deleted')
+    parser.add_argument('--kinds', default=','.join(ALL_KINDS), help=f"Blob kinds to collect: {', '.join(ALL_KINDS)}")
+    parser.add_argument('--min-age', type=float, default=GC_MIN_AGE,
+                        help=f'Leave blobs modified within this many seconds (default: {GC_MIN_AGE:g})')
+    parser.add_argument('--export-max-age', type=float, default=EXPORT_MAX_AGE,
+                        help=f'Delete export archives older than this many seconds (default: {EXPORT_MAX_AGE:g})')
+    args = parser.parse_args(argv)
+
+    from shared.azure_storage import INTERNAL_PREFIXES, container_client
+
+    kinds = [kind.strip() for kind in args.kinds.split(',') if kind.strip()]
+    try:
+        report = collect_garbage(container_client, INTERNAL_PREFIXES, kinds, dry_run=args.dry_run,
+                                 min_age=args.min_age, export_max_age=args.export_max_age)
+    except ValueError as error:
+        parser.error(str(error))
+    print(json.dumps(report, indent=2, sort_keys=True))
+    return 1 if any(counts['failed'] for counts in report['kinds'].values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,117 @@
+"""
+Applying edits to stored text against a known version
+
+Clients that edit extracted text send only what changed: a list of
+``{"start", "end", "text"}`` replacements against the version they loaded,
+identified by its ETag. Offsets count UTF-16 code units, as JavaScript
+string indices do. The stored text is read and written conditionally on
+that ETag, so a save based on an outdated version fails with a conflict
+instead of silently overwriting someone else's edits.
+"""
+
+from bisect import bisect_left
+from itertools import accumulate
+from typing import Any, Dict, List, Optional, Tuple
+
+from azure.core import MatchConditions
+
+from shared import metrics
+from shared.timing import span
+
+MAX_PATCH_EDITS = 1000
+
+
+def text_blob_name(blob_name: str) -> str:
+    return f"documents_text/{blob_name}.txt"
+
+
+def parse_patch_request(body: Optional[Dict[str, Any]]) -> Tuple[str, List[Tuple[int, int, str]]]:
+    """``(base_etag, [(start, end, text)])`` from a patch request body.
+
+    Edits must be ordered and must not overlap. Raises ValueError for
+    malformed requests.
+    """
+    if not isinstance(body, dict):
+        raise ValueError('Invalid JSON body')
+    base_etag = body.get('baseEtag')
+    if not isinstance(base_etag, str) or not base_etag:
+        raise ValueError('baseEtag is required')
+    edits = body.get('edits')
+    if not isinstance(edits, list):
+        raise ValueError('edits must be a list of {start, end, text} objects')
+    if len(edits) > MAX_PATCH_EDITS:
+        raise ValueError(f'At most {MAX_PATCH_EDITS} edits per patch; save the full text instead')
+
+    parsed = []
+    previous_end = 0
+    for edit in edits:
+        start = edit.get('start') if isinstance(edit, dict) else None
+        end = edit.get('end') if isinstance(edit, dict) else None
+        text = edit.get('text', '') if isinstance(edit, dict) else None
+        if not (isinstance(start, int) and isinstance(end, int) and isinstance(text, str)):
+            raise ValueError('edits must be a list of {start, end, text} objects')
+        if not previous_end <= start <= end:
+            raise ValueError('edits must be ordered and must not overlap')
+        parsed.append((start, end, text))
+        previous_end = end
+    return base_etag, parsed
+
+
+def _utf16_index(text: str):
+    """Function mapping UTF-16 offsets into ``text`` to string indices."""
+    if text.isascii() or len(text.encode('utf-16-le')) == 2 * len(text):
+        # No characters outside the BMP: both count the same
+        def index(offset: int) -> int:
+            if offset > len(text):
+                raise ValueError(f'Edit offset {offset} is beyond the end of the text')
+            return offset
+        return index
+
+    # UTF-16 offset at which each character starts, plus the end
+    units = list(accumulate((2 if ord(character) > 0xFFFF else 1 for character in text), initial=0))
+
+    def index(offset: int) -> int:
+        position = bisect_left(units, offset)
+        if position == len(units):
+            raise ValueError(f'Edit offset {offset} is beyond the end of the text')
+        if units[position] != offset:
+            raise ValueError(f'Edit offset {offset} splits a surrogate pair')
+        return position
+    return index
+
+
+def apply_edits(text: str, edits: List[Tuple[int, int, str]]) -> str:
+    """``text`` with each ``(start, end, replacement)`` applied; offsets refer to ``text``."""
+    if not edits:
+        return text
+    index = _utf16_index(text)
+    parts = []
+    position = 0
+    for start, end, replacement in edits:
+        start, end = index(start), index(end)
+        parts.append(text[position:start])
+        parts.append(replacement)
+        position = end
+    parts.append(text[position:])
+    return ''.join(parts)
+
+
+def read_text(container_client, blob_name: str, etag: Optional[str] = None) -> Tuple[str, Any]:
+    """The stored text of ``blob_name`` and its properties.
+
+    With ``etag`` the read only succeeds while the text is still at that
+    version (ResourceModifiedError otherwise). Raises ResourceNotFoundError
+    when there is no stored text.
+    """
+    with span('storage.download_blob'):
+        download = container_client.get_blob_client(text_blob_name(blob_name)).download_blob(
+            etag=etag,
+            match_condition=MatchConditions.IfNotModified if etag else None
+        )
+        text_bytes = download.readall()
+    metrics.STORAGE_BYTES_DOWNLOADED.inc(len(text_bytes))
+    return text_bytes.decode('utf-8'), download.properties
+
+
+def utf16_length(text: str) -> int:
+    return len(text.encode('utf-16-le')) // 2
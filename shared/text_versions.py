@@ -0,0 +1,314 @@
+"""
+Version history of stored text
+
+``documents_text/<blob>.txt`` always holds the latest text. Every save
+that replaces it first records the version being replaced under
+``versions/<blob>/<number>``: usually as a zlib-compressed reverse delta
+(the edit that turns the newer text back into the older one), and every
+SNAPSHOT_INTERVAL versions, starting with the original extraction, as a
+compressed snapshot of the full text. History therefore grows with the
+size of the edits, and materializing any version takes at most one
+snapshot plus SNAPSHOT_INTERVAL - 1 deltas.
+
+The current text carries its version number in its ``version`` metadata;
+records are written with ``overwrite=False`` and the text conditionally on
+the ETag it was read at, so concurrent saves of the same version conflict
+instead of interleaving their history. A record left behind by a save
+whose text write failed is replaced by the next save of that version, once
+it is older than RECORD_GRACE_SECONDS and the text is still unchanged.
+Text stored fresh at version 0 starts a new history (``delete_versions``).
+"""
+
+import json
+import os
+import zlib
+from datetime import datetime, timezone
+from difflib import SequenceMatcher
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+from azure.storage.blob import ContentSettings
+
+from shared import metrics
+from shared.text_patch import apply_edits, read_text, text_blob_name, utf16_length
+from shared.timing import span
+
+VERSIONS_PREFIX = 'versions/'
+SNAPSHOT_INTERVAL = int(os.getenv('TEXT_SNAPSHOT_INTERVAL', '20') or 20)
+# Above this many line pairs the changed region is recorded as a plain
+# replacement instead of being diffed line by line
+MAX_DIFF_LINE_PAIRS = 4_000_000
+# A history record younger than this may belong to a save that has not
+# written its text yet, so it is not replaced as stale
+RECORD_GRACE_SECONDS = 30
+
+# Delta operations: a positive int copies that many characters of the
+# newer text, a negative int skips that many, a string is inserted
+DeltaOp = Union[int, str]
+
+
+def version_blob_name(blob_name: str, version: int) -> str:
+    return f"{VERSIONS_PREFIX}{blob_name}/{version:06d}"
+
+
+def is_snapshot(version: int) -> bool:
+    return version % SNAPSHOT_INTERVAL == 0
+
+
+def make_delta(source: str, target: str) -> List[DeltaOp]:
+    """Operations that turn ``source`` into ``target``.
+
+    The common prefix and suffix are trimmed first, so a local edit to a
+    long text only diffs (line by line) the region that changed.
+    """
+    limit = min(len(source), len(target))
+    prefix = 0
+    while prefix < limit and source[prefix] == target[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and source[-1 - suffix] == target[-1 - suffix]:
+        suffix += 1
+
+    ops: List[DeltaOp] = []
+
+    def emit(op: DeltaOp) -> None:
+        if ops and type(ops[-1]) is type(op) and (isinstance(op, str) or (ops[-1] > 0) == (op > 0)):
+            ops[-1] += op
+        elif op:
+            ops.append(op)
+
+    emit(prefix)
+    old_lines = source[prefix:len(source) - suffix].splitlines(keepends=True)
+    new_lines = target[prefix:len(target) - suffix].splitlines(keepends=True)
+    if len(old_lines) * len(new_lines) > MAX_DIFF_LINE_PAIRS:
+        emit(-sum(map(len, old_lines)))
+        emit(''.join(new_lines))
+    else:
+        matcher = SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                emit(sum(map(len, old_lines[i1:i2])))
+                continue
+            emit(-sum(map(len, old_lines[i1:i2])))
+            emit(''.join(new_lines[j1:j2]))
+    emit(suffix)
+    return ops
+
+
+def apply_delta(source: str, ops: List[DeltaOp]) -> str:
+    parts = []
+    position = 0
+    for op in ops:
+        if isinstance(op, str):
+            parts.append(op)
+        elif op > 0:
+            parts.append(source[position:position + op])
+            position += op
+        else:
+            position -= op
+    return ''.join(parts)
+
+
+def _source(version: int) -> str:
+    # Version 0 is the extracted text; every later one was saved by an editor
+    return 'extracted' if version == 0 else 'edited'
+
+
+def _encode(payload: Any) -> bytes:
+    return zlib.compress(json.dumps(payload, ensure_ascii=False).encode('utf-8'), 9)
+
+
+def _decode(data: bytes) -> Any:
+    return json.loads(zlib.decompress(data).decode('utf-8'))
+
+
+def _record_version(container_client, blob_name: str, version: int, text: str, newer_text: str,
+                    properties: Any, record_etag: Optional[str] = None) -> Tuple[str, Optional[str]]:
+    """Write the history record of ``text``, the version being replaced by ``newer_text``.
+
+    With ``record_etag`` an existing record at that ETag is replaced.
+    Returns the record's name and ETag.
+    """
+    kind = 'snapshot' if is_snapshot(version) else 'delta'
+    data = _encode(text if kind == 'snapshot' else make_delta(newer_text, text))
+    record_name = version_blob_name(blob_name, version)
+    saved_at = properties.last_modified or datetime.utcnow()
+    with span('storage.upload_blob'):
+        result = container_client.get_blob_client(record_name).upload_blob(
+            data,
+            overwrite=record_etag is not None,
+            etag=record_etag,
+            match_condition=MatchConditions.IfNotModified if record_etag else None,
+            content_settings=ContentSettings(content_type='application/octet-stream'),
+            metadata={
+                'kind': kind,
+                'length': str(utf16_length(text)),
+                'savedAt': saved_at.isoformat(),
+                'source': _source(version)
+            }
+        )
+    metrics.STORAGE_BYTES_UPLOADED.inc(len(data))
+    return record_name, (result or {}).get('etag')
+
+
+def _replace_stale_record(container_client, blob_name: str, version: int, text: str, newer_text: str,
+                          properties: Any) -> Tuple[str, Optional[str]]:
+    """Replace the record of ``version`` left behind by a save that never stored its text.
+
+    Raises ResourceModifiedError when the text has changed since
+    ``properties`` were read, or the record may still belong to a save in
+    progress.
+    """
+    with span('storage.get_blob_properties'):
+        head = container_client.get_blob_client(text_blob_name(blob_name)).get_blob_properties()
+    if head.etag != properties.etag:
+        raise ResourceModifiedError(f'Version {version} of {blob_name} was already replaced')
+    try:
+        with span('storage.get_blob_properties'):
+            record = container_client.get_blob_client(version_blob_name(blob_name, version)).get_blob_properties()
+    except ResourceNotFoundError:
+        record = None
+    if record is not None and record.last_modified is not None:
+        age = (datetime.now(timezone.utc) - record.last_modified).total_seconds()
+        if age < RECORD_GRACE_SECONDS:
+            raise ResourceModifiedError(f'Version {version} of {blob_name} is being replaced')
+    try:
+        return _record_version(container_client, blob_name, version, text, newer_text, properties,
+                               record_etag=record.etag if record is not None else None)
+    except ResourceExistsError:
+        raise ResourceModifiedError(f'Version {version} of {blob_name} is being replaced')
+
+
+def save_text(container_client, blob_name: str, store: Callable[..., Optional[str]], text: Optional[str] = None,
+              edits: Optional[List[Tuple[int, int, str]]] = None, base_etag: Optional[str] = None) -> Dict[str, Any]:
+    """Replace the stored text with ``text`` (or the current text with ``edits`` applied).
+
+    The replaced version is recorded in the history first. ``store(blob_name,
+    text, if_match=, version=)`` writes ``documents_text/`` (and keeps the
+    derived indexes in step). Returns the new ``text``, ``etag`` and
+    ``version``. Raises ResourceModifiedError when the text is no longer at
+    ``base_etag`` or changes during the save, and ResourceNotFoundError when
+    there is no text to apply ``edits`` to. ``store`` clears the history
+    when it is called with ``version=0``.
+    """
+    try:
+        previous, properties = read_text(container_client, blob_name, base_etag)
+    except ResourceNotFoundError:
+        if edits is not None or base_etag is not None:
+            raise
+        # Nothing stored yet: this is the first version
+        return {'text': text, 'etag': store(blob_name, text, version=0), 'version': 0}
+
+    if edits is not None:
+        text = apply_edits(previous, edits)
+    version = int(properties.metadata.get('version') or 0)
+    if text == previous:
+        return {'text': text, 'etag': properties.etag, 'version': version}
+
+    try:
+        record_name, record_etag = _record_version(container_client, blob_name, version, previous, text, properties)
+    except ResourceExistsError:
+        # Another save of the same version got there first, or one that
+        # failed to store its text left the record behind
+        record_name, record_etag = _replace_stale_record(container_client, blob_name, version, previous, text,
+                                                         properties)
+    try:
+        etag = store(blob_name, text, if_match=properties.etag, version=version + 1)
+    except Exception:
+        try:
+            # Only while it is still this save's record
+            with span('storage.delete_blob'):
+                container_client.get_blob_client(record_name).delete_blob(
+                    etag=record_etag, match_condition=MatchConditions.IfNotModified if record_etag else None)
+        except Exception as cleanup_error:
+            print(f"Failed to delete history record {record_name}: {cleanup_error}")
+        raise
+    return {'text': text, 'etag': etag, 'version': version + 1}
+
+
+def list_versions(container_client, blob_name: str) -> Optional[Dict[str, Any]]:
+    """The current version and the recorded history of a document's text; None without text."""
+    try:
+        with span('storage.get_blob_properties'):
+            head = container_client.get_blob_client(text_blob_name(blob_name)).get_blob_properties()
+    except ResourceNotFoundError:
+        return None
+    current = int(head.metadata.get('version') or 0)
+
+    prefix = f"{VERSIONS_PREFIX}{blob_name}/"
+    versions = []
+    with span('storage.list_blobs'):
+        for record in container_client.list_blobs(name_starts_with=prefix, include=['metadata']):
+            suffix = record.name[len(prefix):]
+            if not suffix.isdigit() or int(suffix) >= current:
+                # Left behind by a save that failed after recording it
+                continue
+            metadata = record.metadata or {}
+            versions.append({
+                'version': int(suffix),
+                'kind': metadata.get('kind'),
+                'length': int(metadata.get('length') or 0),
+                'storedBytes': record.size,
+                'savedAt': metadata.get('savedAt'),
+                'source': metadata.get('source')
+            })
+    versions.append({
+        'version': current,
+        'kind': 'current',
+        'storedBytes': head.size,
+        'savedAt': head.last_modified.isoformat() if head.last_modified else None,
+        'source': _source(current),
+        'etag': head.etag
+    })
+    return {'blobName': blob_name, 'current': current, 'versions': versions}
+
+
+def _read_record(container_client, blob_name: str, version: int) -> Any:
+    with span('storage.download_blob'):
+        data = container_client.get_blob_client(version_blob_name(blob_name, version)).download_blob().readall()
+    metrics.STORAGE_BYTES_DOWNLOADED.inc(len(data))
+    return _decode(data)
+
+
+def get_version(container_client, blob_name: str, version: int) -> Optional[Dict[str, Any]]:
+    """The text of one version, or None when the document or that version does not exist.
+
+    Starts from the nearest snapshot at or after ``version`` (or from the
+    current text) and applies the reverse deltas back to ``version``.
+    """
+    try:
+        current_text, properties = read_text(container_client, blob_name)
+    except ResourceNotFoundError:
+        return None
+    current = int(properties.metadata.get('version') or 0)
+    if not 0 <= version <= current:
+        return None
+    if version == current:
+        return {'version': version, 'current': True, 'text': current_text, 'etag': properties.etag}
+
+    start = -(-version // SNAPSHOT_INTERVAL) * SNAPSHOT_INTERVAL
+    try:
+        if start < current:
+            text = _read_record(container_client, blob_name, start)
+        else:
+            start, text = current, current_text
+        for newer in range(start - 1, version - 1, -1):
+            text = apply_delta(text, _read_record(container_client, blob_name, newer))
+    except ResourceNotFoundError:
+        return None
+    return {'version': version, 'current': False, 'text': text}
+
+
+def delete_versions(container_client, blob_name: str) -> int:
+    """Delete a document's text history; returns the number of records deleted.
+
+    Called when a document is deleted and when its text is stored fresh at
+    version 0, so a new history never starts on top of an old one.
+    """
+    names = [record.name for record in
+             container_client.list_blobs(name_starts_with=f"{VERSIONS_PREFIX}{blob_name}/")]
+    for start in range(0, len(names), 256):
+        with span('storage.delete_blobs'):
+            container_client.delete_blobs(*names[start:start + 256])
+    return len(names)
@@ -0,0 +1,130 @@
+"""
+Thumbnail and preview derivatives of uploaded images
+
+Each image gets a small ``thumb`` for the document list and a mid-size
+``preview`` for the viewer, stored as JPEGs under
+``derivatives/<blob>/<size>.jpg``. They are rendered at upload time and,
+for images uploaded before that (or when rendering failed), lazily on the
+first request. Derivatives never change for a given upload, so they are
+served with long cache lifetimes; clients add the document's last-modified
+time to the URL to get fresh copies after a re-upload.
+"""
+
+import io
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import ContentSettings
+from PIL import Image, ImageOps
+
+from shared import metrics
+from shared.timing import span
+
+DERIVATIVES_PREFIX = 'derivatives/'
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.bmp'}
+
+# Bounding boxes; images are scaled down to fit, never up
+SIZES = {
+    'thumb': (256, 256),
+    'preview': (1600, 1600)
+}
+JPEG_QUALITY = {
+    'thumb': 80,
+    'preview': 85
+}
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+CONTENT_TYPE = 'image/jpeg'
+
+
+def is_image(blob_name: str) -> bool:
+    return Path(blob_name).suffix.lower() in IMAGE_EXTENSIONS
+
+
+def derivative_blob_name(blob_name: str, size: str) -> str:
+    return f"{DERIVATIVES_PREFIX}{blob_name}/{size}.jpg"
+
+
+def _flatten(image: Image.Image) -> Image.Image:
+    """RGB copy of ``image``, with transparency composited onto white."""
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render_derivatives(data: bytes) -> Dict[str, bytes]:
+    """JPEG bytes for every size in SIZES, rendered from an image's bytes.
+
+    Sizes are rendered from largest to smallest, each from the previous
+    result, so the full-resolution image is only resampled once. JPEG
+    sources are decoded at a reduced scale where possible (``draft``).
+    """
+    rendered = {}
+    with Image.open(io.BytesIO(data)) as source:
+        largest = max(SIZES.values())
+        if source.format == 'JPEG':
+            source.draft('RGB', largest)
+        # Animated GIFs are represented by their first frame
+        image = _flatten(ImageOps.exif_transpose(source))
+
+    for size, box in sorted(SIZES.items(), key=lambda item: item[1], reverse=True):
+        image.thumbnail(box, Image.LANCZOS, reducing_gap=3.0)
+        output = io.BytesIO()
+        image.save(output, 'JPEG', quality=JPEG_QUALITY[size], optimize=True, progressive=True)
+        rendered[size] = output.getvalue()
+    return rendered
+
+
+def store_derivatives(container_client, blob_name: str, data: bytes) -> Dict[str, Tuple[bytes, str]]:
+    """Render and upload all derivatives of an image; returns each one's bytes and ETag."""
+    with span('thumbnails.render'):
+        rendered = render_derivatives(data)
+    stored = {}
+    for size, content in rendered.items():
+        with span('storage.upload_blob'):
+            result = container_client.get_blob_client(derivative_blob_name(blob_name, size)).upload_blob(
+                content,
+                overwrite=True,
+                content_settings=ContentSettings(content_type=CONTENT_TYPE, cache_control=CACHE_CONTROL),
+                metadata={'source': blob_name}
+            )
+        metrics.STORAGE_BYTES_UPLOADED.inc(len(content))
+        stored[size] = (content, result['etag'])
+    print(f"Stored {', '.join(rendered)} derivatives for {blob_name}")
+    return stored
+
+
+def get_derivative(container_client, blob_name: str, size: str) -> Optional[Tuple[bytes, str]]:
+    """A derivative's bytes and ETag, rendering all derivatives on a miss.
+
+    Returns None when the source image does not exist.
+    """
+    try:
+        with span('storage.download_blob'):
+            download = container_client.get_blob_client(derivative_blob_name(blob_name, size)).download_blob()
+            content = download.readall()
+        metrics.STORAGE_BYTES_DOWNLOADED.inc(len(content))
+        return content, download.properties.etag
+    except ResourceNotFoundError:
+        pass
+
+    try:
+        with span('storage.download_blob'):
+            data = container_client.get_blob_client(blob_name).download_blob().readall()
+    except ResourceNotFoundError:
+        return None
+    metrics.STORAGE_BYTES_DOWNLOADED.inc(len(data))
+    print(f"Rendering missing {size} derivative for {blob_name}")
+    return store_derivatives(container_client, blob_name, data)[size]
+
+
+def delete_derivatives(container_client, blob_name: str) -> None:
+    for size in SIZES:
+        try:
+            with span('storage.delete_blob'):
+                container_client.get_blob_client(derivative_blob_name(blob_name, size)).delete_blob()
+        except ResourceNotFoundError:
+            pass
@@ -0,0 +1,200 @@
+"""
+Lightweight request timing for Azure Functions
+
+A trace covers one request; spans inside it time individual phases such as
+storage calls, temp-file I/O and parsing. Finished traces are logged as one
+JSON line, can be returned in a ``Server-Timing`` header, and feed in-process
+histograms per operation.
+
+Timing is off unless ``TIMING_ENABLED`` is set. When it is off, ``span()``
+returns a shared no-op object and ``traced()`` leaves handlers unwrapped.
+"""
+
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+TIMING_ENABLED = os.getenv('TIMING_ENABLED', '').lower() in ('1', 'true', 'yes')
+SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', '').lower() in ('1', 'true', 'yes')
+
+# Upper bounds of the histogram buckets, in milliseconds
+HISTOGRAM_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar('current_trace', default=None)
+
+
+class Histogram:
+    """Thread-safe fixed-bucket histogram of durations in milliseconds."""
+
+    def __init__(self, buckets: Tuple[float, ...] = HISTOGRAM_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'count': self.count,
+                'totalMs': round(self.total, 3),
+                'meanMs': round(self.total / self.count, 3) if self.count else None,
+                'maxMs': round(self.max, 3),
+                'buckets': {
+                    **{str(bound): count for bound, count in zip(self.buckets, self.counts)},
+                    '+Inf': self.counts[-1],
+                },
+            }
+
+
+_histograms: Dict[str, Histogram] = {}
+_histograms_lock = threading.Lock()
+
+
+def _histogram(name: str) -> Histogram:
+    histogram = _histograms.get(name)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.setdefault(name, Histogram())
+    return histogram
+
+
+def get_histograms() -> Dict[str, Dict[str, Any]]:
+    """Snapshot of the per-operation duration histograms collected so far."""
+    with _histograms_lock:
+        names = sorted(_histograms)
+    return {name: _histograms[name].snapshot() for name in names}
+
+
+class Span:
+    """Times one phase and records it on the current trace and its histogram."""
+
+    __slots__ = ('name', 'trace', 'started')
+
+    def __init__(self, name: str, trace: Optional['Trace']):
+        self.name = name
+        self.trace = trace
+        self.started = 0.0
+
+    def __enter__(self) -> 'Span':
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        elapsed_ms = (time.perf_counter() - self.started) * 1000.0
+        _histogram(self.name).observe(elapsed_ms)
+        if self.trace is not None:
+            self.trace.spans.append((self.name, elapsed_ms))
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> '_NullSpan':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    """Collects the spans of a single request."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.spans: List[Tuple[str, float]] = []
+        self.started = 0.0
+        self.total_ms = 0.0
+        self._token = None
+
+    def __enter__(self) -> 'Trace':
+        self.started = time.perf_counter()
+        self._token = _current_trace.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.total_ms = (time.perf_counter() - self.started) * 1000.0
+        _current_trace.reset(self._token)
+        _histogram(f'{self.name}.total').observe(self.total_ms)
+        print(json.dumps({
+            'event': 'request_timing',
+            'operation': self.name,
+            'totalMs': round(self.total_ms, 3),
+            'spans': [{'name': name, 'ms': round(ms, 3)} for name, ms in self.spans],
+            'error': type(exc).__name__ if exc else None,
+        }))
+
+    def server_timing(self) -> str:
+        """Format the spans recorded so far as a Server-Timing header value."""
+        elapsed_ms = (time.perf_counter() - self.started) * 1000.0
+        entries = [f'{_metric_name(name)};dur={ms:.1f}' for name, ms in self.spans]
+        entries.append(f'total;dur={elapsed_ms:.1f}')
+        return ', '.join(entries)
+
+
+def _metric_name(name: str) -> str:
+    # Server-Timing metric names must be HTTP tokens
+    return ''.join(c if c.isalnum() or c in '-_' else '-' for c in name)
+
+
+def span(name: str):
+    """Context manager timing one phase of the current request."""
+    if not TIMING_ENABLED:
+        return _NULL_SPAN
+    return Span(name, _current_trace.get())
+
+
+def timed(name: str) -> Callable:
+    """Decorator timing every call of a function as a span."""
+    def decorator(function: Callable) -> Callable:
+        if not TIMING_ENABLED:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with Span(name, _current_trace.get()):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def traced(name: str) -> Callable:
+    """Decorator for HTTP handlers: runs the handler inside a trace.
+
+    With ``SERVER_TIMING_ENABLED`` set, the spans are also returned to the
+    client in a ``Server-Timing`` response header.
+    """
+    def decorator(handler: Callable) -> Callable:
+        if not TIMING_ENABLED:
+            return handler
+
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            with Trace(name) as request_trace:
+                response = handler(*args, **kwargs)
+                if SERVER_TIMING_ENABLED and response is not None:
+                    response.headers['Server-Timing'] = request_trace.server_timing()
+                return response
+        return wrapper
+    return decorator
@@ -0,0 +1,123 @@
+"""
+Extract-on-upload
+
+Uploads already hold the document in memory, so extracting it there saves
+the download (and temp file copy) that a later ``/api/extract-text`` call
+would need, and the document opens instantly. ``EXTRACT_ON_UPLOAD``
+selects the mode:
+
+- ``off`` (default): extract on first open, as before.
+- ``async``: extract in a background thread after the response.
+- ``sync``: extract before responding when the upload is at most
+  ``EXTRACT_ON_UPLOAD_SYNC_MAX_BYTES``; larger uploads go to the
+  background.
+
+Background work is best effort: the buffers waiting for it are capped at
+``EXTRACT_ON_UPLOAD_MAX_PENDING_BYTES`` and anything beyond that, or lost
+when a host recycles, is extracted on first open instead.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from shared import metrics
+from shared.extractor_registry import HEADER_BYTES, ExtractorRegistry, UnsupportedFileType
+
+EXTRACT_ON_UPLOAD = (os.getenv('EXTRACT_ON_UPLOAD', 'off') or 'off').lower()
+EXTRACT_ON_UPLOAD_SYNC_MAX_BYTES = int(os.getenv('EXTRACT_ON_UPLOAD_SYNC_MAX_BYTES', str(2 * 1024 * 1024)))
+EXTRACT_ON_UPLOAD_WORKERS = int(os.getenv('EXTRACT_ON_UPLOAD_WORKERS', '2') or 2)
+EXTRACT_ON_UPLOAD_MAX_PENDING_BYTES = int(os.getenv('EXTRACT_ON_UPLOAD_MAX_PENDING_BYTES', str(200 * 1024 * 1024)))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+_pending_bytes = 0
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=EXTRACT_ON_UPLOAD_WORKERS,
+                                           thread_name_prefix='extract-on-upload')
+        return _executor
+
+
+def _reserve(size: int) -> bool:
+    global _pending_bytes
+    with _lock:
+        if _pending_bytes + size > EXTRACT_ON_UPLOAD_MAX_PENDING_BYTES:
+            return False
+        _pending_bytes += size
+    metrics.UPLOAD_EXTRACTION_PENDING_BYTES.inc(size)
+    return True
+
+
+def _release(size: int) -> None:
+    global _pending_bytes
+    with _lock:
+        _pending_bytes -= size
+    metrics.UPLOAD_EXTRACTION_PENDING_BYTES.dec(size)
+
+
+def _extract_and_store(blob_name: str, content: bytes, extract: Callable[[bytes, str], Dict[str, Any]],
+                       store: Callable[[str, str, Dict[str, Any]], Any]) -> Dict[str, Any]:
+    try:
+        result = extract(content, blob_name)
+        if not result['success']:
+            print(f"Extract-on-upload failed for {blob_name}: {result['error']}")
+            metrics.UPLOAD_EXTRACTIONS.inc(result='failed')
+            return {'status': 'failed', 'error': result['error']}
+        store(blob_name, result['text'], result)
+    except Exception as error:
+        print(f"Extract-on-upload failed for {blob_name}: {error}")
+        metrics.UPLOAD_EXTRACTIONS.inc(result='failed')
+        return {'status': 'failed', 'error': str(error)}
+    metrics.UPLOAD_EXTRACTIONS.inc(result='extracted')
+    return {'status': 'extracted', 'pageCount': result.get('pageCount'), 'durationMs': result.get('durationMs')}
+
+
+def _extract_in_background(blob_name: str, content: bytes, extract, store) -> None:
+    try:
+        _extract_and_store(blob_name, content, extract, store)
+    finally:
+        _release(len(content))
+
+
+def extract_on_upload(blob_name: str, content: bytes, registry: ExtractorRegistry,
+                      extract: Callable[[bytes, str], Dict[str, Any]],
+                      store: Callable[[str, str, Dict[str, Any]], Any]) -> Optional[Dict[str, Any]]:
+    """Extract and store the text of a just-uploaded document per EXTRACT_ON_UPLOAD.
+
+    ``extract(content, blob_name)`` returns an extraction result and
+    ``store(blob_name, text, result)`` writes ``documents_text/``. Returns
+    None when the mode is off, otherwise a ``status`` of ``extracted``,
+    ``failed``, ``unsupported``, ``queued`` or ``deferred`` (left for the
+    first open).
+    """
+    if EXTRACT_ON_UPLOAD not in ('async', 'sync'):
+        return None
+
+    # Sniffing is cheap; content without an extractor is never queued
+    try:
+        registry.detect(content[:HEADER_BYTES], blob_name)
+    except UnsupportedFileType as error:
+        metrics.UPLOAD_EXTRACTIONS.inc(result='unsupported')
+        return {'status': 'unsupported', 'error': str(error)}
+
+    if EXTRACT_ON_UPLOAD == 'sync' and len(content) <= EXTRACT_ON_UPLOAD_SYNC_MAX_BYTES:
+        return _extract_and_store(blob_name, content, extract, store)
+
+    if not _reserve(len(content)):
+        metrics.UPLOAD_EXTRACTIONS.inc(result='deferred')
+        return {'status': 'deferred'}
+    try:
+        _get_executor().submit(_extract_in_background, blob_name, content, extract, store)
+    except RuntimeError:
+        # The executor is shutting down with the process
+        _release(len(content))
+        metrics.UPLOAD_EXTRACTIONS.inc(result='deferred')
+        return {'status': 'deferred'}
+    metrics.UPLOAD_EXTRACTIONS.inc(result='queued')
+    return {'status': 'queued'}
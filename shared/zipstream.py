@@ -0,0 +1,296 @@
+"""
+ZIP archives of documents built while they are downloaded
+
+``stream_zip`` writes a ZIP archive on the fly: entries are written in
+order while the next few blobs are already being downloaded in the
+background, each into a small bounded queue of chunks. Memory therefore
+stays at a few chunks per concurrent download however large the archive
+is, and the first bytes of the archive are ready as soon as the first
+chunk of the first blob arrives. Entries use data descriptors (the archive
+is never seeked), ZIP64 where sizes need it, and are only deflated when
+the format is not compressed already.
+"""
+
+import os
+import queue
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from azure.core.exceptions import ResourceNotFoundError
+from azure.storage.blob import ContentSettings
+
+from shared import metrics
+from shared.http_ranges import iter_blob_range
+from shared.listing import iter_documents, merge_companions
+from shared.timing import span
+
+EXPORT_CONCURRENCY = int(os.getenv('EXPORT_CONCURRENCY', '4') or 4)
+EXPORT_CHUNK_BYTES = 1024 * 1024
+# Chunks buffered ahead for each blob being prefetched
+PREFETCH_CHUNKS = 2
+# Size of the blocks an archive is staged in when it is stored as a blob
+EXPORT_BLOCK_BYTES = 4 * 1024 * 1024
+MAX_EXPORT_NAMES = 1000
+
+EXPORTS_PREFIX = 'exports/'
+TEXT_PREFIX = 'documents_text/'
+TEXT_SUFFIX = '.txt'
+
+# Formats that are compressed already; deflating them again only costs CPU
+_STORED_EXTENSIONS = {'.pdf', '.docx', '.xlsx', '.png', '.jpg', '.jpeg', '.gif', '.zip'}
+# Earliest timestamp a ZIP entry can carry
+_ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+_END = object()
+
+
+class ArchiveEntry(NamedTuple):
+    """One blob to add to an archive as ``arcname``.
+
+    Entries without an ``etag`` are looked up when they are downloaded;
+    ``optional`` ones are left out silently when the blob does not exist.
+    """
+    arcname: str
+    blob_name: str
+    size: Optional[int] = None
+    etag: Optional[str] = None
+    last_modified: Optional[datetime] = None
+    optional: bool = False
+
+
+def parse_archive_request(params: Dict[str, Any], body: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """Archive options from query parameters and an optional JSON body.
+
+    ``names`` is a JSON list in the body or a comma-separated parameter,
+    ``prefix`` selects documents by name otherwise, and ``includeText`` adds
+    each document's extracted text. Raises ValueError for malformed values.
+    """
+    if body is not None and not isinstance(body, dict):
+        raise ValueError('Invalid JSON body')
+    body = body or {}
+    names = body.get('names')
+    if names is None and params.get('names'):
+        names = [name for name in params['names'].split(',') if name]
+    if names is not None:
+        if not (isinstance(names, list) and all(isinstance(name, str) and name for name in names)):
+            raise ValueError('names must be a list of blob names')
+        if len(names) > MAX_EXPORT_NAMES:
+            raise ValueError(f'At most {MAX_EXPORT_NAMES} names can be exported at once; use a prefix instead')
+        # Keep the first occurrence: an archive cannot hold a name twice
+        names = list(dict.fromkeys(names))
+    include_text = body.get('includeText', params.get('includeText', False))
+    if isinstance(include_text, str):
+        include_text = include_text.lower() in ('1', 'true', 'yes')
+    return {
+        'names': names,
+        'prefix': body.get('prefix') or params.get('prefix') or '',
+        'includeText': bool(include_text)
+    }
+
+
+def _text_arcname(blob_name: str) -> str:
+    return f"{TEXT_PREFIX}{blob_name}{TEXT_SUFFIX}"
+
+
+def _listed_entry(arcname: str, blob: Any) -> ArchiveEntry:
+    return ArchiveEntry(arcname, blob.name, blob.size, blob.etag, blob.last_modified)
+
+
+def archive_entries(container_client, skip_prefixes: Tuple[str, ...], prefix: str = '',
+                    names: Optional[List[str]] = None, include_text: bool = False) -> Iterator[ArchiveEntry]:
+    """Entries for the documents named ``names``, or for every document under ``prefix``.
+
+    A prefix is exported from one listing of the documents merged with one
+    listing of their extracted text, so sizes and ETags come from the
+    listings rather than a lookup per blob.
+    """
+    if names is not None:
+        for name in names:
+            yield ArchiveEntry(name, name)
+            if include_text:
+                yield ArchiveEntry(_text_arcname(name), _text_arcname(name), optional=True)
+        return
+
+    documents = iter_documents(container_client, skip_prefixes, prefix)
+    if not include_text:
+        for document in documents:
+            yield _listed_entry(document.name, document)
+        return
+
+    companions = container_client.list_blobs(name_starts_with=f"{TEXT_PREFIX}{prefix}")
+    for name, document, companion in merge_companions(documents, companions, TEXT_PREFIX, TEXT_SUFFIX):
+        # Text whose document was deleted is not exported
+        if document is None:
+            continue
+        yield _listed_entry(name, document)
+        if companion is not None:
+            yield _listed_entry(_text_arcname(name), companion)
+
+
+class _Sink:
+    """Write-only, unseekable file collecting what ZipFile writes until it is taken."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def _put(chunks: queue.Queue, item: Any, cancelled: threading.Event) -> bool:
+    """Block until ``item`` is queued; gives up once the archive is abandoned."""
+    while not cancelled.is_set():
+        try:
+            chunks.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _fetch(container_client, entry: ArchiveEntry, chunks: queue.Queue, cancelled: threading.Event) -> None:
+    """Queue the resolved entry, then its chunks, then _END (or the error that stopped it)."""
+    try:
+        blob_client = container_client.get_blob_client(entry.blob_name)
+        if entry.etag is None:
+            with span('storage.get_blob_properties'):
+                properties = blob_client.get_blob_properties()
+            entry = entry._replace(size=properties.size, etag=properties.etag,
+                                   last_modified=properties.last_modified)
+        if not _put(chunks, entry, cancelled):
+            return
+        for chunk in iter_blob_range(blob_client, 0, entry.size, entry.etag, EXPORT_CHUNK_BYTES):
+            if not _put(chunks, chunk, cancelled):
+                return
+        _put(chunks, _END, cancelled)
+    except Exception as error:
+        _put(chunks, error, cancelled)
+
+
+def _zip_info(entry: ArchiveEntry) -> zipfile.ZipInfo:
+    modified = entry.last_modified.timetuple()[:6] if entry.last_modified else _ZIP_EPOCH
+    info = zipfile.ZipInfo(entry.arcname, date_time=max(modified, _ZIP_EPOCH))
+    if Path(entry.arcname).suffix.lower() in _STORED_EXTENSIONS:
+        info.compress_type = zipfile.ZIP_STORED
+    else:
+        info.compress_type = zipfile.ZIP_DEFLATED
+    # The expected size decides whether the entry needs ZIP64 fields
+    info.file_size = entry.size or 0
+    return info
+
+
+def stream_zip(container_client, entries: Iterable[ArchiveEntry],
+               concurrency: int = EXPORT_CONCURRENCY) -> Iterator[bytes]:
+    """Yield a ZIP archive of ``entries`` piece by piece.
+
+    Up to ``concurrency`` blobs are downloaded ahead of the one being
+    written. Missing documents are left out; any other failure (including a
+    blob replaced mid-download) raises, which truncates the archive rather
+    than silently shipping partial content.
+    """
+    entries = iter(entries)
+    sink = _Sink()
+    cancelled = threading.Event()
+    pending: Deque[Tuple[ArchiveEntry, queue.Queue]] = deque()
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency))
+
+    def prefetch_next() -> None:
+        entry = next(entries, None)
+        if entry is not None:
+            chunks: queue.Queue = queue.Queue(maxsize=PREFETCH_CHUNKS)
+            executor.submit(_fetch, container_client, entry, chunks, cancelled)
+            pending.append((entry, chunks))
+
+    files = 0
+    try:
+        with zipfile.ZipFile(sink, 'w', allowZip64=True) as archive:
+            for _ in range(max(1, concurrency)):
+                prefetch_next()
+            while pending:
+                entry, chunks = pending.popleft()
+                prefetch_next()
+                resolved = chunks.get()
+                if isinstance(resolved, ResourceNotFoundError):
+                    if not entry.optional:
+                        print(f"Export skipped missing blob {entry.blob_name}")
+                    continue
+                if isinstance(resolved, BaseException):
+                    raise resolved
+
+                with archive.open(_zip_info(resolved), 'w') as member:
+                    while True:
+                        chunk = chunks.get()
+                        if chunk is _END:
+                            break
+                        if isinstance(chunk, BaseException):
+                            raise chunk
+                        member.write(chunk)
+                        data = sink.take()
+                        if data:
+                            yield data
+                files += 1
+        data = sink.take()
+        if data:
+            yield data
+    finally:
+        cancelled.set()
+        executor.shutdown(wait=False)
+        metrics.EXPORT_ARCHIVE_FILES.inc(files)
+
+
+def store_archive(container_client, blob_name: str, pieces: Iterable[bytes],
+                  filename: str = 'documents.zip') -> int:
+    """Upload an archive stream as a block blob, staging a block per EXPORT_BLOCK_BYTES.
+
+    For hosts that cannot stream a response: memory stays at one block, and
+    the archive becomes visible only once its block list is committed.
+    Returns the archive's size.
+    """
+    blob_client = container_client.get_blob_client(blob_name)
+    block_ids: List[str] = []
+    block = bytearray()
+    size = 0
+
+    def stage() -> None:
+        block_id = f"{len(block_ids):08d}"
+        with span('storage.stage_block'):
+            blob_client.stage_block(block_id, bytes(block))
+        metrics.STORAGE_BYTES_UPLOADED.inc(len(block))
+        block_ids.append(block_id)
+        block.clear()
+
+    for piece in pieces:
+        block += piece
+        size += len(piece)
+        if len(block) >= EXPORT_BLOCK_BYTES:
+            stage()
+    if block or not block_ids:
+        stage()
+    with span('storage.commit_block_list'):
+        blob_client.commit_block_list(
+            block_ids,
+            content_settings=ContentSettings(
+                content_type='application/zip',
+                content_disposition=f'attachment; filename="{filename}"'
+            ),
+            metadata={'createdAt': datetime.utcnow().isoformat(), 'contentType': 'export'}
+        )
+    return size
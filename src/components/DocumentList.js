@@ -1,5 +1,6 @@
 import React from 'react';
 import { Eye, Trash2, File, FileText, FileImage, FileSpreadsheet } from 'lucide-react';
+import { getThumbnailUrl } from '../services/api';
 import './DocumentList.css';
 
 const DocumentList = ({ 
@@ -23,6 +24,10 @@ const DocumentList = ({
     return <File size={20} />;
   };
 
+  const isImage = (doc) => (
+    (doc.type && doc.type.includes('image/')) || /\.(png|jpe?g|gif|bmp)$/i.test(doc.name || '')
+  );
+
   const formatFileSize = (bytes) => {
     if (!bytes || bytes === 0) return '0 Bytes';
     const k = 1024;
@@ -82,11 +87,27 @@ const DocumentList = ({
           <div key={`${doc.id || doc.name || doc.originalName}-${index}`} className="document-item">
             <div className="document-info">
               <div className="document-icon">
-                {getFileIcon(doc.type, doc.name)}
+                {isImage(doc) ? (
+                  <img
+                    className="document-thumbnail"
+                    src={getThumbnailUrl(doc.id || doc.name, 'thumb', doc.lastModified)}
+                    alt=""
+                    loading="lazy"
+                  />
+                ) : getFileIcon(doc.type, doc.name)}
               </div>
               <div className="document-details">
                 <h4>{doc.name || 'Unknown File'}</h4>
                 <p>{formatFileSize(doc.size || 0)} • {formatDate(doc.uploadedAt || new Date())}</p>
+                {(doc.pageCount > 0 || doc.wordCount > 0) && (
+                  <p style={{ fontSize: '12px', color: '#6c757d' }}>
+                    {[
+                      doc.pageCount && `${doc.pageCount} pages`,
+                      doc.wordCount && `${doc.wordCount.toLocaleString()} words`,
+                      doc.language && doc.language.toUpperCase()
+                    ].filter(Boolean).join(' • ')}
+                  </p>
+                )}
                 <p style={{ fontSize: '12px', color: '#28a745' }}>
                   ✓ Stored in Azure Blob Storage
                 </p>
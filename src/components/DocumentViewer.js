@@ -40,12 +40,17 @@ const DocumentViewer = ({ document, onClose, onSave }) => {
       console.log('Edited text length:', editedText.length);
       setSaving(true);
       
-      const result = await saveEditedText(document.id, editedText);
+      const result = await saveEditedText(document.id, editedText, {
+        text: document.content.data,
+        etag: document.content.etag
+      });
       console.log('Save result:', result);
       
-      // Update the document content with edited text
+      // Update the document content with edited text; its new ETag is the
+      // base of the next save
       document.content.data = editedText;
       document.content.source = 'edited';
+      document.content.etag = result.etag;
       
       setIsEditing(false);
       alert('Text saved successfully!');
@@ -56,7 +61,11 @@ const DocumentViewer = ({ document, onClose, onSave }) => {
       }
     } catch (error) {
       console.error('Save error:', error);
-      alert('Failed to save changes. Please try again.');
+      if (error.status === 412) {
+        alert('This text was changed elsewhere since you opened it. Copy your changes, reopen the document and apply them again.');
+      } else {
+        alert('Failed to save changes. Please try again.');
+      }
     } finally {
       setSaving(false);
     }
@@ -131,11 +140,13 @@ const DocumentViewer = ({ document, onClose, onSave }) => {
       case 'image':
         return (
           <div className="image-container">
-            <img
-              src={document.content.data}
-              alt={document.name}
-              className="image-viewer"
-            />
+            <a href={document.content.original || document.content.data} target="_blank" rel="noopener noreferrer">
+              <img
+                src={document.content.data}
+                alt={document.name}
+                className="image-viewer"
+              />
+            </a>
           </div>
         );
 
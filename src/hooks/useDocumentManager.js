@@ -1,5 +1,5 @@
 import { useState, useCallback } from 'react';
-import { uploadFile, getFiles, deleteFile, getDownloadUrl, extractText } from '../services/api';
+import { uploadFiles, getFiles, deleteFile, getDownloadUrl, extractText, getThumbnailUrl } from '../services/api';
 
 export const useDocumentManager = () => {
   const [documents, setDocuments] = useState([]);
@@ -13,10 +13,9 @@ export const useDocumentManager = () => {
   const loadFiles = useCallback(async () => {
     try {
       setIsLoadingFiles(true);
-      const files = await getFiles();
       
       // Map the API response to include all necessary fields for the frontend
-      const mappedFiles = files.map(file => ({
+      const mapFiles = files => files.map(file => ({
         id: file.name || file.id || file.originalName,
         name: file.name || file.originalName,
         originalName: file.originalName || file.name,
@@ -25,11 +24,17 @@ export const useDocumentManager = () => {
         blobUrl: file.blobUrl || null,
         uploadedAt: file.uploadedAt,
         lastModified: file.lastModified || file.uploadedAt,
+        pageCount: file.pageCount ?? null,
+        wordCount: file.wordCount ?? null,
+        language: file.language ?? null,
         content: null,
-        hasExtractedText: false
+        hasExtractedText: file.hasExtractedText ?? false,
+        extractedAt: file.extractedAt ?? null
       }));
       
-      setDocuments(mappedFiles);
+      // Show the files received so far while a large listing streams in
+      const files = await getFiles(received => setDocuments(mapFiles(received)));
+      setDocuments(mapFiles(files));
     } catch (err) {
       console.error('Error loading files:', err);
       setError('Failed to load files from storage');
@@ -44,23 +49,27 @@ export const useDocumentManager = () => {
     setSuccess(null);
 
     try {
-      const uploadPromises = acceptedFiles.map(async (file) => {
-        const result = await uploadFile(file);
-        return {
-          id: result.filename || result.blobName || result.name,
-          name: result.filename || result.blobName || result.name,
-          originalName: result.originalName || result.originalName || file.name,
+      const results = await uploadFiles(acceptedFiles);
+      const newDocuments = results
+        .map((result, index) => ({ result, file: acceptedFiles[index] }))
+        .filter(({ result }) => result.success)
+        .map(({ result, file }) => ({
+          id: result.filename,
+          name: result.filename,
+          originalName: result.originalName || file.name,
           size: result.size || file.size,
           type: file.type || 'application/octet-stream',
           blobUrl: null,
           uploadedAt: new Date().toISOString(),
           lastModified: new Date().toISOString(),
           content: null,
-          hasExtractedText: false
-        };
-      });
-
-      const newDocuments = await Promise.all(uploadPromises);
+          // Set when the backend extracted the text during upload (EXTRACT_ON_UPLOAD)
+          hasExtractedText: result.hasExtractedText ?? false
+        }));
+      const failed = results.filter(result => !result.success);
+      if (failed.length) {
+        setError(`Failed to upload ${failed.map(result => `${result.originalName} (${result.error})`).join(', ')}`);
+      }
       console.log('Uploaded documents:', newDocuments);
       
       setDocuments(prev => {
@@ -87,10 +96,11 @@ export const useDocumentManager = () => {
           doc.originalName.endsWith('.docx') ||
           doc.originalName.endsWith('.doc') ||
           doc.originalName.endsWith('.pdf') ||
+          doc.originalName.endsWith('.xlsx') ||
           doc.originalName.endsWith('.txt')
         );
         
-        if (supportsExtraction) {
+        if (supportsExtraction && !doc.hasExtractedText) {
           try {
             const extractionResult = await extractText(docId);
             console.log('Auto-extraction result for', docId, ':', extractionResult);
@@ -189,7 +199,8 @@ export const useDocumentManager = () => {
               doc.content = { 
                 type: 'text', 
                 data: extractionResult.text,
-                source: extractionResult.source || 'cached'
+                source: extractionResult.source || 'cached',
+                etag: extractionResult.etag
               };
             } else {
               // Fallback to PDF viewer
@@ -211,7 +222,8 @@ export const useDocumentManager = () => {
               doc.content = { 
                 type: 'text', 
                 data: extractionResult.text,
-                source: extractionResult.source || 'extracted'
+                source: extractionResult.source || 'extracted',
+                etag: extractionResult.etag
               };
               
               // Update the document in the list to show extracted text is available
@@ -240,7 +252,12 @@ export const useDocumentManager = () => {
           }
         }
       } else if (doc.type && doc.type.includes('image/')) {
-        doc.content = { type: 'image', data: doc.blobUrl };
+        // The preview derivative is far smaller than the original
+        doc.content = {
+          type: 'image',
+          data: getThumbnailUrl(doc.id || doc.name || doc.originalName, 'preview', doc.lastModified),
+          original: doc.blobUrl
+        };
       } else if ((doc.type && doc.type.includes('spreadsheet')) || (doc.name && (doc.name.endsWith('.xlsx') || doc.name.endsWith('.xls')))) {
         doc.content = { type: 'spreadsheet', data: 'Excel file - content preview not available' };
       } else if ((doc.type && doc.type.includes('word')) || (doc.name && (doc.name.endsWith('.docx') || doc.name.endsWith('.doc')))) {
@@ -253,7 +270,8 @@ export const useDocumentManager = () => {
               doc.content = { 
                 type: 'text', 
                 data: extractionResult.text,
-                source: extractionResult.source || 'cached'
+                source: extractionResult.source || 'cached',
+                etag: extractionResult.etag
               };
             } else {
               doc.content = { type: 'word', data: 'Word document - content preview not available' };
@@ -274,7 +292,8 @@ export const useDocumentManager = () => {
               doc.content = { 
                 type: 'text', 
                 data: extractionResult.text,
-                source: extractionResult.source || 'extracted'
+                source: extractionResult.source || 'extracted',
+                etag: extractionResult.etag
               };
               
               // Update the document in the list to show extracted text is available
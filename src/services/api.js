@@ -15,7 +15,10 @@ const apiCall = async (endpoint, options = {}) => {
     const response = await fetch(url, config);
     
     if (!response.ok) {
-      throw new Error(`HTTP error! status: ${response.status}`);
+      const error = new Error(`HTTP error! status: ${response.status}`);
+      error.status = response.status;
+      error.retryAfter = Number(response.headers.get('Retry-After')) || null;
+      throw error;
     }
     
     return await response.json();
@@ -42,8 +45,86 @@ export const uploadFile = async (file) => {
   return await response.json();
 };
 
-export const getFiles = async () => {
-  return await apiCall('/files');
+// Limits per batch request; the Functions host caps request bodies at 100MB
+const MAX_BATCH_FILES = 50;
+const MAX_BATCH_BYTES = 90 * 1024 * 1024;
+
+// Uploads files through /upload/batch, a few requests for a whole folder.
+// Resolves to one result per file, in order: { success, filename, error, ... }
+export const uploadFiles = async (files) => {
+  const batches = [];
+  let batch = [];
+  let batchBytes = 0;
+  for (const file of files) {
+    if (batch.length && (batch.length >= MAX_BATCH_FILES || batchBytes + file.size > MAX_BATCH_BYTES)) {
+      batches.push(batch);
+      batch = [];
+      batchBytes = 0;
+    }
+    batch.push(file);
+    batchBytes += file.size;
+  }
+  if (batch.length) batches.push(batch);
+
+  const results = await Promise.all(batches.map(async (files) => {
+    const formData = new FormData();
+    files.forEach(file => formData.append('files', file));
+
+    const response = await fetch(`${API_BASE_URL}/upload/batch`, {
+      method: 'POST',
+      body: formData,
+    });
+    const result = await response.json().catch(() => ({}));
+    if (result.files) {
+      return result.files;
+    }
+    const error = result.error || `Upload failed: ${response.status}`;
+    return files.map(file => ({ originalName: file.name, success: false, error }));
+  }));
+  return results.flat();
+};
+
+// With onProgress, asks for the listing as JSON lines (which the Flask
+// backend streams) and reports the files received so far as they arrive;
+// backends that answer with a plain JSON array are read in one go
+export const getFiles = async (onProgress) => {
+  if (!onProgress || typeof TextDecoder === 'undefined') {
+    return await apiCall('/files');
+  }
+
+  const response = await fetch(`${API_BASE_URL}/files`, {
+    headers: { Accept: 'application/x-ndjson, application/json;q=0.9' }
+  });
+  if (!response.ok) {
+    const error = new Error(`HTTP error! status: ${response.status}`);
+    error.status = response.status;
+    throw error;
+  }
+  if (!response.body || !(response.headers.get('Content-Type') || '').includes('application/x-ndjson')) {
+    return await response.json();
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  const files = [];
+  let pending = '';
+  for (;;) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    pending += decoder.decode(value, { stream: true });
+    const lines = pending.split('\n');
+    pending = lines.pop();
+    const received = lines.filter(line => line.trim()).map(line => JSON.parse(line));
+    if (received.length > 0) {
+      files.push(...received);
+      onProgress(files.slice());
+    }
+  }
+  pending += decoder.decode();
+  if (pending.trim()) {
+    files.push(JSON.parse(pending));
+  }
+  return files;
 };
 
 export const deleteFile = async (blobName) => {
@@ -62,27 +143,89 @@ export const deleteFile = async (blobName) => {
   }
 };
 
+// Streams the document through the backend, with Range support for viewers
+export const getContentUrl = (blobName) => `${API_BASE_URL}/files/${encodeURIComponent(blobName)}/content`;
+
 export const getDownloadUrl = async (blobName) => {
   const result = await apiCall(`/files/${blobName}/download`);
-  return result.downloadUrl;
+  // Backends without a SAS to hand out (or with DOWNLOAD_PROXY set) proxy downloads
+  return result.proxied ? getContentUrl(blobName) : result.downloadUrl;
+};
+
+// Image derivatives are cached for a year; the version (the document's
+// last-modified time) changes the URL when the image is re-uploaded
+export const getThumbnailUrl = (blobName, size = 'thumb', version = '') => {
+  const query = new URLSearchParams({ size });
+  if (version) query.set('v', version);
+  return `${API_BASE_URL}/files/${encodeURIComponent(blobName)}/thumbnail?${query}`;
 };
 
+// The backend answers 429 with Retry-After when too many extractions are
+// running; wait as told and try again a few times before giving up
+const EXTRACT_RETRIES = 3;
+
 export const extractText = async (blobName) => {
-  return await apiCall(`/extract-text/${encodeURIComponent(blobName)}`, {
-    method: 'POST'
-  });
+  for (let attempt = 0; ; attempt++) {
+    try {
+      return await apiCall(`/extract-text/${encodeURIComponent(blobName)}`, {
+        method: 'POST'
+      });
+    } catch (error) {
+      if (error.status !== 429 || attempt >= EXTRACT_RETRIES) {
+        throw error;
+      }
+      await new Promise(resolve => setTimeout(resolve, (error.retryAfter || 1) * 1000));
+    }
+  }
 };
 
-export const saveEditedText = async (blobName, editedText) => {
+// The changed span between two strings, as one edit in UTF-16 offsets
+// (JavaScript string indices) against the old string
+const diffText = (oldText, newText) => {
+  const maxPrefix = Math.min(oldText.length, newText.length);
+  let start = 0;
+  while (start < maxPrefix && oldText.charCodeAt(start) === newText.charCodeAt(start)) {
+    start++;
+  }
+  let oldEnd = oldText.length;
+  let newEnd = newText.length;
+  while (oldEnd > start && newEnd > start && oldText.charCodeAt(oldEnd - 1) === newText.charCodeAt(newEnd - 1)) {
+    oldEnd--;
+    newEnd--;
+  }
+  // Never split a surrogate pair
+  if (start > 0 && start < oldText.length && /[\uDC00-\uDFFF]/.test(oldText[start])) {
+    start--;
+  }
+  if (oldEnd < oldText.length && /[\uDC00-\uDFFF]/.test(oldText[oldEnd])) {
+    oldEnd++;
+    newEnd++;
+  }
+  return { start, end: oldEnd, text: newText.slice(start, newEnd) };
+};
+
+// Save edited text. With `base` ({ text, etag } of the version being edited)
+// only the changed span is sent, and the save fails with status 412 if the
+// text was changed elsewhere since it was loaded.
+export const saveEditedText = async (blobName, editedText, base = null) => {
   console.log('API: saveEditedText called with blobName:', blobName);
   console.log('API: Edited text length:', editedText.length);
-  console.log('API: Full URL will be:', `${API_BASE_URL}/save-edited-text/${blobName}`);
   
   try {
-    const result = await apiCall(`/save-edited-text/${encodeURIComponent(blobName)}`, {
-      method: 'POST',
-      body: JSON.stringify({ text: editedText })
-    });
+    let result;
+    if (base && base.etag && typeof base.text === 'string') {
+      const edit = diffText(base.text, editedText);
+      const edits = edit.start === edit.end && !edit.text ? [] : [edit];
+      result = await apiCall(`/save-edited-text/${encodeURIComponent(blobName)}/patch`, {
+        method: 'POST',
+        body: JSON.stringify({ baseEtag: base.etag, edits })
+      });
+    } else {
+      result = await apiCall(`/save-edited-text/${encodeURIComponent(blobName)}`, {
+        method: 'POST',
+        body: JSON.stringify({ text: editedText })
+      });
+    }
     console.log('API: Save response:', result);
     return result;
   } catch (error) {
@@ -91,6 +234,15 @@ export const saveEditedText = async (blobName, editedText) => {
   }
 };
 
+// Saved versions of a document's text, and the text of one of them
+export const getTextVersions = async (blobName) => {
+  return await apiCall(`/files/${encodeURIComponent(blobName)}/versions`);
+};
+
+export const getTextVersion = async (blobName, version) => {
+  return await apiCall(`/files/${encodeURIComponent(blobName)}/versions/${version}`);
+};
+
 export const healthCheck = async () => {
   return await apiCall('/health');
 };
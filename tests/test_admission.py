@@ -0,0 +1,75 @@
+"""Extraction admission control under concurrent waiters."""
+
+import threading
+import time
+
+from shared.admission import AdmissionController, Overloaded
+
+# Which woken waiter re-checks first is up to the scheduler, so scenarios
+# that depend on it are repeated
+ROUNDS = 30
+
+
+def _queue(controller, priority, admitted):
+    """Start a thread that waits for a slot and sets ``admitted[priority]`` once it has one."""
+    def run():
+        try:
+            controller.acquire(priority)
+        except Overloaded:
+            return
+        admitted[priority].set()
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def _wait_for_queue(controller, depth):
+    deadline = time.perf_counter() + 2
+    while controller.queued < depth:
+        assert time.perf_counter() < deadline
+        time.sleep(0.001)
+
+
+def test_waiters_admitted_together_when_slots_free_at_once():
+    for _ in range(ROUNDS):
+        controller = AdmissionController(concurrency=2, max_queue=4, timeout=2)
+        controller.acquire()
+        controller.acquire()
+
+        admitted = {1: threading.Event(), 2: threading.Event()}
+        threads = [_queue(controller, 2, admitted)]
+        _wait_for_queue(controller, 1)
+        threads.append(_queue(controller, 1, admitted))
+        _wait_for_queue(controller, 2)
+
+        # Both slots free before either waiter runs: if the second one
+        # re-checks first it is not the head yet, and only the head taking
+        # its slot can wake it again
+        controller.release()
+        controller.release()
+
+        assert admitted[1].wait(1)
+        assert admitted[2].wait(1)
+        for thread in threads:
+            thread.join(1)
+        assert controller.running == 2
+        assert controller.queued == 0
+
+
+def test_smaller_waiter_goes_first():
+    controller = AdmissionController(concurrency=1, max_queue=4, timeout=5)
+    controller.acquire()
+
+    admitted = {1: threading.Event(), 100: threading.Event()}
+    large = _queue(controller, 100, admitted)
+    _wait_for_queue(controller, 1)
+    small = _queue(controller, 1, admitted)
+    _wait_for_queue(controller, 2)
+
+    controller.release()
+    assert admitted[1].wait(2)
+    small.join(1)
+    assert not admitted[100].is_set()
+    controller.release()
+    assert admitted[100].wait(2)
+    large.join(1)
@@ -0,0 +1,20 @@
+"""Parsing the options of chunk and archive export requests."""
+
+import pytest
+
+from shared.chunk_store import parse_export_request
+from shared.zipstream import parse_archive_request
+
+
+@pytest.mark.parametrize('parse', [parse_export_request, parse_archive_request])
+@pytest.mark.parametrize('body', [[], ['a.pdf'], 'x', 3])
+def test_bodies_that_are_not_objects_are_rejected(parse, body):
+    with pytest.raises(ValueError):
+        parse({}, body)
+
+
+@pytest.mark.parametrize('parse', [parse_export_request, parse_archive_request])
+def test_names_from_body_or_parameters(parse):
+    assert parse({}, {'names': ['a.pdf', 'b.pdf']})['names'] == ['a.pdf', 'b.pdf']
+    assert parse({'names': 'a.pdf,b.pdf'}, None)['names'] == ['a.pdf', 'b.pdf']
+    assert parse({'prefix': 'reports/'}, None)['prefix'] == 'reports/'
@@ -0,0 +1,50 @@
+"""Reading blob headers for content-based format detection."""
+
+import pytest
+from azure.core.exceptions import HttpResponseError
+
+from shared.extractor_registry import ExtractorRegistry, UnsupportedFileType, read_blob_header
+
+
+class _Download:
+    def __init__(self, data):
+        self.data = data
+
+    def readall(self):
+        return self.data
+
+
+class _BlobClient:
+    def __init__(self, data):
+        self.data = data
+
+    def download_blob(self, offset=0, length=None):
+        if not self.data:
+            error = HttpResponseError(message='The range specified is invalid for the current size of the resource.')
+            error.status_code = 416
+            raise error
+        return _Download(self.data[offset:offset + length])
+
+
+def test_header_of_empty_blob_is_empty():
+    assert read_blob_header(_BlobClient(b'')) == b''
+
+
+def test_header_is_a_prefix_of_the_blob():
+    assert read_blob_header(_BlobClient(b'%PDF-1.7' + b'x' * 10000), length=8) == b'%PDF-1.7'
+
+
+def test_empty_blob_is_rejected_as_unsupported():
+    with pytest.raises(UnsupportedFileType, match='empty'):
+        ExtractorRegistry().detect(read_blob_header(_BlobClient(b'')), 'empty.pdf')
+
+
+def test_other_storage_errors_propagate():
+    class _Failing(_BlobClient):
+        def download_blob(self, offset=0, length=None):
+            error = HttpResponseError(message='Server busy')
+            error.status_code = 503
+            raise error
+
+    with pytest.raises(HttpResponseError):
+        read_blob_header(_Failing(b'data'))
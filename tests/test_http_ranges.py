@@ -0,0 +1,28 @@
+"""Parsing Range headers for proxied downloads."""
+
+import pytest
+
+from shared.http_ranges import parse_range
+
+
+@pytest.mark.parametrize('value, expected', [
+    (None, None),
+    ('bytes=0-99', (0, 99)),
+    ('bytes=10-', (10, 999)),
+    ('bytes=-100', (900, 999)),
+    ('bytes=900-5000', (900, 999)),
+    ('bytes=0-1,5-6', None),
+])
+def test_single_ranges(value, expected):
+    assert parse_range(value, 1000) == expected
+
+
+@pytest.mark.parametrize('value', ['bytes=0-', 'bytes=-1', 'bytes=0-0'])
+def test_any_range_of_an_empty_blob_is_unsatisfiable(value):
+    with pytest.raises(ValueError):
+        parse_range(value, 0)
+
+
+def test_range_past_the_end_is_unsatisfiable():
+    with pytest.raises(ValueError):
+        parse_range('bytes=1000-', 1000)
@@ -0,0 +1,39 @@
+"""Per-process claims of local index files."""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from shared import index_sync
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+pytestmark = pytest.mark.skipif(index_sync.fcntl is None, reason='needs flock')
+
+
+def _claim_in_subprocess(path: str) -> str:
+    script = f"from shared.index_sync import claim_path; print(claim_path({path!r}))"
+    result = subprocess.run([sys.executable, '-c', script], cwd=REPO_ROOT, capture_output=True, text=True,
+                            check=True)
+    return result.stdout.strip()
+
+
+def test_a_process_keeps_its_claim(tmp_path):
+    path = str(tmp_path / 'search.sqlite3')
+    assert index_sync.claim_path(path) == path
+    assert index_sync.claim_path(path) == path
+
+
+def test_other_processes_get_their_own_path(tmp_path):
+    path = str(tmp_path / 'similarity')
+    assert index_sync.claim_path(path) == path
+    assert _claim_in_subprocess(path) == str(tmp_path / 'similarity-1')
+
+
+def test_a_released_path_is_reused(tmp_path):
+    path = str(tmp_path / 'minhash.sqlite3')
+    # The subprocess exits, and the OS releases its lock
+    assert _claim_in_subprocess(path) == path
+    assert _claim_in_subprocess(path) == path
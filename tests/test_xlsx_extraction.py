@@ -0,0 +1,88 @@
+"""XLSX extraction from files and from in-memory uploads."""
+
+import importlib.util
+import io
+import os
+import sys
+
+from openpyxl import Workbook
+
+from shared.extractor_registry import HEADER_BYTES
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _load_server_extractors():
+    # The Flask backend's ``extractor`` package shares its name with the
+    # Functions one, so it is loaded under another name
+    path = os.path.join(REPO_ROOT, 'server', 'extractor', '__init__.py')
+    spec = importlib.util.spec_from_file_location('server_extractor', path,
+                                                  submodule_search_locations=[os.path.dirname(path)])
+    package = importlib.util.module_from_spec(spec)
+    sys.modules['server_extractor'] = package
+    spec.loader.exec_module(package)
+    return importlib.import_module('server_extractor.formats')
+
+
+def _workbook_bytes() -> bytes:
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = 'Prices'
+    sheet.append(['Item', 'Price'])
+    sheet.append(['Widget', 2.5])
+    sheet.append([])
+    sheet.append(['Gadget', 10.0, None, ''])
+    data = io.BytesIO()
+    workbook.save(data)
+    return data.getvalue()
+
+
+EXPECTED = '# Sheet: Prices\nItem\tPrice\nWidget\t2.5\nGadget\t10'
+
+
+def test_server_extracts_xlsx_from_bytes():
+    formats = _load_server_extractors()
+    content = _workbook_bytes()
+    file_format = formats.registry.detect(content[:HEADER_BYTES], 'prices.xlsx')
+    assert file_format.name == 'xlsx'
+    assert file_format.extract(io.BytesIO(content))['text'] == EXPECTED
+
+
+def test_server_extracts_xlsx_from_path(tmp_path):
+    formats = _load_server_extractors()
+    path = tmp_path / 'prices.xlsx'
+    path.write_bytes(_workbook_bytes())
+    assert formats.extract_text_from_xlsx(path) == EXPECTED
+
+
+def test_functions_extracts_xlsx_from_bytes():
+    from extractor.xlsx_extractor import extract_text_from_xlsx
+    assert extract_text_from_xlsx(io.BytesIO(_workbook_bytes())) == EXPECTED
+
+
+def _sparse_workbook_bytes(sheets: int, last_row: int) -> bytes:
+    # Tiny files whose sheets openpyxl scans row by row up to last_row
+    workbook = Workbook()
+    for index in range(sheets):
+        sheet = workbook.active if index == 0 else workbook.create_sheet()
+        sheet.title = f'S{index}'
+        sheet['A1'] = 'first'
+        sheet.cell(row=last_row, column=1, value='last')
+    data = io.BytesIO()
+    workbook.save(data)
+    return data.getvalue()
+
+
+def test_empty_rows_count_toward_the_sheet_scan_limit():
+    from extractor.xlsx_extractor import SCAN_FACTOR, extract_text_from_xlsx
+    text = extract_text_from_xlsx(io.BytesIO(_sparse_workbook_bytes(1, 5000)), max_rows_per_sheet=100)
+    assert text.splitlines() == ['# Sheet: S0', 'first', f'[Sheet truncated after scanning {100 * SCAN_FACTOR} rows]']
+
+
+def test_scanned_rows_are_limited_across_sheets():
+    formats = _load_server_extractors()
+    text = formats.extract_text_from_xlsx(io.BytesIO(_sparse_workbook_bytes(5, 1000)), max_rows_per_sheet=10_000,
+                                          max_scanned_rows=2500)
+    assert text.count('# Sheet:') == 3
+    assert text.endswith('[Row limit reached; remaining sheets omitted]')
+    assert '[Sheet truncated after scanning 500 rows]' in text